@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+"""
+Adisyon Veri Modeli
+FastFootSatış
+
+OrderItem: __slots__ tabanlı sipariş satırı. Sözlük gibi erişim
+(item['adet'], item.get('tip')) desteklenir, to_dict() ile JSON'a
+eskisiyle aynı alan adlarıyla çevrilir.
+
+Adisyon: Bir masanın satırlarını tutar; toplam, ikram hariç toplam ve
+durum sayıları her ekleme/çıkarmada artımlı güncellenir (O(1) okuma).
+Satırlar ekleme sırasını koruyan bir sözlükte (sıra no -> satır) ve ayrıca
+uid -> satır indeksinde tutulur: iptal/hazır/bulma O(1), liste kaydırması
+yoktur. İndeksle erişim (eski istemciler) O(n)'dir.
+
+AdisyonStore: masa -> Adisyon sözlüğü; tüm masalar için uid -> masa
+haritasını tutar. Mutfak sadece uid göndererek satırı bulabilir. Taşıma
+ve toplu çıkarma store kilidi altında yapılır, iki harita birlikte değişir.
+
+Eşzamanlılık: Her Adisyon'un kendi kilidi (RLock) vardır; değişiklikler bu
+kilit altında yapılır, farklı masalar birbirini beklemez. Oku-değiştir
+adımları (iptal öncesi durum kontrolü, ödeme) çağıran tarafta
+`with adisyon.lock:` ile sarılır. Taşıma iki masanın kilidini isim
+sırasıyla alır (kilitlenme olmaz).
+
+Çok süreçli modda store'a ortak bir kilit verilir (shared_store.SharedLock);
+tüm masalar bu kilidi paylaşır ve diğer süreçlerin günlük kayıtları
+apply_record() ile belleğe uygulanır. Sadece okuyan yollar `with
+adisyon.reading():` kullanır; ortak kilitte bu, süreçler arası yazma
+kilidini almaz (tek süreçte normal kilittir).
+"""
+
+import sys
+import threading
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+
+class OrderItem:
+    """Tek sipariş satırı"""
+
+    __slots__ = ('uid', 'urun', 'adet', 'fiyat', 'tip', 'garson', 'not_bilgisi', 'durum', 'saat', 'istasyon',
+                 '_seq')
+
+    # JSON alan adı -> attribute ('not' Python'da anahtar kelime)
+    KEYS = {
+        'uid': 'uid',
+        'urun': 'urun',
+        'adet': 'adet',
+        'fiyat': 'fiyat',
+        'tip': 'tip',
+        'garson': 'garson',
+        'not': 'not_bilgisi',
+        'durum': 'durum',
+        'saat': 'saat',
+        'istasyon': 'istasyon'  # Mutfak istasyonu (tüm süreçlerde yayın odası buradan)
+    }
+
+    def __init__(self, uid=None, urun='', adet=1, fiyat=0.0, tip='normal', garson=None,
+                 not_bilgisi=None, durum=None, saat=None, istasyon=None):
+        self.uid = uid
+        self.urun = sys.intern(urun) if isinstance(urun, str) else urun
+        self.adet = int(adet)
+        self.fiyat = float(fiyat)
+        self.tip = sys.intern(tip) if isinstance(tip, str) else tip
+        self.garson = sys.intern(garson) if isinstance(garson, str) else garson
+        self.not_bilgisi = not_bilgisi
+        self.durum = sys.intern(durum) if isinstance(durum, str) else durum
+        self.saat = saat
+        self.istasyon = sys.intern(istasyon) if isinstance(istasyon, str) else istasyon
+        self._seq = None  # Bulunduğu adisyondaki sıra no (Adisyon.append verir)
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        return cls(
+            uid=data.get('uid'),
+            urun=data.get('urun', ''),
+            adet=data.get('adet', 1),
+            fiyat=data.get('fiyat', 0.0),
+            tip=data.get('tip', 'normal'),
+            garson=data.get('garson'),
+            not_bilgisi=data.get('not'),
+            durum=data.get('durum'),
+            saat=data.get('saat'),
+            istasyon=data.get('istasyon')
+        )
+
+    def to_dict(self):
+        """JSON (wire) formatı - boş alanlar eskisi gibi hiç yazılmaz"""
+        result = {}
+        for key, attr in self.KEYS.items():
+            value = getattr(self, attr)
+            if value is not None:
+                result[key] = value
+        return result
+
+    @property
+    def tutar(self):
+        return self.adet * self.fiyat
+
+    # Sözlük uyumluluğu (eski kod item['adet'] / item.get('tip') kullanıyor)
+    def __getitem__(self, key):
+        try:
+            value = getattr(self, self.KEYS[key])
+        except KeyError:
+            raise KeyError(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        attr = self.KEYS.get(key)
+        if attr is None:
+            return default
+        value = getattr(self, attr)
+        return default if value is None else value
+
+    def __contains__(self, key):
+        attr = self.KEYS.get(key)
+        return attr is not None and getattr(self, attr) is not None
+
+    def __repr__(self):
+        return f"OrderItem({self.to_dict()!r})"
+
+
+class Adisyon:
+    """Bir masanın açık sipariş satırları ve artımlı toplamları"""
+
+    __slots__ = ('_lines', '_next_seq', '_total', '_total_ikramsiz', 'status_counts', '_by_uid', '_store',
+                 'masa', 'lock', 'version')
+
+    def __init__(self, items=()):
+        self._lines = {}  # sıra no -> satır (ekleme sırasıyla)
+        self._next_seq = 0
+        self._total = 0.0
+        self._total_ikramsiz = 0.0
+        self.status_counts = Counter()
+        self._by_uid = {}
+        self._store = None  # Bağlı olduğu AdisyonStore (global uid haritası)
+        self.masa = None
+        self.lock = threading.RLock()
+        self.version = 0  # Yayınlanan her delta olayında bir artar
+        self.extend(items)
+
+    @classmethod
+    def from_list(cls, items):
+        return cls(OrderItem.from_dict(i) for i in items)
+
+    # ==================== TOPLAMLAR ====================
+
+    def _account(self, item, sign):
+        if item.uid is not None:
+            if sign > 0:
+                self._by_uid[item.uid] = item
+                if self._store is not None:
+                    self._store.uid_masa[item.uid] = self.masa
+            else:
+                self._by_uid.pop(item.uid, None)
+                if self._store is not None and self._store.uid_masa.get(item.uid) == self.masa:
+                    del self._store.uid_masa[item.uid]
+        tutar = item.adet * item.fiyat
+        self._total += sign * tutar
+        if item.tip != 'ikram':
+            self._total_ikramsiz += sign * tutar
+        self.status_counts[item.durum] += sign
+        if self.status_counts[item.durum] <= 0:
+            del self.status_counts[item.durum]
+        if not self._lines:
+            # Kayan nokta artığı kalmasın
+            self._total = 0.0
+            self._total_ikramsiz = 0.0
+
+    @property
+    def total(self):
+        return round(self._total, 2)
+
+    @property
+    def total_ikramsiz(self):
+        """İkram satırları hariç ödenecek toplam"""
+        return round(self._total_ikramsiz, 2)
+
+    # ==================== DEĞİŞİKLİK ====================
+
+    @property
+    def items(self):
+        """Satırların sıralı kopyası"""
+        return list(self._lines.values())
+
+    def append(self, item):
+        item = OrderItem.from_dict(item)
+        with self.lock:
+            item._seq = self._next_seq
+            self._next_seq += 1
+            self._lines[item._seq] = item
+            self._account(item, +1)
+        return item
+
+    def extend(self, items):
+        with self.lock:
+            for item in items:
+                self.append(item)
+
+    def pop(self, index=-1):
+        with self.lock:
+            if not self._lines:
+                raise IndexError("pop from empty Adisyon")
+            item = next(reversed(self._lines.values())) if index == -1 else self[index]
+            del self._lines[item._seq]
+            self._account(item, -1)
+        return item
+
+    def remove(self, item):
+        """Satırı çıkar (O(1)); adisyonda değilse ValueError"""
+        with self.lock:
+            if self._lines.get(item._seq) is not item:
+                raise ValueError("satır bu adisyonda değil")
+            del self._lines[item._seq]
+            self._account(item, -1)
+
+    def remove_uids(self, uids):
+        """Verilen uid'lere sahip satırları çıkar (O(k)), çıkanları adisyon sırasıyla döndür"""
+        with self.lock:
+            removed = {self._by_uid[uid]._seq: self._by_uid[uid] for uid in set(uids) if uid in self._by_uid}
+            removed = [removed[seq] for seq in sorted(removed)]
+            for item in removed:
+                del self._lines[item._seq]
+                self._account(item, -1)
+        return removed
+
+    def clear(self):
+        with self.lock:
+            items, self._lines = list(self._lines.values()), {}
+            self._total = 0.0
+            self._total_ikramsiz = 0.0
+            self.status_counts.clear()
+            self._by_uid.clear()
+            if self._store is not None:
+                for item in items:
+                    if self._store.uid_masa.get(item.uid) == self.masa:
+                        del self._store.uid_masa[item.uid]
+        return items
+
+    def reading(self):
+        """Sadece okuma için kilit (ortak kilitte yazma kilidi alınmaz)"""
+        return self.lock.reading() if hasattr(self.lock, 'reading') else self.lock
+
+    def bump_version(self):
+        """Delta olayı için yeni masa sürümü (kilit altında çağrılmalı)"""
+        with self.lock:
+            self.version += 1
+            return self.version
+
+    def set_status(self, item, durum):
+        """Satır durumunu değiştir (durum sayıları güncel kalır)"""
+        with self.lock:
+            self.status_counts[item.durum] -= 1
+            if self.status_counts[item.durum] <= 0:
+                del self.status_counts[item.durum]
+            item.durum = sys.intern(durum) if isinstance(durum, str) else durum
+            self.status_counts[item.durum] += 1
+
+    # ==================== OKUMA ====================
+
+    def find(self, uid):
+        """uid ile satır bul (O(1)), yoksa None"""
+        return self._by_uid.get(uid)
+
+    def to_list(self):
+        with self.lock:
+            return [item.to_dict() for item in self._lines.values()]
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __bool__(self):
+        return bool(self._lines)
+
+    def __iter__(self):
+        # Kopya üzerinden: başka thread'in eklemesi yinelemeyi bozmaz
+        return iter(self.items)
+
+    def __getitem__(self, index):
+        return self.items[index]
+
+    def __repr__(self):
+        return f"Adisyon({len(self._lines)} kalem, {self.total:.2f} TL)"
+
+
+class AdisyonStore(dict):
+    """masa -> Adisyon sözlüğü ve global uid -> masa haritası"""
+
+    def __init__(self, lock=None, reserved=None):
+        """
+        :param lock: Verilirse store ve tüm masalar bu kilidi paylaşır (çok süreçli mod)
+        :param reserved: open_new ayrımları için set benzeri nesne (varsayılan: set())
+        """
+        super().__init__()
+        self.uid_masa = {}
+        self.shared_lock = lock is not None
+        self.lock = lock if lock is not None else threading.RLock()
+        self._reserved = reserved if reserved is not None else set()  # open_new ile ayrılmış adlar
+
+    def _bind(self, masa, adisyon):
+        adisyon._store = self
+        adisyon.masa = masa
+        if self.shared_lock:
+            adisyon.lock = self.lock
+        for uid in list(adisyon._by_uid):
+            self.uid_masa[uid] = masa
+
+    def _unbind(self, adisyon):
+        for uid in list(adisyon._by_uid):
+            if self.uid_masa.get(uid) == adisyon.masa:
+                del self.uid_masa[uid]
+        adisyon._store = None
+
+    def __setitem__(self, masa, adisyon):
+        with self.lock:
+            old = self.get(masa)
+            if old is not None and old is not adisyon:
+                self._unbind(old)
+            self._bind(masa, adisyon)
+            super().__setitem__(masa, adisyon)
+
+    def __delitem__(self, masa):
+        with self.lock:
+            self._unbind(self[masa])
+            super().__delitem__(masa)
+
+    def reading(self):
+        """Masa listesini okumak için kilit (ortak kilitte yazma kilidi alınmaz)"""
+        return self.lock.reading() if self.shared_lock else self.lock
+
+    def locate(self, uid):
+        """uid'nin bulunduğu (masa, satır) çifti; yoksa (None, None)"""
+        with self.lock:
+            masa = self.uid_masa.get(uid)
+            if masa is None or masa not in self:
+                return None, None
+            return masa, self[masa].find(uid)
+
+    def get_or_create(self, masa):
+        """Masa yoksa boş adisyon aç (eşzamanlı iki oluşturma birbirini ezmez)"""
+        with self.lock:
+            adisyon = self.get(masa)
+            if adisyon is None:
+                adisyon = Adisyon()
+                self[masa] = adisyon
+            return adisyon
+
+    def open_new(self, base):
+        """base adında boş (yoksa numaralı) yeni bir adisyon ayır, adını döndür.
+        Ad, release() çağrılana kadar başka bir open_new tarafından verilmez."""
+        with self.lock:
+            masa = base
+            suffix = 2
+            while masa in self._reserved or (masa in self and self[masa]):
+                masa = f"{base} ({suffix})"
+                suffix += 1
+            self._reserved.add(masa)
+            self[masa] = Adisyon()
+            return masa
+
+    def release(self, masa):
+        """open_new ile ayrılan adı serbest bırak; boş kaldıysa adisyonu sil"""
+        with self.lock:
+            self._reserved.discard(masa)
+            adisyon = self.get(masa)
+            if adisyon is not None and not adisyon:
+                del self[masa]
+
+    def group_by_masa(self, uids):
+        """uid listesini {masa: [uid]} olarak grupla (bilinmeyenler atlanır)"""
+        groups = {}
+        with self.lock:
+            for uid in uids:
+                masa = self.uid_masa.get(uid)
+                if masa is not None:
+                    groups.setdefault(masa, []).append(uid)
+        return groups
+
+    @contextmanager
+    def locked(self, *masalar):
+        """Birden fazla masanın kilidini isim sırasıyla al"""
+        with ExitStack() as stack:
+            for masa in sorted(set(masalar)):
+                stack.enter_context(self[masa].lock)
+            yield
+
+    def move(self, source, target, uids=None):
+        """Satırları kaynaktan hedefe taşı (uids None ise hepsi), taşınanları döndür"""
+        with self.locked(source, target), self.lock:
+            if uids is None:
+                moved = self[source].clear()
+            else:
+                moved = self[source].remove_uids(uids)
+            self[target].extend(moved)
+            return moved
+
+    def apply_record(self, record):
+        """
+        Başka bir süreçte yazılmış günlük kaydını uygula (adisyon_journal
+        kayıt formatı). Yazan süreç her kayıttan sonra etkilenen her masa için
+        tek bir delta yayınlar; burada da her masanın sürümü bir artırılır,
+        böylece tüm süreçlerde masa sürümleri aynı kalır.
+        """
+        op = record.get("op")
+        with self.lock:
+            if op in ("add", "add_many"):
+                adisyon = self.get_or_create(record["masa"])
+                for item in (record["items"] if op == "add_many" else [record["item"]]):
+                    if adisyon.find(item.get("uid")) is None:
+                        adisyon.append(item)
+                touched = [adisyon]
+            elif op == "remove":
+                adisyon = self.get_or_create(record["masa"])
+                adisyon.remove_uids(record.get("uids", []))
+                touched = [adisyon]
+            elif op == "move":
+                self.get_or_create(record["source"])
+                self.get_or_create(record["target"])
+                self.move(record["source"], record["target"], record.get("uids", []))
+                touched = [self[record["source"]], self[record["target"]]]
+            elif op == "status":
+                adisyon = self.get_or_create(record["masa"])
+                for uid in record.get("uids", []):
+                    item = adisyon.find(uid)
+                    if item is not None:
+                        adisyon.set_status(item, record["durum"])
+                touched = [adisyon]
+            elif op == "clear":
+                adisyon = self.get_or_create(record["masa"])
+                adisyon.clear()
+                touched = [adisyon]
+            else:
+                return
+            for adisyon in touched:
+                adisyon.bump_version()
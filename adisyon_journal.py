@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+"""
+Açık Adisyon Değişiklik Günlüğü (Write-Ahead Journal)
+FastFootSatış
+
+Her ekleme/iptal/taşıma/ödeme tüm adisyonları yeniden yazmak yerine
+günlük dosyasına tek satır olarak eklenir. Belirli sayıda kayıttan sonra
+active_adisyonlar.json snapshot'ı yeniden yazılır ve günlük sıfırlanır.
+Açılışta snapshot + günlük sırayla oynatılarak son durum elde edilir.
+
+flush_interval > 0 ise kayıtlar bellekte biriktirilir ve arka plandaki
+persister thread'i tarafından tek write + fsync ile toplu yazılır; ödeme ve
+kapanışta flush() ile beklemeden diske indirilir.
+"""
+
+import json
+import os
+import time
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Snapshot içinde masa adıyla çakışmayan meta anahtarı
+META_KEY = "_meta"
+
+
+class AdisyonJournal:
+    def __init__(self, snapshot_path, journal_path=None, compact_every=500, snapshot_provider=None,
+                 flush_interval=0.0):
+        """
+        :param snapshot_path: active_adisyonlar.json yolu
+        :param journal_path: Günlük dosyası (varsayılan: snapshot ile aynı isim, .journal uzantılı)
+        :param compact_every: Kaç kayıttan sonra snapshot alınacağı
+        :param snapshot_provider: Güncel {masa: [kalemler]} sözlüğünü döndüren fonksiyon
+        :param flush_interval: Toplu yazma aralığı (saniye). 0 ise her kayıt anında yazılır.
+        """
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + ".journal"
+        self.compact_every = max(1, int(compact_every))
+        self.snapshot_provider = snapshot_provider
+        self.flush_interval = max(0.0, float(flush_interval))
+        self.seq = 0                # Son kayda verilen sıra numarası
+        self.entries_since_snapshot = 0
+        self.versions = {}          # masa -> load() sırasında oynatılan kayıt sayısı
+        self._lock = threading.Lock()     # seq ve bekleyen kayıtlar
+        self._io_lock = threading.Lock()  # dosya yazımı (kayıt sırasını korur)
+        self._pending = []
+        self._dirty = set()
+        self._fh = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            'flushes': 0,
+            'records': 0,
+            'last_batch_records': 0,
+            'max_batch_records': 0,
+            'last_batch_tables': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'total_flush_ms': 0.0,
+            'compactions': 0
+        }
+
+    # ==================== PERSISTER THREAD ====================
+
+    def start(self):
+        """Arka plan yazıcısını başlat (flush_interval > 0 ise)"""
+        if self.flush_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="adisyon-persister", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.entries_since_snapshot >= self.compact_every and self.snapshot_provider:
+                    self.compact(self.snapshot_provider())
+            except Exception as e:
+                logger.error(f"Adisyon persister hatası: {e}")
+
+    def get_stats(self):
+        """Flush gecikmesi ve batch boyutu sayaçları"""
+        stats = dict(self.stats)
+        stats['avg_flush_ms'] = round(stats['total_flush_ms'] / stats['flushes'], 3) if stats['flushes'] else 0.0
+        stats['pending_records'] = len(self._pending)
+        stats['flush_interval_ms'] = int(self.flush_interval * 1000)
+        return stats
+
+    # ==================== YAZMA ====================
+
+    def _open(self):
+        if self._fh is None:
+            self._fh = open(self.journal_path, "a", encoding="utf-8")
+        return self._fh
+
+    def append(self, op, tables=(), **fields):
+        """Günlüğe tek kayıt ekle (arka plan kapalıysa fsync ile hemen diske indirilir)"""
+        with self._lock:
+            self.seq += 1
+            record = {"seq": self.seq, "op": op}
+            record.update(fields)
+            self._pending.append(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+            self._dirty.update(tables)
+
+        if self._thread is None:
+            self.flush()
+            if self.entries_since_snapshot >= self.compact_every and self.snapshot_provider:
+                self.compact(self.snapshot_provider())
+
+    def flush(self):
+        """Bekleyen kayıtları tek write + fsync ile yaz"""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                tables, self._dirty = self._dirty, set()
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            fh = self._open()
+            fh.write("".join(batch))
+            fh.flush()
+            os.fsync(fh.fileno())
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            self.entries_since_snapshot += len(batch)
+            self.stats['flushes'] += 1
+            self.stats['records'] += len(batch)
+            self.stats['last_batch_records'] = len(batch)
+            self.stats['max_batch_records'] = max(self.stats['max_batch_records'], len(batch))
+            self.stats['last_batch_tables'] = len(tables)
+            self.stats['last_flush_ms'] = round(elapsed_ms, 3)
+            self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], round(elapsed_ms, 3))
+            self.stats['total_flush_ms'] += elapsed_ms
+            return len(batch)
+
+    def log_add(self, masa, item):
+        self.append("add", tables=(masa,), masa=masa, item=item)
+
+    def log_add_many(self, masa, items):
+        """Toplu siparişin tüm satırları tek kayıtta"""
+        self.append("add_many", tables=(masa,), masa=masa, items=list(items))
+
+    def log_remove(self, masa, uids, reason=None):
+        """reason: cancel / remove (mutfak kuyruğundan düşer); ödeme için verilmez"""
+        fields = {"reason": reason} if reason else {}
+        self.append("remove", tables=(masa,), masa=masa, uids=list(uids), **fields)
+
+    def log_move(self, source, target, uids):
+        self.append("move", tables=(source, target), source=source, target=target, uids=list(uids))
+
+    def log_status(self, masa, uids, durum):
+        self.append("status", tables=(masa,), masa=masa, uids=list(uids), durum=durum)
+
+    def log_clear(self, masa):
+        self.append("clear", tables=(masa,), masa=masa)
+
+    def compact(self, adisyonlar):
+        """Snapshot yaz ve günlüğü sıfırla"""
+        with self._io_lock:
+            # Bellek önce güncellendiği için seq'e kadar olan tüm kayıtlar
+            # snapshot'ta yer alır; bekleyen kayıtlar artık gereksizdir.
+            with self._lock:
+                snapshot_seq = self.seq
+                self._pending = []
+                self._dirty = set()
+            data = {masa: list(items) for masa, items in list(adisyonlar.items())}
+            data[META_KEY] = {"seq": snapshot_seq}
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            # Snapshot seq bilgisini taşıdığı için buradan sonra çökme olsa da
+            # eski günlük kayıtları yeniden oynatılmaz.
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+            with open(self.journal_path, "w", encoding="utf-8"):
+                pass
+            self.entries_since_snapshot = 0
+            self.stats['compactions'] += 1
+        return True
+
+    def close(self):
+        """Persister'ı durdur, bekleyenleri yaz ve dosyayı kapat"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+        with self._io_lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    # ==================== OKUMA / REPLAY ====================
+
+    def read_snapshot(self):
+        """(snapshot {masa: [kalemler]}, snapshot seq)"""
+        if not os.path.exists(self.snapshot_path):
+            return {}, 0
+        try:
+            with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            meta = state.pop(META_KEY, None) or {}
+            return state, int(meta.get("seq", 0))
+        except Exception as e:
+            logger.error(f"Adisyon snapshot okuma hatası: {e}")
+            return {}, 0
+
+    def read_records(self):
+        """Günlükteki kayıtlar (sırayla)"""
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Yarım yazılmış son satır (çökme anı) - onaylanmamış kayıt
+                    logger.warning("Adisyon günlüğünde bozuk satır atlandı")
+
+    def load(self):
+        """Snapshot + günlüğü oynatarak {masa: [kalemler]} döndür"""
+        state, snapshot_seq = self.read_snapshot()
+        last_seq = snapshot_seq
+        replayed = 0
+        versions = {}
+        for record in self.read_records():
+            seq = record.get("seq", 0)
+            if seq <= snapshot_seq:
+                continue
+            apply_record(state, record)
+            for masa in record_tables(record):
+                versions[masa] = versions.get(masa, 0) + 1
+            last_seq = max(last_seq, seq)
+            replayed += 1
+
+        self.seq = last_seq
+        self.entries_since_snapshot = replayed
+        self.versions = versions
+        if replayed:
+            logger.info(f"✓ Adisyon günlüğünden {replayed} kayıt oynatıldı")
+        return state
+
+
+def record_tables(record):
+    """Kaydın değiştirdiği masalar"""
+    if record.get("op") == "move":
+        return (record["source"], record["target"])
+    return (record["masa"],) if "masa" in record else ()
+
+
+def apply_record(state, record):
+    """Tek bir günlük kaydını {masa: [kalemler]} durumuna uygula"""
+    op = record.get("op")
+    if op in ("add", "add_many"):
+        items = state.setdefault(record["masa"], [])
+        known = {i.get("uid") for i in items}
+        for item in (record["items"] if op == "add_many" else [record["item"]]):
+            uid = item.get("uid")
+            if uid and uid in known:
+                continue
+            items.append(item)
+            known.add(uid)
+    elif op == "remove":
+        uids = set(record.get("uids", []))
+        if record["masa"] in state:
+            state[record["masa"]] = [i for i in state[record["masa"]] if i.get("uid") not in uids]
+    elif op == "move":
+        # Sadece taşınan uid'ler aktarılır; tekrar oynatılsa da sonuç değişmez
+        uids = set(record.get("uids", []))
+        source = state.get(record["source"], [])
+        moved = [i for i in source if i.get("uid") in uids]
+        state[record["source"]] = [i for i in source if i.get("uid") not in uids]
+        state.setdefault(record["target"], []).extend(moved)
+    elif op == "status":
+        uids = set(record.get("uids", []))
+        for item in state.get(record["masa"], []):
+            if item.get("uid") in uids:
+                item["durum"] = record["durum"]
+    elif op == "clear":
+        state[record["masa"]] = []
+    else:
+        logger.warning(f"Bilinmeyen adisyon günlük işlemi: {op}")
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Sunucu Eşzamanlılık Modu (threading / eventlet / gevent)
+FastFootSatış
+
+FASTFOOT_ASYNC_MODE ile seçilir (varsayılan: threading).
+
+threading: Her long-poll/websocket bağlantısı bir OS thread'i tutar.
+Geliştirme ve az sayıda cihaz için yeterlidir.
+
+eventlet / gevent: Bağlantılar green thread'lerde çalışır. setup() diğer
+tüm importlardan ÖNCE çağrılmalıdır: socket, select, threading ve time
+modülleri monkey-patch edilir. Böylece terminal sunucusu (5555), Caller ID
+dinleyicisi, POSManager._send_request ve mutfak TCP gönderimi değişiklik
+gerektirmeden işbirlikçi (cooperative) çalışır. psycopg2 C kütüphanesi
+soketi kendisi beklediği için ona ayrıca bir wait callback kurulur;
+sorgu beklerken diğer istemciler bloklanmaz.
+
+Seçilen kütüphane kurulu değilse threading moduna dönülür.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+ASYNC_MODES = ('threading', 'eventlet', 'gevent')
+
+_active_mode = None
+
+
+def requested_mode():
+    """Ortam değişkeninden istenen mod"""
+    mode = (os.getenv("FASTFOOT_ASYNC_MODE") or "threading").strip().lower()
+    if mode not in ASYNC_MODES:
+        logger.warning(f"⚠️ Bilinmeyen FASTFOOT_ASYNC_MODE={mode}, threading kullanılıyor")
+        return 'threading'
+    return mode
+
+
+def setup(mode=None):
+    """Modu etkinleştir (monkey-patch + psycopg2 callback), etkin modu döndür.
+    Birden fazla çağrılırsa ilk seçim geçerlidir."""
+    global _active_mode
+    if _active_mode is not None:
+        return _active_mode
+
+    mode = mode or requested_mode()
+    if mode == 'eventlet':
+        try:
+            import eventlet
+            eventlet.monkey_patch()
+        except ImportError:
+            logger.warning("⚠️ eventlet kurulu değil, threading kullanılıyor")
+            mode = 'threading'
+    elif mode == 'gevent':
+        try:
+            from gevent import monkey
+            monkey.patch_all()
+        except ImportError:
+            logger.warning("⚠️ gevent kurulu değil, threading kullanılıyor")
+            mode = 'threading'
+
+    if mode != 'threading':
+        _patch_psycopg2(mode)
+
+    _active_mode = mode
+    return mode
+
+
+def active_mode():
+    return _active_mode or 'threading'
+
+
+# ==================== PSYCOPG2 ====================
+
+def _patch_psycopg2(mode):
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return
+    extensions.set_wait_callback(_eventlet_wait_callback if mode == 'eventlet' else _gevent_wait_callback)
+
+
+def _wait(conn, wait_read, wait_write):
+    from psycopg2 import extensions, OperationalError
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno())
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno())
+        else:
+            raise OperationalError(f"Beklenmeyen poll sonucu: {state!r}")
+
+
+def _eventlet_wait_callback(conn, timeout=-1):
+    from eventlet.hubs import trampoline
+    _wait(conn, lambda fd: trampoline(fd, read=True), lambda fd: trampoline(fd, write=True))
+
+
+def _gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+    _wait(conn, wait_read, wait_write)
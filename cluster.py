@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Çok Süreçli Web Sunucu (cluster)
+FastFootSatış
+
+N adet web_server süreci tek port arkasında çalışır:
+
+    python3 cluster.py --workers 4 --port 8000
+
+- Ortak durum: açık adisyonlar, ödeme kilitleri ve public QR oturumları
+  shared_store.SharedStore (SQLite, WAL) içindedir. Her süreç belleğindeki
+  adisyonları ortak günlükten günceller.
+- Mesaj kuyruğu: Socket.IO yayınları yerel broker üzerinden tüm süreçlere
+  dağıtılır (BrokerManager). Bir süreçte yapılan emit, diğer süreçlere bağlı
+  istemcilere de ulaşır. Redis/RabbitMQ gerektirmez.
+- Yapışkan proxy: Engine.IO long-polling istekleri oturumu açan sürece
+  gitmelidir. Her süreç sid'in başına kendi etiketini ("w2.") koyar; proxy
+  sid'e göre yönlendirir, yeni bağlantı ve REST isteklerini sırayla dağıtır.
+
+Terminal (5555) ve Caller ID dinleyicileri sadece 0 numaralı süreçte açılır.
+Kapanışta ortak durum active_adisyonlar.json'a yazılır; tek süreçli
+`python3 web_server.py` kaldığı yerden devam eder.
+"""
+
+import argparse
+import asyncio
+import itertools
+import os
+import pickle
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import logging
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FRAME_HEADER = struct.Struct(">I")
+ROLE_PUBLISH = b"P"
+ROLE_SUBSCRIBE = b"S"
+MAX_HEADER_BYTES = 64 * 1024
+
+
+def worker_tag(worker_id):
+    """Engine.IO sid öneki (proxy yönlendirmesi için)"""
+    return f"w{worker_id}"
+
+
+def worker_from_sid(sid):
+    """'w2.xxxx' -> 2, etiket yoksa None"""
+    tag, dot, _ = (sid or "").partition(".")
+    if dot and tag.startswith("w") and tag[1:].isdigit():
+        return int(tag[1:])
+    return None
+
+
+# ==================== SOCKET.IO MESAJ KUYRUĞU ====================
+
+def _socketio_pubsub_base():
+    import socketio
+    return socketio.PubSubManager
+
+
+class BrokerManager(_socketio_pubsub_base()):
+    """
+    Yerel broker üzerinden çalışan Socket.IO client manager'ı. Mesajlar
+    pickle + 4 byte uzunluk başlığıyla gönderilir; broker her mesajı tüm
+    abonelere iletir, gönderen süreç kendi mesajını host_id ile ayıklar.
+    """
+    name = 'fastfoot-broker'
+
+    def __init__(self, url, channel='socketio', write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        host, _, port = url.rpartition(":")
+        self.address = (host or "127.0.0.1", int(port))
+        self._pub = None
+        self._pub_lock = threading.Lock()
+
+    def _publish(self, data):
+        frame = pickle.dumps(data)
+        frame = FRAME_HEADER.pack(len(frame)) + frame
+        with self._pub_lock:
+            for _ in range(2):  # Kopan bağlantıda bir kez yeniden dene
+                try:
+                    if self._pub is None:
+                        self._pub = socket.create_connection(self.address, timeout=5)
+                        self._pub.sendall(ROLE_PUBLISH)
+                    self._pub.sendall(frame)
+                    return
+                except OSError as e:
+                    if self._pub is not None:
+                        self._pub.close()
+                    self._pub = None
+                    error = e
+            self._get_logger().error(f"Broker yayın hatası: {error}")
+
+    def _listen(self):
+        retry = 0.1
+        while True:
+            try:
+                sock = socket.create_connection(self.address, timeout=5)
+                sock.settimeout(None)
+                sock.sendall(ROLE_SUBSCRIBE)
+                reader = sock.makefile("rb")
+                retry = 0.1
+                while True:
+                    header = reader.read(FRAME_HEADER.size)
+                    if len(header) < FRAME_HEADER.size:
+                        break
+                    body = reader.read(FRAME_HEADER.unpack(header)[0])
+                    yield body
+                sock.close()
+            except OSError as e:
+                self._get_logger().warning(f"Broker bağlantısı koptu: {e}")
+            time.sleep(retry)
+            retry = min(retry * 2, 5.0)
+
+
+class Broker:
+    """Yayıncılardan gelen çerçeveleri tüm abonelere ileten pub/sub sunucusu"""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.stats = {'messages': 0, 'bytes': 0}
+
+    async def handle(self, reader, writer):
+        try:
+            role = await reader.readexactly(1)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            writer.close()
+            return
+        if role == ROLE_SUBSCRIBE:
+            self.subscribers.add(writer)
+            try:
+                await reader.read()  # Abone kapanana kadar bekle
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+            finally:
+                self.subscribers.discard(writer)
+                writer.close()
+            return
+        try:
+            while True:
+                header = await reader.readexactly(FRAME_HEADER.size)
+                frame = header + await reader.readexactly(FRAME_HEADER.unpack(header)[0])
+                self.stats['messages'] += 1
+                self.stats['bytes'] += len(frame)
+                for subscriber in list(self.subscribers):
+                    subscriber.write(frame)
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # Yayıncı kapandı veya broker duruyor
+        finally:
+            writer.close()
+
+
+# ==================== YAPIŞKAN PROXY ====================
+
+class StickyProxy:
+    """Engine.IO sid'ine göre süreç seçen HTTP/WebSocket proxy'si"""
+
+    def __init__(self, ports):
+        self.ports = ports  # worker_id -> port
+        self._next = itertools.cycle(sorted(ports))
+
+    def pick(self, target):
+        query = urllib.parse.urlsplit(target).query
+        sid = urllib.parse.parse_qs(query).get("sid", [""])[0]
+        worker_id = worker_from_sid(sid)
+        if worker_id in self.ports:
+            return worker_id
+        return next(self._next)
+
+    async def handle(self, reader, writer):
+        upstream = None
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, asyncio.CancelledError):
+            writer.close()
+            return
+        try:
+            lines = head[:-4].split(b"\r\n")
+            target = lines[0].split(b" ")[1].decode("latin-1")
+            worker_id = self.pick(target)
+            upgrade = any(line.lower().startswith(b"upgrade:") for line in lines[1:])
+            headers = lines[1:]
+            if not upgrade:
+                # İstek başına bağlantı: sonraki istek farklı sürece gidebilir
+                headers = _close_connection(headers)
+            peer = writer.get_extra_info("peername")
+            if peer:
+                headers.append(b"X-Forwarded-For: " + peer[0].encode("latin-1"))
+
+            up_reader, upstream = await asyncio.open_connection("127.0.0.1", self.ports[worker_id])
+            upstream.write(b"\r\n".join([lines[0]] + headers) + b"\r\n\r\n")
+            to_worker = asyncio.ensure_future(_pipe(reader, upstream))
+            if not upgrade:
+                # İstemci bağlantıyı tekrar kullanmasın (yanıt da kapanışı bildirir)
+                response = (await up_reader.readuntil(b"\r\n\r\n"))[:-4].split(b"\r\n")
+                writer.write(b"\r\n".join(response[:1] + _close_connection(response[1:])) + b"\r\n\r\n")
+            to_client = asyncio.ensure_future(_pipe(up_reader, writer))
+            done, _ = await asyncio.wait({to_worker, to_client}, return_when=asyncio.FIRST_COMPLETED)
+            if to_worker in done and upgrade:
+                upstream.close()
+            await to_client
+            to_worker.cancel()
+        except (ConnectionError, OSError, IndexError, ValueError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError, asyncio.CancelledError):
+            pass
+        finally:
+            if upstream is not None:
+                upstream.close()
+            writer.close()
+
+
+def _close_connection(headers):
+    headers = [line for line in headers if not line.lower().startswith((b"connection:", b"keep-alive:"))]
+    return headers + [b"Connection: close"]
+
+
+async def _pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, OSError):
+        pass
+
+
+# ==================== SUPERVISOR ====================
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0, proc=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+class Cluster:
+    def __init__(self, workers, port, host="0.0.0.0", snapshot_path=None, store_path=None):
+        self.workers = max(1, int(workers))
+        self.port = port
+        self.host = host
+        self.snapshot_path = snapshot_path or os.getenv(
+            "FASTFOOT_ADISYON_FILE", os.path.join(SCRIPT_DIR, "active_adisyonlar.json"))
+        self.store_path = store_path or os.path.splitext(self.snapshot_path)[0] + ".shared.db"
+        self.broker_port = free_port()
+        self.ports = {n: free_port() for n in range(self.workers)}
+        self.procs = {}
+        self.boot = format(int(time.time()), 'x')
+        self._stopping = False
+
+    def prepare_store(self):
+        """Ortak depoyu hazırla: önceki çalışma düzgün kapanmadıysa depodan, yoksa dosyadan devam"""
+        from shared_store import SharedStore, import_from_file
+        shared = SharedStore(self.store_path)
+        try:
+            if shared.has_snapshot():
+                logger.info("↻ Ortak depo önceki çalışmadan devralındı")
+                shared.compact()
+            else:
+                import_from_file(shared, self.snapshot_path)
+            shared.reset_claims()
+        finally:
+            shared.close()
+
+    def release_claims(self, pid):
+        """Kapanan sürecin ödeme/ad ayırmalarını bırak (masaları iptal/taşımaya kilitli kalmasın)"""
+        from shared_store import SharedStore
+        shared = SharedStore(self.store_path)
+        try:
+            released = shared.release_claims(pid)
+        finally:
+            shared.close()
+        if released:
+            logger.warning(f"⚠️ Kapanan süreçten (pid {pid}) kalan {released} ödeme/ad ayırması bırakıldı")
+        return released
+
+    def export_store(self):
+        """Kapanış: ortak durumu dosyaya yaz, depoyu sil"""
+        from shared_store import SharedStore, export_to_file, remove_store_files
+        shared = SharedStore(self.store_path)
+        try:
+            export_to_file(shared, self.snapshot_path)
+        finally:
+            shared.close()
+        remove_store_files(self.store_path)
+        logger.info(f"✓ Ortak durum {self.snapshot_path} dosyasına yazıldı")
+
+    def spawn(self, worker_id):
+        env = dict(os.environ)
+        env.update({
+            "FASTFOOT_WORKER_ID": str(worker_id),
+            "FASTFOOT_WEB_PORT": str(self.ports[worker_id]),
+            "FASTFOOT_WEB_HOST": "127.0.0.1",
+            "FASTFOOT_SHARED_STORE": self.store_path,
+            "FASTFOOT_BROKER": f"127.0.0.1:{self.broker_port}",
+            "FASTFOOT_CLUSTER_BOOT": self.boot,
+            "FASTFOOT_ADISYON_FILE": self.snapshot_path,
+        })
+        proc = subprocess.Popen([sys.executable, os.path.join(SCRIPT_DIR, "web_server.py")], env=env)
+        self.procs[worker_id] = proc
+        return proc
+
+    async def supervise(self):
+        """Çöken süreci aynı numara ve portla yeniden başlat"""
+        while not self._stopping:
+            await asyncio.sleep(1.0)
+            for worker_id, proc in list(self.procs.items()):
+                if proc.poll() is not None and not self._stopping:
+                    logger.warning(f"⚠️ Süreç {worker_id} kapandı (kod {proc.returncode}), yeniden başlatılıyor")
+                    try:
+                        await asyncio.get_running_loop().run_in_executor(None, self.release_claims, proc.pid)
+                    except Exception as e:
+                        logger.error(f"Ödeme/ad ayırmaları bırakılamadı: {e}")
+                    self.spawn(worker_id)
+
+    async def serve(self):
+        broker = Broker()
+        broker_server = await asyncio.start_server(broker.handle, "127.0.0.1", self.broker_port)
+        for worker_id in self.ports:
+            self.spawn(worker_id)
+        for worker_id, port in self.ports.items():
+            if not await asyncio.get_running_loop().run_in_executor(
+                    None, wait_for_port, port, 60.0, self.procs[worker_id]):
+                raise RuntimeError(f"Süreç {worker_id} başlamadı")
+
+        proxy = StickyProxy(self.ports)
+        proxy_server = await asyncio.start_server(proxy.handle, self.host, self.port, limit=MAX_HEADER_BYTES)
+        logger.info(f"🌐 Cluster hazır: http://{self.host}:{self.port} ({self.workers} süreç)")
+        print(f"cluster ready port={self.port}", flush=True)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):  # Windows
+                pass
+        watcher = asyncio.ensure_future(self.supervise())
+        try:
+            await stop.wait()
+        finally:
+            self._stopping = True
+            watcher.cancel()
+            proxy_server.close()
+            self.stop_workers()
+            broker_server.close()
+
+    def stop_workers(self):
+        for proc in self.procs.values():
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in self.procs.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    def run(self):
+        self.prepare_store()
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._stopping = True
+            self.stop_workers()
+            self.export_store()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="FastFootSatış çok süreçli web sunucu")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("FASTFOOT_WORKERS", "2")))
+    parser.add_argument("--port", type=int, default=int(os.getenv("FASTFOOT_WEB_PORT", "8000")))
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args()
+    Cluster(args.workers, args.port, host=args.host).run()
+
+
+if __name__ == "__main__":
+    main()
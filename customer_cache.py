@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Caller ID Müşteri Önbelleği
+FastFootSatış
+
+Gelen çağrıda müşteri profili (cari, son siparişler, bakiye) normalize
+edilmiş telefon numarasına göre LRU önbellekte tutulur. Aynı numara
+çaldıkça (ikinci zil, tekrar arama) veri tabanına gidilmez. Kayıtlı
+olmayan numaralar da (None) önbelleğe alınır.
+
+Satış ve cari yazımları ilgili kaydı cari ismi veya telefonla geçersiz
+kılar (database.py). Başka süreçlerin (siparis.py, cluster worker'ları)
+yazımlarını bu süreç görmez; bu yüzden her kaydın bir ömrü (ttl) vardır.
+
+Yükleme sırasında geçersiz kılma olursa yüklenen (eski olabilecek) değer
+önbelleğe yazılmaz, sadece çağırana döner.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+
+def normalize_phone(phone):
+    """Rakam dışı karakterleri at, son 10 hane (TR: 0532 123 45 67 / +90532... -> 5321234567)"""
+    digits = ''.join(ch for ch in str(phone or '') if ch.isdigit())
+    return digits[-10:]
+
+
+class CustomerCache:
+    def __init__(self, maxsize=1000, ttl=60):
+        """
+        :param maxsize: Tutulan en fazla numara (en eski kullanılan düşer)
+        :param ttl: Kaydın ömrü (saniye); 0 ise süresiz
+        """
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # telefon -> (bitiş zamanı, profil veya None)
+        self._names = {}               # cari ismi -> telefon
+        self._generation = 0
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'invalidations': 0,
+            'evictions': 0
+        }
+
+    def configure(self, maxsize=None, ttl=None):
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = max(1, int(maxsize))
+            if ttl is not None:
+                self.ttl = ttl
+            self._evict()
+
+    def get(self, phone, loader, now=None):
+        """
+        Profili önbellekten döndür; yoksa loader(normalize telefon) ile yükle.
+        Numarası çözülemeyen arama için None döner (loader çağrılmaz).
+        """
+        key = normalize_phone(phone)
+        if not key:
+            return None
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (not self.ttl or entry[0] > now):
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            generation = self._generation
+
+        value = loader(key)
+
+        with self._lock:
+            if generation == self._generation:
+                self._drop(key)
+                self._entries[key] = (now + (self.ttl or 0), value)
+                if value and value.get('cari_isim'):
+                    self._names[value['cari_isim']] = key
+                self._evict()
+        return value
+
+    def invalidate(self, cari_isim=None, phone=None):
+        """Cari ismine ve/veya telefona ait kaydı düşür"""
+        with self._lock:
+            self._generation += 1
+            keys = {self._names.get(cari_isim), normalize_phone(phone) if phone else None}
+            for key in keys:
+                if key and self._drop(key):
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._names.clear()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[1] and self._names.get(entry[1].get('cari_isim')) == key:
+            del self._names[entry[1]['cari_isim']]
+        return entry is not None
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            key = next(iter(self._entries))
+            self._drop(key)
+            self.stats['evictions'] += 1
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['size'] = len(self._entries)
+            stats['maxsize'] = self.maxsize
+            stats['ttl_sec'] = self.ttl
+        return stats
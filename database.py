@@ -4,22 +4,114 @@ PostgreSQL Veri Tabanı Yönetim Modülü
 FastFootSatış Projesi
 """
 
+import os
+import re
+import csv
+import gzip
 import psycopg2
 from psycopg2 import pool, sql
-from psycopg2.extras import RealDictCursor
-from datetime import datetime
+from psycopg2.extras import RealDictCursor, execute_values
+from datetime import datetime, date, timedelta
 from contextlib import contextmanager
 from db_config import DB_CONFIG
+import async_runtime
+from customer_cache import CustomerCache, normalize_phone
+from sales_ledger import SALES_COLUMNS, sale_row, copy_buffer
+
+
+def day_range(tarih=None):
+    """
+    Gün için yarı açık zaman aralığı [gün başı, ertesi gün başı).
+    WHERE DATE(tarih_saat) = ... indeks kullanamaz; tarih_saat >= ... AND tarih_saat < ... kullanır.
+    tarih: 'YYYY-MM-DD', date veya datetime (None: bugün)
+    """
+    if tarih is None:
+        tarih = date.today()
+    elif isinstance(tarih, datetime):
+        tarih = tarih.date()
+    elif not isinstance(tarih, date):
+        tarih = datetime.strptime(str(tarih), "%Y-%m-%d").date()
+    start = datetime.combine(tarih, datetime.min.time())
+    return start, start + timedelta(days=1)
+
+
+def copy_supported():
+    """
+    COPY (cursor.copy_expert) psycopg2 wait callback'i kuruluyken çalışmaz;
+    eventlet/gevent modunda (async_runtime) kullanılmaz.
+    """
+    return async_runtime.active_mode() == 'threading'
+
+
+def month_start(tarih=None):
+    """Ayın ilk günü 00:00"""
+    tarih = tarih or datetime.now()
+    return datetime(tarih.year, tarih.month, 1)
+
+
+def add_months(tarih, months):
+    """Ayın ilk gününe ay ekle / çıkar"""
+    index = tarih.year * 12 + tarih.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
 
 class Database:
     """PostgreSQL veri tabanı işlemleri için singleton sınıf"""
     
     _instance = None
     _pool = None
+
+    # satislar indeksleri: gün sonu (tarih aralığı), vardiya toplamları, müşteri geçmişi / Caller ID
+    SALES_INDEXES = (
+        "CREATE INDEX IF NOT EXISTS idx_satislar_tarih ON satislar(tarih_saat)",
+        "CREATE INDEX IF NOT EXISTS idx_satislar_vardiya_odeme ON satislar(vardiya_id, odeme)",
+        "CREATE INDEX IF NOT EXISTS idx_satislar_masa_tarih ON satislar(masa, tarih_saat DESC)",
+    )
+
+    # Aylık bölümlenen tablolar: tablo -> (bölüm anahtarı, bölümlemeden sonra yeniden kurulan indeksler)
+    PARTITIONED_TABLES = {
+        'satislar': ('tarih_saat', SALES_INDEXES),
+        'cari_hareketler': ('tarih', (
+            "CREATE INDEX IF NOT EXISTS idx_cari_hareketler_cari ON cari_hareketler(cari_id)",
+        )),
+    }
+
+    # Gün/saat satış özeti: save_sales_batch ile aynı işlemde artırılır, raporlar buradan okur.
+    # Anahtarda NULL olamayacağı için terminal_id '' ve vardiya_id 0 olarak tutulur.
+    SALES_ROLLUP_DDL = (
+        """
+        CREATE TABLE IF NOT EXISTS satis_ozet (
+            tarih DATE NOT NULL,
+            saat SMALLINT NOT NULL,
+            odeme TEXT NOT NULL,
+            tip TEXT NOT NULL,
+            urun TEXT NOT NULL,
+            terminal_id TEXT NOT NULL DEFAULT '',
+            vardiya_id INTEGER NOT NULL DEFAULT 0,
+            satir INTEGER NOT NULL DEFAULT 0,
+            adet BIGINT NOT NULL DEFAULT 0,
+            toplam DECIMAL(14, 2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (tarih, saat, odeme, tip, urun, terminal_id, vardiya_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_satis_ozet_vardiya ON satis_ozet(vardiya_id, odeme)",
+    )
+
+    # satislar satırlarını satis_ozet anahtarına indirger ({filtre} ile)
+    SALES_ROLLUP_SELECT = """
+        SELECT tarih_saat::date, EXTRACT(HOUR FROM tarih_saat)::smallint, odeme,
+               COALESCE(tip, 'normal'), urun, COALESCE(terminal_id, ''), COALESCE(vardiya_id, 0),
+               COUNT(*), SUM(adet), SUM(fiyat * adet)
+        FROM satislar
+        WHERE {filtre}
+        GROUP BY 1, 2, 3, 4, 5, 6, 7
+        ORDER BY 1, 2, 3, 4, 5, 6, 7
+    """
     
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(Database, cls).__new__(cls)
+            cls._instance.customer_cache = CustomerCache()
             cls._instance._initialize_pool()
         return cls._instance
     
@@ -207,8 +299,23 @@ class Database:
                 )
             """)
 
+            # Cari bakiyesi cari_hesaplar.bakiye'de tutulur (save_cari_transaction ile aynı işlemde)
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM information_schema.columns
+                               WHERE table_schema = current_schema()
+                                 AND table_name = 'cari_hesaplar' AND column_name = 'bakiye')
+            """)
+            if not cursor.fetchone()[0]:
+                cursor.execute("ALTER TABLE cari_hesaplar ADD COLUMN bakiye DECIMAL(14, 2) NOT NULL DEFAULT 0")
+                self._rebuild_cari_balances(cursor)
+
             # İNDEKSLER
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_cari_hareketler_cari ON cari_hareketler(cari_id)")
+            # Caller ID: normalize telefon (son 10 hane)
+            cursor.execute(r"CREATE INDEX IF NOT EXISTS idx_cari_hesaplar_telefon ON cari_hesaplar((right(regexp_replace(telefon, '\D', '', 'g'), 10)))")
+            cursor.execute("ALTER TABLE satislar ADD COLUMN IF NOT EXISTS vardiya_id INTEGER")
+            for statement in self.SALES_INDEXES + self.SALES_ROLLUP_DDL:
+                cursor.execute(statement)
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_menu_kategori ON menu(kategori)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_vardiyalar_durum ON vardiyalar(durum)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_public_qr_nonces_exp ON public_qr_nonces(expires_at)")
@@ -246,74 +353,246 @@ class Database:
                 )
             """)
             
+            # SİPARİŞ SATIRI ZAMANLARI (oluşma -> mutfak -> hazır -> servis -> ödeme)
+            # uid kısa olduğu için günler arasında tekrar edebilir: anahtar (uid, olusturma)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS siparis_zamanlari (
+                    id BIGSERIAL PRIMARY KEY,
+                    uid TEXT NOT NULL,
+                    masa TEXT,
+                    urun TEXT NOT NULL,
+                    adet INTEGER DEFAULT 1,
+                    istasyon TEXT,
+                    kaynak TEXT,
+                    olusturma TIMESTAMPTZ NOT NULL,
+                    mutfaga_gonderim TIMESTAMPTZ,
+                    hazir TIMESTAMPTZ,
+                    servis TIMESTAMPTZ,
+                    odeme TIMESTAMPTZ,
+                    iptal TIMESTAMPTZ,
+                    UNIQUE (uid, olusturma)
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_siparis_zamanlari_hazir ON siparis_zamanlari(hazir)")
+
             # AYARLAR TABLOSUNA SESLİ ASİSTAN ALANLARI (Eğer varsa)
             # Mevcut sistemde ayarlar dosyadan okunuyor olabilir, 
             # ancak blacklist tablo olarak kalmalı.
 
             print("✓ Veri tabanı şeması güncellendi")
+
+            # satis_ozet yeni eklendiyse geçmiş satışlardan bir kez doldur
+            cursor.execute("SELECT NOT EXISTS (SELECT 1 FROM satis_ozet) AND EXISTS (SELECT 1 FROM satislar)")
+            bootstrap_rollup = cursor.fetchone()[0]
+        if bootstrap_rollup:
+            rows = self.rebuild_sales_rollup()
+            print(f"✓ satis_ozet geçmiş satışlardan oluşturuldu ({rows} satır)")
+
+        # Yeni (boş) kurulumda satislar / cari_hareketler baştan aylık bölümlenir;
+        # dolu eski tablolar scripts/partition_tables.py --migrate ile taşınır
+        self.migrate_to_partitions(only_empty=True)
+        self.ensure_partitions()
     
     # ==================== SATIŞ İŞLEMLERİ ====================
     
     def save_sale(self, urun, adet, fiyat, odeme, tip='normal', masa=None, terminal_id=None, vardiya_id=None):
         """Satış kaydı ekle"""
-        with self.get_cursor() as cursor:
-            cursor.execute("""
-                INSERT INTO satislar (urun, adet, fiyat, odeme, tip, masa, terminal_id, vardiya_id)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (urun, adet, fiyat, odeme, tip, masa, terminal_id, vardiya_id))
-            return cursor.fetchone()['id']
+        return self.save_sales_batch([{
+            'urun': urun, 'adet': adet, 'fiyat': fiyat, 'odeme': odeme, 'tip': tip,
+            'masa': masa, 'terminal_id': terminal_id, 'vardiya_id': vardiya_id
+        }])[0]
     
+    # Bu satır sayısından büyük partiler COPY ile yazılır
+    SALES_COPY_THRESHOLD = 500
+
     def save_sales_batch(self, sales_list):
-        """Toplu satış kaydı ekle"""
-        with self.get_cursor() as cursor:
-            for sale in sales_list:
-                cursor.execute("""
-                    INSERT INTO satislar (urun, adet, fiyat, odeme, tip, tarih_saat, masa, terminal_id, vardiya_id)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    sale.get('urun'),
-                    sale.get('adet', 1),
-                    sale.get('fiyat'),
-                    sale.get('odeme', 'Nakit'),
-                    sale.get('tip', 'normal'),
-                    sale.get('Tarih_Saat', datetime.now()),
-                    sale.get('masa'),
-                    sale.get('terminal_id'),
-                    sale.get('vardiya_id')
-                ))
+        """
+        Toplu satış kaydı: tek çok satırlı INSERT, büyük partide COPY FROM STDIN
+        (eventlet/gevent modunda her parti INSERT ile yazılır).
+        satis_ozet aynı işlemde güncellenir; eklenen id'ler satış sırasıyla döner.
+        """
+        now = datetime.now()
+        rows = [sale_row(sale, now) for sale in sales_list]
+        if not rows:
+            return []
+        with self.get_cursor(dict_cursor=False) as cursor:
+            if len(rows) > self.SALES_COPY_THRESHOLD and copy_supported():
+                ids = self._copy_sales(cursor, rows)
+            else:
+                ids = self._insert_sales(cursor, rows)
+            self._rollup_sales(cursor, ids, [row[SALES_COLUMNS.index('tarih_saat')] for row in rows])
+        for masa in {row[SALES_COLUMNS.index('masa')] for row in rows}:
+            self.customer_cache.invalidate(cari_isim=masa)
+        return ids
+
+    def _insert_sales(self, cursor, rows):
+        result = execute_values(cursor, f"""
+            INSERT INTO satislar ({', '.join(SALES_COLUMNS)}) VALUES %s
+            RETURNING id
+        """, rows, page_size=len(rows), fetch=True)
+        return [row[0] for row in result]
+
+    def _copy_sales(self, cursor, rows):
+        # COPY id döndürmez: id'ler önce sequence'tan ayrılır, satırlarla birlikte yazılır
+        cursor.execute("""
+            SELECT nextval(pg_get_serial_sequence('satislar', 'id'))
+            FROM generate_series(1, %s)
+        """, (len(rows),))
+        ids = [row[0] for row in cursor.fetchall()]
+        cursor.copy_expert(
+            f"COPY satislar (id, {', '.join(SALES_COLUMNS)}) FROM STDIN",
+            copy_buffer((sale_id,) + row for sale_id, row in zip(ids, rows)))
+        return ids
+
+    def _rollup_sales(self, cursor, ids, times=()):
+        # Anahtar sırasıyla yazılır: aynı anahtarları artıran eşzamanlı partiler kilitlenmez.
+        # Zaman aralığı bölümlü satislar'da sadece ilgili ayın bölümünün okunmasını sağlar.
+        filtre, params = 'id = ANY(%s)', [list(ids)]
+        if times and all(isinstance(t, datetime) for t in times):
+            filtre += ' AND tarih_saat >= %s AND tarih_saat <= %s'
+            params += [min(times), max(times)]
+        cursor.execute(f"""
+            INSERT INTO satis_ozet (tarih, saat, odeme, tip, urun, terminal_id, vardiya_id, satir, adet, toplam)
+            {self.SALES_ROLLUP_SELECT.format(filtre=filtre)}
+            ON CONFLICT (tarih, saat, odeme, tip, urun, terminal_id, vardiya_id) DO UPDATE SET
+                satir = satis_ozet.satir + EXCLUDED.satir,
+                adet = satis_ozet.adet + EXCLUDED.adet,
+                toplam = satis_ozet.toplam + EXCLUDED.toplam
+        """, params)
+
+    def rebuild_sales_rollup(self, baslangic=None, bitis=None):
+        """
+        satis_ozet'i satislar'dan yeniden hesapla: [baslangic, bitis) günleri (None: tümü).
+        Tek işlemdir; geçmiş veri yüklendikten veya satislar elle düzeltildikten sonra çalıştırılır.
+        Başlangıç verilmezse bölümlü satislar'ın en eski ayından başlanır (arşivlenmiş ayların özeti kalır).
+        Dönen: yazılan özet satırı sayısı
+        """
+        bitis = day_range(bitis)[0] if bitis else datetime.max
+        with self.get_cursor(dict_cursor=False) as cursor:
+            cursor.execute("LOCK TABLE satis_ozet IN EXCLUSIVE MODE")
+            if baslangic:
+                baslangic = day_range(baslangic)[0]
+            else:
+                # Arşivlenen aylar satislar'da yok; özetleri en eski ay bölümünden öncesi korunur
+                months = self._month_partitions(cursor, 'satislar')
+                baslangic = months[0][1] if months else datetime.min
+            cursor.execute("DELETE FROM satis_ozet WHERE tarih >= %s AND tarih < %s",
+                           (baslangic.date(), bitis.date()))
+            cursor.execute(f"""
+                INSERT INTO satis_ozet (tarih, saat, odeme, tip, urun, terminal_id, vardiya_id, satir, adet, toplam)
+                {self.SALES_ROLLUP_SELECT.format(filtre='tarih_saat >= %s AND tarih_saat < %s')}
+            """, (baslangic, bitis))
+            return cursor.rowcount
     
     def get_sales_by_date(self, tarih=None):
         """Tarihe göre satışları getir"""
-        if tarih is None:
-            tarih = datetime.now().strftime("%Y-%m-%d")
-        
+        baslangic, bitis = day_range(tarih)
         with self.get_cursor() as cursor:
             cursor.execute("""
                 SELECT * FROM satislar
-                WHERE DATE(tarih_saat) = %s
+                WHERE tarih_saat >= %s AND tarih_saat < %s
                 ORDER BY tarih_saat DESC
-            """, (tarih,))
+            """, (baslangic, bitis))
             return cursor.fetchall()
     
     def get_daily_summary(self, tarih=None):
-        """Günlük özet rapor"""
-        if tarih is None:
-            tarih = datetime.now().strftime("%Y-%m-%d")
-        
+        """Günlük özet rapor (satis_ozet'ten; adet = satış satırı sayısı)"""
         with self.get_cursor() as cursor:
             cursor.execute("""
                 SELECT 
                     odeme,
                     tip,
-                    SUM(fiyat * adet) as toplam,
-                    COUNT(*) as adet
-                FROM satislar
-                WHERE DATE(tarih_saat) = %s
+                    SUM(toplam) as toplam,
+                    SUM(satir) as adet
+                FROM satis_ozet
+                WHERE tarih = %s
                 GROUP BY odeme, tip
-            """, (tarih,))
+            """, (day_range(tarih)[0].date(),))
+            return cursor.fetchall()
+
+    def get_hourly_summary(self, tarih=None):
+        """Günün saat ve ödeme türü bazında satışları (satis_ozet'ten; cari tahsilat/ödeme kayıtları hariç)"""
+        with self.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT
+                    saat,
+                    odeme,
+                    SUM(toplam) as toplam,
+                    SUM(satir) as satir,
+                    SUM(adet) as urun_adet
+                FROM satis_ozet
+                WHERE tarih = %s AND tip NOT IN ('cari_tahsilat', 'cari_odeme')
+                GROUP BY saat, odeme
+                ORDER BY saat, odeme
+            """, (day_range(tarih)[0].date(),))
             return cursor.fetchall()
     
+    # ==================== SİPARİŞ SATIRI ZAMANLARI ====================
+
+    def save_line_timestamps(self, rows):
+        """Satır aşama zamanlarını toplu yaz; önceden yazılmış aşama ezilmez"""
+        columns = ('uid', 'masa', 'urun', 'adet', 'istasyon', 'kaynak', 'olusturma',
+                   'mutfaga_gonderim', 'hazir', 'servis', 'odeme', 'iptal')
+        with self.get_cursor(dict_cursor=False) as cursor:
+            execute_values(cursor, f"""
+                INSERT INTO siparis_zamanlari ({', '.join(columns)}) VALUES %s
+                ON CONFLICT (uid, olusturma) DO UPDATE SET
+                    istasyon = COALESCE(siparis_zamanlari.istasyon, EXCLUDED.istasyon),
+                    mutfaga_gonderim = COALESCE(siparis_zamanlari.mutfaga_gonderim, EXCLUDED.mutfaga_gonderim),
+                    hazir = COALESCE(siparis_zamanlari.hazir, EXCLUDED.hazir),
+                    servis = COALESCE(siparis_zamanlari.servis, EXCLUDED.servis),
+                    odeme = COALESCE(siparis_zamanlari.odeme, EXCLUDED.odeme),
+                    iptal = COALESCE(siparis_zamanlari.iptal, EXCLUDED.iptal)
+            """, [tuple(row.get(c) for c in columns) for row in rows])
+
+    def mark_line_stages(self, rows):
+        """
+        Başka süreçte oluşmuş satırların aşama zamanlarını uid'nin son kaydına
+        işle (önceden yazılmış aşama ezilmez). Kaydı bulunan uid'leri döndürür;
+        bulunmayanlar oluşturan süreç yazınca tekrar denenir.
+        """
+        columns = ('mutfaga_gonderim', 'hazir', 'servis', 'odeme', 'iptal')
+        with self.get_cursor(dict_cursor=False) as cursor:
+            found = execute_values(cursor, f"""
+                UPDATE siparis_zamanlari z SET
+                    {', '.join(f"{c} = COALESCE(z.{c}, v.{c})" for c in columns)}
+                FROM (VALUES %s) AS v (uid, {', '.join(columns)})
+                WHERE z.id = (SELECT id FROM siparis_zamanlari
+                              WHERE uid = v.uid ORDER BY olusturma DESC LIMIT 1)
+                RETURNING z.uid
+            """, [tuple(row.get(c) for c in ('uid',) + columns) for row in rows],
+                template=f"(%s{', %s::timestamptz' * len(columns)})", fetch=True)
+        return [row[0] for row in found]
+
+    def get_line_timestamps(self, uids):
+        """Açık (ödenmemiş, iptal edilmemiş) satırların son kaydı - yeniden başlatma için"""
+        if not uids:
+            return []
+        with self.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT DISTINCT ON (uid) * FROM siparis_zamanlari
+                WHERE uid = ANY(%s) AND odeme IS NULL AND iptal IS NULL
+                ORDER BY uid, olusturma DESC
+            """, (list(uids),))
+            return cursor.fetchall()
+
+    def get_prep_time_stats(self, baslangic, bitis):
+        """
+        [baslangic, bitis) aralığında hazır olan satırların hazırlanma süresi
+        (hazır - mutfağa gönderim, saniye): istasyon başına ve istasyon+ürün başına p50/p95
+        """
+        with self.get_cursor() as cursor:
+            cursor.execute("""
+                SELECT istasyon, urun, COUNT(*) AS count,
+                       percentile_cont(0.5) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM hazir - mutfaga_gonderim)) AS p50_sec,
+                       percentile_cont(0.95) WITHIN GROUP (ORDER BY EXTRACT(EPOCH FROM hazir - mutfaga_gonderim)) AS p95_sec
+                FROM siparis_zamanlari
+                WHERE hazir >= %s AND hazir < %s AND mutfaga_gonderim IS NOT NULL
+                GROUP BY GROUPING SETS ((istasyon), (istasyon, urun))
+                ORDER BY p95_sec DESC
+            """, (baslangic, bitis))
+            return cursor.fetchall()
+
     # ==================== CARİ İŞLEMLERİ ====================
     
     def get_or_create_cari(self, cari_isim):
@@ -343,12 +622,52 @@ class Database:
                     adres = COALESCE(%s, adres)
                 WHERE cari_isim = %s
             """, (telefon, adres, cari_isim))
+        self.customer_cache.invalidate(cari_isim=cari_isim, phone=telefon)
 
     def get_cari_by_phone(self, telefon):
-        """Telefon numarasına göre cari getir"""
+        """Telefon numarasına göre cari getir (0532 123 45 67 / +90532... aynı numaradır)"""
+        telefon = normalize_phone(telefon)
+        if not telefon:
+            return None
         with self.get_cursor() as cursor:
-            cursor.execute("SELECT * FROM cari_hesaplar WHERE telefon = %s", (telefon,))
+            cursor.execute(r"""
+                SELECT * FROM cari_hesaplar
+                WHERE right(regexp_replace(telefon, '\D', '', 'g'), 10) = %s
+                ORDER BY id
+                LIMIT 1
+            """, (telefon,))
             return cursor.fetchone()
+
+    def get_customer_profile(self, telefon):
+        """
+        Caller ID için müşteri profili: cari, bakiye ve son 5 sipariş tek sorguda.
+        Sonuç normalize telefona göre önbelleğe alınır (customer_cache.py);
+        kayıtlı olmayan numara için None döner.
+        """
+        return self.customer_cache.get(telefon, self._load_customer_profile)
+
+    def _load_customer_profile(self, telefon, limit=5):
+        with self.get_cursor() as cursor:
+            cursor.execute(r"""
+                SELECT ch.id, ch.cari_isim, ch.telefon, ch.adres, ch.olusturma_tarihi, ch.bakiye,
+                       (SELECT COALESCE(json_agg(h), '[]'::json) FROM (
+                            SELECT urun, adet, fiyat, tarih_saat::text AS tarih_saat, odeme
+                            FROM satislar
+                            WHERE masa = ch.cari_isim
+                            ORDER BY tarih_saat DESC
+                            LIMIT %s
+                        ) h) AS history
+                FROM cari_hesaplar ch
+                WHERE right(regexp_replace(ch.telefon, '\D', '', 'g'), 10) = %s
+                ORDER BY ch.id
+                LIMIT 1
+            """, (limit, telefon))
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        profile = dict(row)
+        profile['bakiye'] = float(profile['bakiye'])
+        return profile
     
     def get_customer_order_history(self, cari_isim, limit=5):
         """Müşterinin geçmiş siparişlerini getir"""
@@ -370,42 +689,42 @@ class Database:
             return cursor.fetchall()
     
     def save_cari_transaction(self, cari_isim, islem, tutar):
-        """Cari hesap hareketi ekle"""
+        """
+        Cari hesap hareketi ekle. Hesap yoksa açılır; bakiye hareketle aynı işlemde
+        güncellenir (hesap satırı commit'e kadar kilitli, aynı cariye eşzamanlı
+        hareketler sırayla yazılır).
+        """
         with self.get_cursor() as cursor:
-            cari_id = self.get_or_create_cari(cari_isim)
+            cursor.execute("""
+                INSERT INTO cari_hesaplar (cari_isim, bakiye)
+                VALUES (%s, %s)
+                ON CONFLICT (cari_isim) DO UPDATE SET bakiye = cari_hesaplar.bakiye + EXCLUDED.bakiye
+                RETURNING id
+            """, (cari_isim, tutar))
+            cari_id = cursor.fetchone()['id']
             cursor.execute("""
                 INSERT INTO cari_hareketler (cari_id, islem, tutar)
                 VALUES (%s, %s, %s)
                 RETURNING id
             """, (cari_id, islem, tutar))
-            return cursor.fetchone()['id']
+            hareket_id = cursor.fetchone()['id']
+        self.customer_cache.invalidate(cari_isim=cari_isim)
+        return hareket_id
     
     def get_cari_balance(self, cari_isim):
-        """Cari bakiyesini getir"""
+        """Cari bakiyesini getir (olmayan cari için 0; hesap açmaz)"""
         with self.get_cursor() as cursor:
-            cari_id = self.get_or_create_cari(cari_isim)
-            cursor.execute("""
-                SELECT COALESCE(SUM(tutar), 0) as bakiye
-                FROM cari_hareketler
-                WHERE cari_id = %s
-            """, (cari_id,))
-            return float(cursor.fetchone()['bakiye'])
+            cursor.execute("SELECT bakiye FROM cari_hesaplar WHERE cari_isim = %s", (cari_isim,))
+            row = cursor.fetchone()
+            return float(row['bakiye']) if row else 0.0
     
     def get_all_cari_accounts(self):
         """Tüm cari hesapları listele"""
         with self.get_cursor() as cursor:
             cursor.execute("""
-                SELECT 
-                    ch.id,
-                    ch.cari_isim,
-                    ch.telefon,
-                    ch.adres,
-                    ch.olusturma_tarihi,
-                    COALESCE(SUM(chr.tutar), 0) as bakiye
-                FROM cari_hesaplar ch
-                LEFT JOIN cari_hareketler chr ON ch.id = chr.cari_id
-                GROUP BY ch.id, ch.cari_isim, ch.telefon, ch.adres, ch.olusturma_tarihi
-                ORDER BY ch.cari_isim
+                SELECT id, cari_isim, telefon, adres, olusturma_tarihi, bakiye
+                FROM cari_hesaplar
+                ORDER BY cari_isim
             """)
             return cursor.fetchall()
     
@@ -421,9 +740,48 @@ class Database:
             return cursor.fetchall()
     
     def delete_cari_account(self, cari_isim):
-        """Cari hesabı sil (CASCADE ile hareketler de silinir)"""
+        """Cari hesabı sil (CASCADE ile hareketler de silinir; bakiye hesap satırıyla gider)"""
         with self.get_cursor() as cursor:
             cursor.execute("DELETE FROM cari_hesaplar WHERE cari_isim = %s", (cari_isim,))
+        self.customer_cache.invalidate(cari_isim=cari_isim)
+
+    # Tutulan bakiye ile hareket toplamının farklı olduğu cariler
+    CARI_BALANCE_DIFF = """
+        SELECT ch.id, ch.cari_isim, ch.bakiye, COALESCE(h.toplam, 0) AS hareket_toplami
+        FROM cari_hesaplar ch
+        LEFT JOIN (SELECT cari_id, SUM(tutar) AS toplam FROM cari_hareketler GROUP BY cari_id) h
+            ON h.cari_id = ch.id
+        WHERE ch.bakiye <> COALESCE(h.toplam, 0)
+        ORDER BY ch.cari_isim
+    """
+
+    def _rebuild_cari_balances(self, cursor):
+        cursor.execute(f"""
+            UPDATE cari_hesaplar ch SET bakiye = d.hareket_toplami
+            FROM ({self.CARI_BALANCE_DIFF}) d
+            WHERE ch.id = d.id
+        """)
+        return cursor.rowcount
+
+    def check_cari_balances(self, fix=False):
+        """
+        cari_hesaplar.bakiye ile SUM(cari_hareketler.tutar) karşılaştırması.
+        fix=True: farklı olanlar hareket toplamına düzeltilir; bu sırada yeni cari
+        hareketleri bekler. Dönen: farklı bulunan cariler (düzeltmeden önceki değerler)
+        """
+        with self.get_cursor() as cursor:
+            if fix:
+                # save_cari_transaction önce cari_hesaplar satırını kilitler; aynı sırayla
+                # kilitlenir, yarım kalmış hareket kalmaz
+                cursor.execute("LOCK TABLE cari_hesaplar IN SHARE ROW EXCLUSIVE MODE")
+            cursor.execute(self.CARI_BALANCE_DIFF)
+            diffs = cursor.fetchall()
+            if fix and diffs:
+                self._rebuild_cari_balances(cursor)
+        if fix:
+            for row in diffs:
+                self.customer_cache.invalidate(cari_isim=row['cari_isim'])
+        return diffs
     
     # ==================== STOK İŞLEMLERİ ====================
     
@@ -603,8 +961,8 @@ class Database:
             cursor.execute("""
                 SELECT 
                     odeme,
-                    SUM(fiyat * adet) as toplam
-                FROM satislar
+                    SUM(toplam) as toplam
+                FROM satis_ozet
                 WHERE vardiya_id = %s
                 GROUP BY odeme
             """, (shift_id,))
@@ -920,11 +1278,11 @@ class Database:
                     COUNT(DISTINCT tarih) AS toplam_gun,
                     COALESCE(SUM(toplam_dakika), 0) AS toplam_dakika
                 FROM puantaj
-                WHERE EXTRACT(YEAR FROM tarih) = %s
-                  AND EXTRACT(MONTH FROM tarih) = %s
+                WHERE tarih >= make_date(%s, %s, 1)
+                  AND tarih < make_date(%s, %s, 1) + INTERVAL '1 month'
                 GROUP BY personel_adi, rol
                 ORDER BY personel_adi
-            """, (yil, ay))
+            """, (yil, ay, yil, ay))
             return cursor.fetchall()
 
     def delete_puantaj_record(self, record_id):
@@ -932,6 +1290,230 @@ class Database:
         with self.get_cursor() as cursor:
             cursor.execute("DELETE FROM puantaj WHERE id = %s", (record_id,))
 
+    # ==================== AYLIK BÖLÜMLEME VE ARŞİV ====================
+
+    def _lock_partitions(self, cursor):
+        # Bölüm DDL'i süreçler (cluster worker'ları) arasında sıralı çalışsın
+        cursor.execute("SELECT pg_advisory_xact_lock(hashtext('fastfoot_partitions'))")
+
+    def is_partitioned(self, table):
+        with self.get_cursor(dict_cursor=False) as cursor:
+            cursor.execute("""
+                SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))
+            """, (table,))
+            return cursor.fetchone()[0]
+
+    def _has_rows(self, table):
+        with self.get_cursor(dict_cursor=False) as cursor:
+            cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {})").format(sql.Identifier(table)))
+            return cursor.fetchone()[0]
+
+    def list_partitions(self, table):
+        """Tablonun aylık bölümleri, eskiden yeniye: [(bölüm adı, ay başı)]"""
+        with self.get_cursor(dict_cursor=False) as cursor:
+            return self._month_partitions(cursor, table)
+
+    def _month_partitions(self, cursor, table):
+        cursor.execute("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+        """, (table,))
+        pattern = re.compile(rf"^{table}_(\d{{4}})_(\d{{2}})$")
+        months = []
+        for (name,) in cursor.fetchall():
+            match = pattern.match(name)
+            if match:
+                months.append((name, datetime(int(match.group(1)), int(match.group(2)), 1)))
+        return sorted(months, key=lambda m: m[1])
+
+    def _create_month_partition(self, cursor, table, key, start):
+        """
+        [start, start + 1 ay) bölümünü oluştur. Varsayılan (default) bölüme düşmüş
+        satırlar yeni bölüme taşınır; ATTACH ancak default bölümde aralığa ait satır
+        kalmadığında başarılı olur.
+        """
+        name = f"{table}_{start:%Y_%m}"
+        end = add_months(start, 1)
+        cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS)").format(
+            sql.Identifier(name), sql.Identifier(table)))
+        cursor.execute(sql.SQL("""
+            WITH moved AS (
+                DELETE FROM {default} WHERE {key} >= %s AND {key} < %s RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """).format(default=sql.Identifier(f"{table}_default"), key=sql.Identifier(key),
+                    name=sql.Identifier(name)), (start, end))
+        cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)").format(
+            sql.Identifier(table), sql.Identifier(name)), (start, end))
+        return name
+
+    def ensure_partitions(self, ahead=3, now=None):
+        """Bölümlü tablolarda bu ay ve sonraki ahead ay için bölüm yoksa oluştur"""
+        created = []
+        first = month_start(now)
+        for table, (key, _) in self.PARTITIONED_TABLES.items():
+            if not self.is_partitioned(table):
+                continue
+            with self.get_cursor(dict_cursor=False) as cursor:
+                self._lock_partitions(cursor)
+                existing = {start for _, start in self._month_partitions(cursor, table)}
+                for n in range(ahead + 1):
+                    start = add_months(first, n)
+                    if start not in existing:
+                        created.append(self._create_month_partition(cursor, table, key, start))
+        if created:
+            print(f"✓ Aylık bölümler oluşturuldu: {', '.join(created)}")
+        return created
+
+    def migrate_to_partitions(self, only_empty=False, ahead=3, now=None):
+        """
+        satislar / cari_hareketler'i aylık RANGE bölümlü tabloya taşı (tek işlem, tablo kilitli).
+        Eski satırların her ayı için bölüm açılır; anahtarı NULL olan satırlar
+        1970-01-01 tarihiyle default bölüme düşer. id sequence'ı korunur.
+        only_empty: sadece boş tabloları taşı (init_database - yeni kurulum)
+        Dönen: taşınan tablolar {tablo: satır sayısı}
+        """
+        migrated = {}
+        for table, (key, indexes) in self.PARTITIONED_TABLES.items():
+            # Her açılışta çağrılır: bölümlü ya da dolu tabloda kilit almadan çık
+            if self.is_partitioned(table) or (only_empty and self._has_rows(table)):
+                continue
+            with self.get_cursor(dict_cursor=False) as cursor:
+                self._lock_partitions(cursor)
+                t = sql.Identifier(table)
+                new = sql.Identifier(f"{table}_bolumlu")
+                cursor.execute(sql.SQL("LOCK TABLE {} IN ACCESS EXCLUSIVE MODE").format(t))
+                # Kilit beklenirken başka bir süreç taşımış ya da satır eklenmiş olabilir
+                cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                               (table,))
+                if cursor.fetchone()[0]:
+                    continue
+                if only_empty:
+                    cursor.execute(sql.SQL("SELECT EXISTS (SELECT 1 FROM {})").format(t))
+                    if cursor.fetchone()[0]:
+                        continue
+                cursor.execute(sql.SQL("SELECT COUNT(*), MIN({k}), MAX({k}) FROM {t}").format(
+                    k=sql.Identifier(key), t=t))
+                count, oldest, newest = cursor.fetchone()
+                cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (table,))
+                sequence = cursor.fetchone()[0]
+                cursor.execute("""
+                    SELECT column_name FROM information_schema.columns
+                    WHERE table_schema = current_schema() AND table_name = %s ORDER BY ordinal_position
+                """, (table,))
+                columns = [row[0] for row in cursor.fetchall()]
+
+                cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS) PARTITION BY RANGE ({})").format(
+                    new, t, sql.Identifier(key)))
+                cursor.execute(sql.SQL("ALTER TABLE {} ALTER COLUMN {} SET NOT NULL").format(new, sql.Identifier(key)))
+                cursor.execute(sql.SQL("ALTER TABLE {} ADD CONSTRAINT {} PRIMARY KEY (id, {})").format(
+                    new, sql.Identifier(f"{table}_bolumlu_pkey"), sql.Identifier(key)))
+                if table == 'cari_hareketler':
+                    cursor.execute("""
+                        ALTER TABLE cari_hareketler_bolumlu ADD CONSTRAINT cari_hareketler_bolumlu_cari_id_fkey
+                        FOREIGN KEY (cari_id) REFERENCES cari_hesaplar(id) ON DELETE CASCADE
+                    """)
+                cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT").format(
+                    sql.Identifier(f"{table}_default"), new))
+                start = month_start(oldest) if oldest else month_start(now)
+                last = max(add_months(month_start(now), ahead), month_start(newest) if newest else start)
+                while start <= last:
+                    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)").format(
+                        sql.Identifier(f"{table}_{start:%Y_%m}"), new), (start, add_months(start, 1)))
+                    start = add_months(start, 1)
+
+                select = [sql.SQL("COALESCE({}, TIMESTAMP 'epoch')").format(sql.Identifier(c)) if c == key
+                          else sql.Identifier(c) for c in columns]
+                cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {}").format(
+                    new, sql.SQL(', ').join(map(sql.Identifier, columns)), sql.SQL(', ').join(select), t))
+                if sequence:
+                    cursor.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY NONE").format(sql.SQL(sequence)))
+                cursor.execute(sql.SQL("DROP TABLE {}").format(t))
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME TO {}").format(new, t))
+                cursor.execute(sql.SQL("ALTER TABLE {} RENAME CONSTRAINT {} TO {}").format(
+                    t, sql.Identifier(f"{table}_bolumlu_pkey"), sql.Identifier(f"{table}_pkey")))
+                if table == 'cari_hareketler':
+                    cursor.execute("""
+                        ALTER TABLE cari_hareketler RENAME CONSTRAINT cari_hareketler_bolumlu_cari_id_fkey
+                        TO cari_hareketler_cari_id_fkey
+                    """)
+                if sequence:
+                    cursor.execute(sql.SQL("ALTER SEQUENCE {} OWNED BY {}").format(
+                        sql.SQL(sequence), sql.SQL(f"{table}.id")))
+                for statement in indexes:
+                    cursor.execute(statement)
+                migrated[table] = count
+            print(f"✓ {table} aylık bölümlü tabloya taşındı ({count} satır)")
+        return migrated
+
+    def archive_partitions(self, retention_months, archive_dir=None, now=None):
+        """
+        retention_months aydan eski bölümleri ayır (DETACH). archive_dir verilirse bölüm
+        gzip'li CSV olarak (<archive_dir>/<bölüm>.csv.gz) yazılıp silinir; verilmezse
+        ayrılan tablo olduğu gibi kalır (elle yedek / silme için).
+
+        Satış özetleri satis_ozet'te kalır. Cari bakiyeleri değişmesin diye arşivlenen
+        ayın cari başına toplamı sonraki aya 'devir' hareketi olarak yazılır.
+        Dönen: arşivlenen / ayrılan bölüm adları
+        """
+        if not retention_months or retention_months < 1:
+            return []
+        cutoff = add_months(month_start(now), -retention_months)
+        if archive_dir:
+            os.makedirs(archive_dir, exist_ok=True)
+        done = []
+        for table in self.PARTITIONED_TABLES:
+            if not self.is_partitioned(table):
+                continue
+            for name, start in self.list_partitions(table):
+                end = add_months(start, 1)
+                if end > cutoff:
+                    break
+                with self.get_cursor(dict_cursor=False) as cursor:
+                    self._lock_partitions(cursor)
+                    part = sql.Identifier(name)
+                    if table == 'cari_hareketler':
+                        # Ayrılan ay + devir toplamı sıfırdır: cari_hesaplar.bakiye değişmez
+                        cursor.execute(sql.SQL("""
+                            INSERT INTO cari_hareketler (cari_id, tarih, islem, tutar)
+                            SELECT cari_id, %s, 'devir', SUM(tutar) FROM {}
+                            GROUP BY cari_id HAVING SUM(tutar) <> 0
+                        """).format(part), (end,))
+                    cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}").format(
+                        sql.Identifier(table), part))
+                    if archive_dir:
+                        self._export_csv(cursor, name, os.path.join(archive_dir, f"{name}.csv.gz"))
+                        cursor.execute(sql.SQL("DROP TABLE {}").format(part))
+                done.append(name)
+                print(f"✓ {name} {'arşivlendi' if archive_dir else 'ayrıldı'}")
+        return done
+
+    def _export_csv(self, cursor, table, path, batch=5000):
+        """Tabloyu gzip'li CSV'ye (başlıklı, COPY ... CSV HEADER ile geri yüklenebilir) yaz"""
+        with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+            if copy_supported():
+                query = sql.SQL("COPY {} TO STDOUT WITH CSV HEADER").format(sql.Identifier(table))
+                cursor.copy_expert(query.as_string(cursor), f)
+                return
+            # eventlet/gevent: COPY yok; sunucu taraflı cursor ile parça parça oku
+            # (tek fark: NULL ve boş metin ikisi de boş alan olarak yazılır)
+            writer = csv.writer(f, lineterminator='\n')
+            with cursor.connection.cursor(name=f"arsiv_{table}") as named:
+                named.itersize = batch
+                named.execute(sql.SQL("SELECT * FROM {}").format(sql.Identifier(table)))
+                rows = named.fetchmany(batch)
+                writer.writerow([column.name for column in named.description])
+                while rows:
+                    writer.writerows(rows)
+                    rows = named.fetchmany(batch)
+
+    def maintain_partitions(self, ahead=3, retention_months=0, archive_dir=None, now=None):
+        """Periyodik bakım: gelecek ayların bölümlerini aç, saklama süresini aşanları arşivle"""
+        return {
+            'created': self.ensure_partitions(ahead, now),
+            'archived': self.archive_partitions(retention_months, archive_dir, now)
+        }
+
     # ==================== GENEL ====================
 
     def close_pool(self):
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Giden Socket.IO Olay Birleştirici
+FastFootSatış
+
+Kısa bir pencere (varsayılan 30 ms) içinde gelen olaylar sırayla biriktirilir
+ve tek seferde yayınlanır. Aynı masanın art arda gelen aynı türdeki deltaları
+(item_added / item_removed / item_status) tek olayda birleştirilir; mutfak
+satırları tek bir kitchen_new_orders olayında toplanır.
+
+Birleştirilen delta, ilk olayın sürümünü from_version, son olayın sürümünü
+version olarak taşır; istemci from_version'ın beklediği sürüm olduğunu
+kontrol eder. Bir masa (stream) için araya başka bir olay girdiyse ya da
+olaylar farklı odalara gidiyorsa birleştirme yapılmaz, masa içindeki olay
+sırası korunur.
+
+Yayınlanan her olaya global bir sıra numarası (seq) verilir ve son
+replay_size olay halka tamponda tutulur. Yeniden bağlanan istemci son
+gördüğü seq'i gönderir; boşluk tampondaysa sadece kaçırdığı olaylar
+(katıldığı odalara gidenler) tekrar gönderilir, değilse tam snapshot gerekir.
+Sıra numaraları süreç başına bir epoch ile birlikte anlamlıdır.
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Birleştirilebilen olaylar ve birleştirilen liste alanı
+MERGE_FIELDS = {
+    'item_added': 'items',
+    'item_removed': 'uids',
+    'item_status': 'uids',
+    'kitchen_new_orders': 'orders'
+}
+
+
+class EventAggregator:
+    def __init__(self, emit, window=0.03, replay_size=1000):
+        """
+        :param emit: Gerçek yayın fonksiyonu (socketio.emit imzası)
+        :param window: Birleştirme penceresi (saniye). 0 ise olaylar anında yayınlanır.
+        :param replay_size: Yeniden bağlanan istemciler için tutulan son olay sayısı
+        """
+        self._emit = emit
+        self.window = max(0.0, float(window))
+        self.seq = 0
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self._replay = deque(maxlen=max(1, int(replay_size)))  # (seq, event, payload, to)
+        self._lock = threading.Lock()        # bekleyen olaylar
+        self._flush_lock = threading.Lock()  # yayın sırası
+        self._pending = []
+        self._last = {}  # stream -> _pending içindeki son olayın sırası
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            'received': 0,
+            'emitted': 0,
+            'coalesced': 0,
+            'flushes': 0,
+            'last_batch_events': 0,
+            'max_batch_events': 0,
+            'last_flush_ms': 0.0,
+            'max_flush_ms': 0.0,
+            'replays': 0,
+            'replayed_events': 0,
+            'replay_misses': 0
+        }
+
+    def start(self):
+        """Arka plan yayıncısını başlat (window > 0 ise)"""
+        if self.window <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="event-aggregator", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.window):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Olay yayın hatası: {e}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['pending_events'] = len(self._pending)
+        stats['window_ms'] = int(self.window * 1000)
+        received = stats['received']
+        stats['coalesce_ratio'] = round(stats['coalesced'] / received, 3) if received else 0.0
+        stats['seq'] = self.seq
+        stats['replay_buffered'] = len(self._replay)
+        stats['replay_size'] = self._replay.maxlen
+        return stats
+
+    def emit(self, event, payload, to=None, stream=None, merge_key=None):
+        """
+        Olayı kuyruğa ekle.
+
+        :param stream: Sıralamanın korunacağı akış (masa adı, '@kitchen' ...)
+        :param merge_key: Aynı akışın son olayı aynı anahtara sahipse onunla birleştirilir.
+            Birleşen olay ilk olayın odalarına gider; bu yüzden odaları farklı olaylar
+            (ör. başka istasyonun satırları) birleştirilmez.
+        """
+        with self._lock:
+            self.stats['received'] += 1
+            if merge_key is not None and stream is not None:
+                merge_key = (merge_key, self._rooms_key(to))
+                index = self._last.get(stream)
+                if index is not None and self._pending[index][3] == merge_key:
+                    self._merge(self._pending[index][1], event, payload)
+                    self.stats['coalesced'] += 1
+                    return
+            self._pending.append((event, payload, to, merge_key))
+            if stream is not None:
+                self._last[stream] = len(self._pending) - 1
+
+        if self._thread is None:
+            self.flush()
+
+    @staticmethod
+    def _rooms_key(to):
+        if to is None or isinstance(to, str):
+            return to
+        return tuple(sorted(set(to)))
+
+    @staticmethod
+    def _merge(target, event, payload):
+        field = MERGE_FIELDS[event]
+        target[field] = target[field] + payload[field]
+        if 'version' in payload:
+            target.setdefault('from_version', target['version'])
+            target['version'] = payload['version']
+        if 'total' in payload:
+            target['total'] = payload['total']
+
+    def flush(self):
+        """Bekleyen olayları sırayla yayınla"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._last = {}
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            for event, payload, to, _ in batch:
+                if isinstance(payload, dict):
+                    self.seq += 1
+                    payload['seq'] = self.seq
+                    self._replay.append((self.seq, event, payload, to))
+                try:
+                    if to is None:
+                        self._emit(event, payload)
+                    else:
+                        self._emit(event, payload, to=to)
+                except Exception as e:
+                    logger.error(f"Olay yayın hatası ({event}): {e}")
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 3)
+
+            self.stats['emitted'] += len(batch)
+            self.stats['flushes'] += 1
+            self.stats['last_batch_events'] = len(batch)
+            self.stats['max_batch_events'] = max(self.stats['max_batch_events'], len(batch))
+            self.stats['last_flush_ms'] = elapsed_ms
+            self.stats['max_flush_ms'] = max(self.stats['max_flush_ms'], elapsed_ms)
+            return len(batch)
+
+    def replay(self, last_seq, epoch, rooms, send):
+        """
+        last_seq'ten sonra yayınlanan ve rooms'tan birine (veya herkese) giden
+        olayları send([[event, payload], ...], seq) ile gönder.
+
+        Yayın kilidi altında çalışır: bu sırada yeni olay yayınlanmaz, send'den
+        sonraki olaylar istemciye canlı ulaşır. Boşluk tamponun dışındaysa
+        (veya sunucu yeniden başladıysa) False döner - tam snapshot gerekir.
+        """
+        with self._flush_lock:
+            try:
+                last_seq = int(last_seq)
+            except (TypeError, ValueError):
+                return False
+            oldest = self._replay[0][0] if self._replay else self.seq + 1
+            if epoch != self.epoch or last_seq > self.seq or last_seq < oldest - 1:
+                self.stats['replay_misses'] += 1
+                return False
+
+            rooms = set(rooms)
+            missed = []
+            for seq, event, payload, to in reversed(self._replay):
+                if seq <= last_seq:
+                    break
+                targets = (to,) if isinstance(to, str) else to
+                if to is None or not rooms.isdisjoint(targets):
+                    missed.append([event, payload])
+            missed.reverse()
+            send(missed, self.seq)
+            self.stats['replays'] += 1
+            self.stats['replayed_events'] += len(missed)
+            return True
+
+    def close(self):
+        """Yayıncıyı durdur ve bekleyenleri gönder"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
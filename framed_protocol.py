@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Terminal / Mutfak TCP Protokolü (5555, 5556)
+FastFootSatış
+
+Her mesaj tek satır UTF-8 JSON'dur ve "\\n" ile biter (newline-delimited).
+Bağlantı açık kalır; aynı bağlantıdan istenen sayıda mesaj gönderilebilir.
+Mesaj boyutu recv tamponuyla sınırlı değildir (en fazla MAX_FRAME bayt).
+
+Mesajda "id" varsa alıcı işledikten sonra aynı bağlantıdan onay döner:
+
+    {"ack": <id>, "ok": true, ...}      işlendi (varsa ek alanlar)
+    {"ack": <id>, "ok": false, "error": "..."}
+
+Onay gelmeyen mesaj tekrar gönderilebilir. Alıcı son görülen id'leri tutar
+ve aynı id ile gelen mesajı tekrar işlemeden onaylar; id'ler gönderen başına
+benzersiz olmalıdır (ör. "<terminal>:<oturum>:<sıra>"). {"islem": "ping",
+"id": ...} sadece onaylanır.
+
+Eski tek seferlik gönderenler (Term.aktar, satır sonu olmadan tek JSON
+gönderip bağlantıyı kapatanlar) aynen çalışır: bağlantı kapanınca kalan veri
+tek mesaj olarak işlenir, id olmadığı için onay gönderilmez.
+"""
+
+import json
+import uuid
+import socket
+import threading
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_FRAME = 1024 * 1024  # Tek mesaj için üst sınır (bayt)
+
+
+def encode(message):
+    """Mesajı tek satır JSON olarak kodla"""
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode('utf-8')
+
+
+class FrameReader:
+    """Akıştan gelen baytları tam mesajlara ayırır"""
+
+    def __init__(self, max_frame=MAX_FRAME):
+        self.max_frame = max_frame
+        self._buffer = b""
+        self.invalid = 0  # Çözülemeyip atlanan satır sayısı
+
+    def feed(self, data):
+        """Yeni veriyi ekle, tamamlanan mesajları döndür (bozuk satırlar atlanır)"""
+        self._buffer += data
+        *lines, self._buffer = self._buffer.split(b"\n")
+        if len(self._buffer) > self.max_frame:
+            raise ValueError(f"Mesaj çok büyük (> {self.max_frame} bayt)")
+        return self._decode(lines)
+
+    def finish(self):
+        """Bağlantı kapandı: satır sonu olmadan kalan veri (eski tek seferlik gönderen)"""
+        rest, self._buffer = self._buffer, b""
+        return self._decode([rest])
+
+    def _decode(self, lines):
+        # Tek bozuk satır aynı parçadaki diğer mesajları ve bağlantıyı düşürmez
+        messages = []
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                messages.append(json.loads(line))
+            except ValueError as e:
+                self.invalid += 1
+                logger.warning(f"⚠️ Bozuk mesaj atlandı ({len(line)} bayt): {e}")
+        return messages
+
+
+class RecentIds:
+    """Son görülen mesaj id'leri ve cevapları (tekrar gönderilen mesaj bir kez işlenir)"""
+
+    def __init__(self, size=1000):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, msg_id):
+        with self._lock:
+            return self._ids.get(msg_id)
+
+    def add(self, msg_id, ack):
+        with self._lock:
+            self._ids[msg_id] = ack
+            while len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+
+
+def serve_connection(sock, handle, recent=None, idle_timeout=None):
+    """
+    Bağlantıdaki mesajları sırayla handle(message) ile işle ve onayla.
+    handle'ın döndürdüğü sözlük onaya eklenir; exception ok=false olarak döner.
+    Bağlantı kapanana (veya idle_timeout boyunca veri gelmeyene) kadar çalışır.
+
+    :return: İşlenen mesaj sayısı
+    """
+    reader = FrameReader()
+    handled = 0
+    sock.settimeout(idle_timeout)
+    while True:
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            break
+        messages = reader.feed(data) if data else reader.finish()
+        for message in messages:
+            ack = process_message(message, handle, recent)
+            handled += 1
+            if ack is not None:
+                sock.sendall(encode(ack))
+        if not data:
+            break
+    return handled
+
+
+def process_message(message, handle, recent=None):
+    """Mesajı işle (tekrar gelen id'yi atla); id'li mesaj için onayı döndür"""
+    msg_id = message.get('id') if isinstance(message, dict) else None
+    if msg_id is not None and recent is not None:
+        previous = recent.get(msg_id)
+        if previous is not None:
+            return dict(previous, duplicate=True)
+
+    try:
+        if isinstance(message, dict) and message.get('islem') == 'ping':
+            result = None
+        else:
+            result = handle(message)
+        ack = {'ack': msg_id, 'ok': True}
+        if result:
+            ack.update(result)
+    except Exception as e:
+        logger.error(f"Mesaj işleme hatası: {e}")
+        ack = {'ack': msg_id, 'ok': False, 'error': str(e)}
+
+    if msg_id is None:
+        return None
+    if recent is not None and ack['ok']:
+        recent.add(msg_id, ack)
+    return ack
+
+
+class FramedClient:
+    """
+    Açık tutulan tek bağlantı üzerinden id'li mesaj gönderir ve onayları bekler.
+    Thread-safe değildir; tek bir gönderici thread'inden kullanılmalıdır.
+    """
+
+    def __init__(self, host, port, timeout=3.0, sender=None):
+        """
+        :param timeout: Bağlanma ve onay bekleme süresi (saniye)
+        :param sender: id öneki (varsayılan: rastgele oturum kimliği)
+        """
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.sender = sender or uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._sock = None
+        self._reader = None
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    def next_id(self):
+        self._seq += 1
+        return f"{self.sender}:{self._seq}"
+
+    def connect(self):
+        """Bağlantı yoksa (veya karşı taraf kapattıysa) yeniden bağlan; hata OSError olarak yükselir"""
+        if self._sock is not None and self._peer_closed():
+            self.close()
+        if self._sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.settimeout(self.timeout)
+            self._sock, self._reader = sock, FrameReader()
+        return self._sock
+
+    def request(self, messages):
+        """
+        Mesajları art arda gönder (id yoksa verilir), onayları bekle.
+        Süre dolarsa o ana kadar gelen onaylar döner; bağlantı hatasında
+        bağlantı kapatılır ve OSError yükselir.
+
+        :return: {id: ack}
+        """
+        for message in messages:
+            if message.get('id') is None:
+                message['id'] = self.next_id()
+        waiting = {message['id'] for message in messages}
+        acks = {}
+        sock = self.connect()
+        try:
+            sock.sendall(b"".join(encode(message) for message in messages))
+            while waiting:
+                data = sock.recv(65536)
+                if not data:
+                    raise ConnectionResetError("Bağlantı karşı taraftan kapatıldı")
+                for ack in self._reader.feed(data):
+                    msg_id = ack.get('ack') if isinstance(ack, dict) else None
+                    if msg_id in waiting:  # Önceki denemeden kalan onaylar atlanır
+                        waiting.discard(msg_id)
+                        acks[msg_id] = ack
+        except socket.timeout:
+            self.close()  # Geç gelen onaylar sonraki isteğe karışmasın
+        except (OSError, ValueError) as e:
+            self.close()
+            raise ConnectionError(f"Mesaj gönderilemedi: {e}") from e
+        return acks
+
+    def _peer_closed(self):
+        """Karşı taraf bağlantıyı kapattı mı (bloklamadan kontrol)"""
+        try:
+            self._sock.settimeout(0)
+            try:
+                return self._sock.recv(1, socket.MSG_PEEK) == b""
+            finally:
+                self._sock.settimeout(self.timeout)
+        except (BlockingIOError, socket.timeout):
+            return False
+        except OSError:
+            return True
+
+    def close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+            self._sock = None
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Mutfak Ekranı Gönderici (mutfak.py, port 5556)
+FastFootSatış
+
+Tüm mutfak fişleri tek bir arka plan thread'i tarafından, açık tutulan tek
+bir TCP bağlantısı üzerinden gönderilir (framed_protocol: satır başına bir
+JSON mesajı, id ve onay). Kısa bir pencere (varsayılan 50 ms) içinde aynı masaya
+gelen satırlar tek bir yeni_siparis mesajında birleştirilir; aynı ürün/not
+satırlarının adetleri toplanır.
+
+Kuyruk satır sayısıyla sınırlıdır. Mutfak ekranı kapalıyken bağlantı artan
+aralıklarla (backoff) yeniden denenir, bekleyen fişler kuyrukta kalır. Kuyruk
+dolarsa yeni satırlar atılır ve sayaçlara yazılır; sipariş akışı mutfak
+yüzünden hiç beklemez. Onayı gelmeyen fiş aynı id ile tekrar gönderilir;
+mutfak tekrar gelen id'yi yeniden göstermez.
+"""
+
+import time
+import datetime
+import threading
+import logging
+from collections import OrderedDict
+
+from framed_protocol import FramedClient
+
+logger = logging.getLogger(__name__)
+
+
+class KitchenDispatcher:
+    def __init__(self, host='127.0.0.1', port=5556, terminal_id="1", max_queue=500,
+                 batch_window=0.05, connect_timeout=3.0, max_backoff=10.0):
+        """
+        :param max_queue: Kuyrukta bekleyebilecek en fazla satır
+        :param batch_window: Aynı masanın satırlarının toplandığı pencere (saniye)
+        :param max_backoff: Yeniden bağlanma denemeleri arasındaki en uzun bekleme (saniye)
+        """
+        self.host = host
+        self.port = int(port)
+        self.terminal_id = terminal_id
+        self.max_queue = max(1, int(max_queue))
+        self.batch_window = max(0.0, float(batch_window))
+        self.connect_timeout = connect_timeout
+        self.max_backoff = max_backoff
+        self._pending = OrderedDict()  # masa (veya tekrar denenen fişin id'si) -> fiş
+        self._depth = 0                # kuyruktaki satır sayısı
+        self._cond = threading.Condition()
+        self._client = FramedClient(host, port, timeout=connect_timeout)
+        self._backoff = 0.0
+        self._thread = None
+        self._stop = False
+        self.stats = {
+            'submitted_lines': 0,
+            'dropped_lines': 0,
+            'sent_tickets': 0,
+            'rejected_tickets': 0,
+            'sent_lines': 0,
+            'batches': 0,
+            'max_depth': 0,
+            'connects': 0,
+            'connect_failures': 0,
+            'send_errors': 0,
+            'last_error': None
+        }
+
+    def start(self):
+        """Gönderici thread'ini başlat"""
+        if self._thread is not None:
+            return
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, name="kitchen-dispatcher", daemon=True)
+        self._thread.start()
+
+    def get_stats(self):
+        with self._cond:
+            stats = dict(self.stats)
+            stats['queue_depth'] = self._depth
+            stats['queued_tickets'] = len(self._pending)
+        stats['max_queue'] = self.max_queue
+        stats['connected'] = self._client.connected
+        stats['backoff_sec'] = round(self._backoff, 3)
+        return stats
+
+    def submit(self, masa, siparisler, terminal=None):
+        """
+        Fişi kuyruğa ekle; aynı masanın bekleyen fişiyle birleştirilir.
+        Kuyruk doluysa satırlar atılır ve False döner.
+
+        :param siparisler: [{"urun": ..., "adet": ...}, ...]
+        """
+        with self._cond:
+            lines = [(s['urun'], int(s.get('adet', 1))) for s in siparisler]
+            if self._depth + len(lines) > self.max_queue:
+                self.stats['dropped_lines'] += len(lines)
+                logger.warning(f"⚠ Mutfak kuyruğu dolu ({self._depth}), {len(lines)} satır atıldı -> {masa}")
+                return False
+            ticket = self._pending.get(masa)
+            if ticket is None:
+                ticket = self._pending[masa] = {'masa': masa, 'siparisler': OrderedDict(), 'lines': 0,
+                                                'terminal': terminal or self.terminal_id,
+                                                'saat': datetime.datetime.now().strftime("%H:%M:%S")}
+            for urun, adet in lines:
+                ticket['siparisler'][urun] = ticket['siparisler'].get(urun, 0) + adet
+            ticket['lines'] += len(lines)
+            self._depth += len(lines)
+            self.stats['submitted_lines'] += len(lines)
+            self.stats['max_depth'] = max(self.stats['max_depth'], self._depth)
+            self._cond.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop:
+                    self._cond.wait()
+                if self._stop and not self._pending:
+                    return
+            if self.batch_window and not self._stop:
+                time.sleep(self.batch_window)  # Aynı masanın diğer satırlarını topla
+            with self._cond:
+                batch, self._pending = self._pending, OrderedDict()
+            if not self._send_batch(batch):
+                self._requeue(batch)
+                if self._stop:
+                    return
+                time.sleep(self._backoff)
+
+    def _requeue(self, batch):
+        """Gönderilemeyen fişleri kuyruğun başına geri koy.
+        Bu fişler id aldığı için sonra gelen satırlar onlara eklenmez (mutfak
+        fişi almış ama onayı kaybolmuş olabilir); kendi id'leriyle beklerler."""
+        with self._cond:
+            newer = self._pending
+            self._pending = OrderedDict((ticket['id'], ticket) for ticket in batch.values())
+            self._pending.update(newer)
+
+    def _send_batch(self, batch):
+        """Fişleri gönder, onaylananları kuyruktan düş. Hepsi onaylandıysa True"""
+        messages = {}
+        for key, ticket in batch.items():
+            # Tekrar denemede aynı id gider, mutfak aynı fişi iki kez göstermez
+            if 'id' not in ticket:
+                ticket['id'] = self._client.next_id()
+            messages[ticket['id']] = (key, self._message(ticket))
+
+        acks = {}
+        # Karşı taraf bağlantıyı kapattıysa ilk yazma yine de başarılı görünebilir;
+        # bir kez yeni bağlantıyla tekrar dene
+        for attempt in range(2):
+            if not self._connect():
+                return False
+            try:
+                acks = self._client.request([message for _, message in messages.values()])
+                break
+            except OSError as e:
+                self.stats['send_errors'] += 1
+                self.stats['last_error'] = str(e)
+
+        sent_lines = 0
+        for msg_id, ack in acks.items():
+            ticket = batch.pop(messages[msg_id][0])
+            masa = ticket['masa']
+            sent_lines += ticket['lines']
+            if ack.get('ok'):
+                self.stats['sent_tickets'] += 1
+                logger.info(f"👨‍🍳 Legacy Mutfak onayladı: {len(ticket['siparisler'])} kalem -> {masa}")
+            else:
+                self.stats['rejected_tickets'] += 1
+                logger.error(f"⚠ Legacy Mutfak fişi reddetti ({masa}): {ack.get('error')}")
+        with self._cond:
+            self._depth -= sent_lines
+            self.stats['sent_lines'] += sent_lines
+            self.stats['batches'] += 1 if acks else 0
+        if batch:
+            # Onay gelmedi: bağlantı sorunlu say, beklemeli tekrar dene
+            self._backoff = min(self.max_backoff, max(0.25, self._backoff * 2))
+            return False
+        return True
+
+    def _message(self, ticket):
+        return {
+            "id": ticket['id'],
+            "islem": "yeni_siparis",
+            "masa": ticket['masa'],
+            "siparisler": [{"urun": urun, "adet": adet} for urun, adet in ticket['siparisler'].items()],
+            "saat": ticket['saat'],
+            "terminal": ticket['terminal']
+        }
+
+    def _connect(self):
+        """Bağlantıyı hazırla; kurulamazsa backoff'u artır"""
+        was_connected = self._client.connected
+        try:
+            self._client.connect()
+        except OSError as e:
+            if self._backoff == 0:
+                logger.error(f"⚠ Legacy Mutfak ekranına bağlanılamadı: {e}")
+            self.stats['connect_failures'] += 1
+            self.stats['last_error'] = str(e)
+            self._backoff = min(self.max_backoff, max(0.25, self._backoff * 2))
+            return False
+        if not was_connected:
+            if self._backoff:
+                logger.info(f"👨‍🍳 Legacy Mutfak bağlantısı yeniden kuruldu ({self.host}:{self.port})")
+            self.stats['connects'] += 1
+        self._backoff = 0.0
+        return True
+
+    def close(self, timeout=5):
+        """Bekleyen fişleri göndermeyi dene ve bağlantıyı kapat"""
+        with self._cond:
+            self._stop = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        self._client.close()
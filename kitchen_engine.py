@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Mutfak Kuyruk Motoru
+FastFootSatış
+
+Mutfağa giden satırlar menü kategorisine göre istasyonlara (ızgara, soğuk,
+içecek ...) yönlendirilir. Aynı siparişte aynı istasyona düşen satırlar bir
+fiş olur; her istasyonun kendi kuyruğu vardır.
+
+Sıralama hedef süreye (due) göredir: due = oluşma + hedef süre. Paket
+platformlarının (SLA'lı) hedef süresi salondan kısadır; böylece yeni gelen
+platform siparişi, salonda kendisinden az önce girmiş fişlerin önüne geçer
+ama uzun süredir bekleyen salon fişini geçmez (en erken bitiş tarihi önce).
+
+Fiş hazır olunca (tüm satırları) hazırlanma süresi istasyonun geçmişine
+yazılır; kuyruk uzunluğu, en eski/ortalama bekleme ve son fişlerin
+hazırlanma süreleri get_stats() ile okunur. Hiç kapanmayan (ör. hazır
+işaretlenmeden ödenip silinen) fişler max_age sonunda düşürülür.
+
+İstasyonlar kitchen_stations.json ile değiştirilebilir:
+    {"stations": {"izgara": {"ad": "Izgara", "kategoriler": ["Yemekler"]}},
+     "default_station": "izgara", "urunler": {"Ayran": "icecek"},
+     "target_sec": 1200, "sla_sec": {"yemeksepeti": 600}}
+"""
+
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    'stations': OrderedDict([
+        ('izgara', {'ad': 'Izgara / Sıcak', 'kategoriler': ['Yemekler', 'Çorbalar']}),
+        ('soguk', {'ad': 'Soğuk', 'kategoriler': ['Tatlılar', 'Salatalar']}),
+        ('icecek', {'ad': 'İçecek', 'kategoriler': ['İçecekler']}),
+    ]),
+    'default_station': 'izgara',  # Eşlenmemiş kategori / menüde olmayan ürün
+    'urunler': {},                # Ürün bazında istasyon (kategoriyi ezer)
+    'target_sec': 1200,           # Salon / terminal / QR fişi hedef süresi
+    'sla_sec': {                  # Kaynak bazında hedef süre (SLA)
+        'yemeksepeti': 600,
+        'trendyol': 600,
+        'getir': 600,
+        'migros': 600,
+        'online_order': 900
+    }
+}
+
+
+class KitchenEngine:
+    def __init__(self, config=None, max_age=4 * 3600, history=200):
+        """
+        :param config: DEFAULT_CONFIG üzerine yazılacak ayarlar
+        :param max_age: Bu süreden (saniye) eski açık fiş kuyruktan düşer
+        :param history: İstasyon başına tutulan son hazırlanma süresi sayısı
+        """
+        self.max_age = max_age
+        self.history = max(1, int(history))
+        self._lock = threading.Lock()
+        self._tickets = {}   # fiş id -> fiş
+        self._lines = {}     # satır uid -> fiş id
+        self._seq = 0
+        self._products = {}  # ürün -> kategori (menüden)
+        self._done = {}      # istasyon -> deque(hazırlanma süresi)
+        self.stats = {
+            'routed_lines': 0,
+            'completed_tickets': 0,
+            'discarded_lines': 0,
+            'expired_tickets': 0
+        }
+        self.configure(config)
+
+    # ==================== AYARLAR ====================
+
+    def configure(self, config=None):
+        """İstasyon/SLA ayarlarını uygula (açık fişler olduğu gibi kalır)"""
+        config = config or {}
+        stations = OrderedDict(config.get('stations') or DEFAULT_CONFIG['stations'])
+        default = config.get('default_station') or DEFAULT_CONFIG['default_station']
+        if default not in stations:
+            default = next(iter(stations))
+        categories = {}
+        for name, station in stations.items():
+            for category in station.get('kategoriler', []):
+                categories[category] = name
+        sla = dict(DEFAULT_CONFIG['sla_sec'])
+        sla.update(config.get('sla_sec') or {})
+        with self._lock:
+            self.stations = stations
+            self.default_station = default
+            self._categories = categories
+            self._product_stations = {urun: st for urun, st in (config.get('urunler') or {}).items()
+                                      if st in stations}
+            self.target_sec = config.get('target_sec') or DEFAULT_CONFIG['target_sec']
+            self.sla_sec = sla
+            for name in stations:
+                self._done.setdefault(name, deque(maxlen=self.history))
+
+    def set_menu(self, menu_data):
+        """Ürün -> kategori eşlemesini menüden kur ({kategori: [[ürün, fiyat, ...]]})"""
+        products = {}
+        for category, items in (menu_data or {}).items():
+            for item in items:
+                if item:
+                    products[item[0]] = category
+        with self._lock:
+            self._products = products
+
+    def station_for(self, urun):
+        station = self._product_stations.get(urun)
+        if station:
+            return station
+        return self._categories.get(self._products.get(urun), self.default_station)
+
+    # ==================== FİŞLER ====================
+
+    def submit(self, masa, items, source=None, now=None):
+        """
+        Yeni satırları istasyonlara dağıt.
+        items: OrderItem veya uid/urun/adet alanlı dict; 'istasyon' alanı
+               (sipariş alınırken yazılan) varsa o istasyon kullanılır
+        Dönen: {satır uid: fiş özeti} - yayına istasyon ve sıra bilgisi eklenir
+        """
+        now = time.time() if now is None else now
+        sla = self.sla_sec.get(source)
+        due = now + (sla if sla else self.target_sec)
+        routed = {}
+        with self._lock:
+            self._expire(now)
+            tickets = {}
+            for item in items:
+                uid, urun = item.get('uid'), item.get('urun')
+                if uid in self._lines:
+                    continue
+                station = item.get('istasyon')
+                if station not in self.stations:
+                    station = self.station_for(urun)
+                ticket = tickets.get(station)
+                if ticket is None:
+                    self._seq += 1
+                    ticket = tickets[station] = {
+                        'id': self._seq,
+                        'station': station,
+                        'masa': masa,
+                        'source': source,
+                        'sla': bool(sla),
+                        'created': now,
+                        'due': due,
+                        'lines': OrderedDict()
+                    }
+                    self._tickets[ticket['id']] = ticket
+                ticket['lines'][uid] = {'urun': urun, 'adet': item.get('adet') or 1}
+                self._lines[uid] = ticket['id']
+                routed[uid] = {'station': station, 'ticket': ticket['id'], 'due': due, 'sla': bool(sla)}
+            self.stats['routed_lines'] += len(routed)
+        return routed
+
+    def complete(self, uids, now=None):
+        """Hazır satırlar; tamamı hazır olan fişin süresi geçmişe yazılır"""
+        now = time.time() if now is None else now
+        with self._lock:
+            for ticket in self._pop_lines(uids):
+                if not ticket['lines']:
+                    self._done.setdefault(ticket['station'], deque(maxlen=self.history)).append(
+                        now - ticket['created'])
+                    self.stats['completed_tickets'] += 1
+
+    def discard(self, uids):
+        """İptal edilen / silinen satırlar (hazırlanma süresi yazılmaz)"""
+        with self._lock:
+            before = len(self._lines)
+            self._pop_lines(uids)
+            self.stats['discarded_lines'] += before - len(self._lines)
+
+    def move(self, uids, masa):
+        """Taşınan satırlar hedef masaya geçer; fişin bir kısmı taşındıysa fiş bölünür"""
+        with self._lock:
+            for ticket_id, moved in self._group(uids).items():
+                ticket = self._tickets[ticket_id]
+                if len(moved) == len(ticket['lines']):
+                    ticket['masa'] = masa
+                    continue
+                self._seq += 1
+                split = dict(ticket, id=self._seq, masa=masa,
+                             lines=OrderedDict((uid, ticket['lines'].pop(uid)) for uid in moved))
+                self._tickets[split['id']] = split
+                for uid in moved:
+                    self._lines[uid] = split['id']
+
+    def stations_for(self, uids):
+        """Satırların bulunduğu istasyonlar (olay yayını için)"""
+        with self._lock:
+            return sorted({self._tickets[ticket_id]['station'] for ticket_id in self._group(uids)})
+
+    def _group(self, uids):
+        groups = OrderedDict()
+        for uid in uids:
+            ticket_id = self._lines.get(uid)
+            if ticket_id is not None:
+                groups.setdefault(ticket_id, []).append(uid)
+        return groups
+
+    def _pop_lines(self, uids):
+        touched = []
+        for ticket_id, group in self._group(uids).items():
+            ticket = self._tickets[ticket_id]
+            for uid in group:
+                ticket['lines'].pop(uid, None)
+                self._lines.pop(uid, None)
+            if not ticket['lines']:
+                del self._tickets[ticket_id]
+            touched.append(ticket)
+        return touched
+
+    def _expire(self, now):
+        if not self.max_age:
+            return
+        for ticket in [t for t in self._tickets.values() if now - t['created'] > self.max_age]:
+            for uid in ticket['lines']:
+                self._lines.pop(uid, None)
+            del self._tickets[ticket['id']]
+            self.stats['expired_tickets'] += 1
+
+    # ==================== KUYRUK VE SAYAÇLAR ====================
+
+    def queue(self, station=None, now=None):
+        """İstasyonun (None: tümü) açık fişleri, öncelik sırasıyla"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            tickets = [t for t in self._tickets.values() if station is None or t['station'] == station]
+            tickets.sort(key=lambda t: (t['due'], t['created'], t['id']))
+            return [{
+                'id': t['id'],
+                'station': t['station'],
+                'masa': t['masa'],
+                'source': t['source'],
+                'sla': t['sla'],
+                'created': t['created'],
+                'due': t['due'],
+                'wait_sec': round(now - t['created'], 1),
+                'late': now > t['due'],
+                'lines': [dict(line, uid=uid) for uid, line in t['lines'].items()]
+            } for t in tickets]
+
+    def get_stats(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            self._expire(now)
+            stations = OrderedDict()
+            for name, station in self.stations.items():
+                stations[name] = {'ad': station.get('ad', name), 'tickets': 0, 'lines': 0, 'late': 0,
+                                  'oldest_wait_sec': 0.0, 'avg_wait_sec': 0.0}
+            waits = {}
+            for ticket in self._tickets.values():
+                s = stations.get(ticket['station'])
+                if s is None:  # Ayarlardan kaldırılmış istasyonun kalan fişleri
+                    continue
+                wait = now - ticket['created']
+                s['tickets'] += 1
+                s['lines'] += len(ticket['lines'])
+                s['late'] += now > ticket['due']
+                s['oldest_wait_sec'] = round(max(s['oldest_wait_sec'], wait), 1)
+                waits.setdefault(ticket['station'], []).append(wait)
+            for name, s in stations.items():
+                if name in waits:
+                    s['avg_wait_sec'] = round(sum(waits[name]) / len(waits[name]), 1)
+                done = sorted(self._done.get(name, ()))
+                s['completed'] = len(done)
+                s['avg_prep_sec'] = round(sum(done) / len(done), 1) if done else None
+                s['p90_prep_sec'] = round(done[min(len(done) - 1, int(len(done) * 0.9))], 1) if done else None
+            stats = dict(self.stats)
+            stats['open_tickets'] = len(self._tickets)
+            stats['open_lines'] = len(self._lines)
+            stats['stations'] = stations
+            return stats
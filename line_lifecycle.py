@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Sipariş Satırı Yaşam Döngüsü ve Hazırlanma Süreleri
+FastFootSatış
+
+Her satırın (uid) aşama zamanları tam tarih-saat (epoch) olarak tutulur:
+oluşma, mutfağa gönderim, hazır, servis, ödeme (ve iptal). Zamanlar
+monotondur: saat geri alınsa (NTP) bile bir aşama bir öncekinden önce
+görünmez.
+
+Değişen satırlar arka plan thread'inde toplu olarak veri tabanına
+(siparis_zamanlari tablosu) yazılır; sipariş akışı veri tabanını beklemez.
+Ödenen / iptal edilen satır yazıldıktan sonra bellekten düşer.
+
+Çok süreçli modda satır başka süreçte oluşmuş olabilir: bilinmeyen uid'nin
+aşama zamanı da toplu yazımda satırın tablodaki son kaydına (COALESCE ile,
+önceki zaman ezilmez) işlenir. Kayıt henüz yazılmamışsa (oluşturan süreç
+yazmadıysa) sonraki turlarda max_age boyunca tekrar denenir.
+
+Hazırlanma süresi = hazır - mutfağa gönderim. Son window saniyedeki
+süreler istasyon ve ürün başına tutulur; p50/p95 prep_stats() ile okunur.
+Bir istasyonun p95'i (tamamlananlar + kuyrukta bekleyenlerin şu anki
+süresi) eşiği geçince on_alert bir kez çağrılır, eşiğin altına inince
+tekrar (active=False) çağrılır.
+"""
+
+import math
+import time
+import datetime
+import threading
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Aşama -> siparis_zamanlari kolonu
+STAGES = OrderedDict([
+    ('created', 'olusturma'),
+    ('sent', 'mutfaga_gonderim'),
+    ('ready', 'hazir'),
+    ('served', 'servis'),
+    ('paid', 'odeme'),
+    ('cancelled', 'iptal')
+])
+CLOSING_STAGES = ('paid', 'cancelled')
+
+
+def percentile(values, q):
+    """Sıralı listede en yakın sıra yöntemiyle yüzdelik"""
+    if not values:
+        return None
+    return values[max(0, min(len(values) - 1, int(math.ceil(q * len(values))) - 1))]
+
+
+class LineLifecycle:
+    def __init__(self, store=None, window=3600, threshold=900, min_samples=5, max_age=4 * 3600,
+                 flush_interval=1.0, check_interval=15.0, on_alert=None):
+        """
+        :param store: save_line_timestamps(rows) / get_line_timestamps(uids) /
+                      mark_line_stages(rows) sağlayan nesne (db) veya None
+        :param window: p50/p95 için geriye bakılan süre (saniye)
+        :param threshold: İstasyon p95 uyarı eşiği (saniye)
+        :param min_samples: Uyarı için gereken en az ölçüm
+        :param max_age: Ödenmeden / iptal edilmeden bu kadar kalan satır bellekten düşer
+        :param on_alert: Uyarı değişiminde çağrılır ({'station', 'active', 'p95_sec', ...})
+        """
+        self.store = store
+        self.window = window
+        self.threshold = threshold
+        self.min_samples = max(1, int(min_samples))
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.check_interval = check_interval
+        self.on_alert = on_alert
+        self._lock = threading.Lock()
+        self._lines = {}        # uid -> kayıt
+        self._dirty = set()     # veri tabanına yazılacak uid'ler
+        self._remote = {}       # bu süreçte izlenmeyen uid -> {aşama: zaman} (başka süreçte oluşmuş)
+        self._last_ts = 0.0
+        self._samples = {}      # ('station', ad) / ('product', (istasyon, ürün)) -> deque((hazır zamanı, süre))
+        self._alerts = {}       # istasyon -> aktif uyarı
+        self._thread = None
+        self._stop = threading.Event()
+        self.stats = {
+            'tracked_lines': 0,
+            'ready_lines': 0,
+            'written_rows': 0,
+            'remote_marks': 0,
+            'write_batches': 0,
+            'write_errors': 0,
+            'alerts': 0,
+            'last_error': None
+        }
+
+    def start(self):
+        """Veri tabanı yazıcı / uyarı thread'ini başlat"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="line-lifecycle", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Thread'i durdur, bekleyen kayıtları yaz"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        next_check = time.monotonic() + self.check_interval
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            if time.monotonic() >= next_check:
+                next_check = time.monotonic() + self.check_interval
+                self.check_alerts()
+
+    def _now(self, now=None):
+        """Monoton duvar saati: önceki okumadan geri gitmez (verilen zaman olduğu gibi kullanılır)"""
+        if now is not None:
+            return now
+        self._last_ts = max(self._last_ts, time.time())
+        return self._last_ts
+
+    # ==================== AŞAMALAR ====================
+
+    def track(self, masa, items, routed=None, source=None, now=None, sent=True):
+        """
+        Yeni satırlar: oluşma (ve mutfağa gönderim) zamanı.
+        routed: kitchen_engine.submit() sonucu (uid -> istasyon)
+        """
+        routed = routed or {}
+        with self._lock:
+            ts = self._now(now)
+            for item in items:
+                uid = item.get('uid')
+                if uid in self._lines:
+                    continue
+                self._lines[uid] = {
+                    'uid': uid,
+                    'masa': masa,
+                    'urun': item.get('urun'),
+                    'adet': item.get('adet') or 1,
+                    'istasyon': routed.get(uid, {}).get('station'),
+                    'kaynak': source,
+                    'created': ts,
+                    'sent': ts if sent else None
+                }
+                self._dirty.add(uid)
+            self.stats['tracked_lines'] = len(self._lines)
+
+    def restore(self, masa, items, routed=None, created=None):
+        """
+        Yeniden başlatmada açık satırlar: zamanlar veri tabanında varsa oradan,
+        yoksa verilen yaklaşık oluşma zamanından alınır.
+        """
+        rows = {}
+        if self.store is not None:
+            try:
+                rows = {row['uid']: row for row in self.store.get_line_timestamps([i.get('uid') for i in items])}
+            except Exception as e:
+                logger.error(f"Satır zamanları okunamadı: {e}")
+        self.track(masa, items, routed, now=created)
+        with self._lock:
+            for uid, row in rows.items():
+                record = self._lines.get(uid)
+                if record is None:
+                    continue
+                for stage, column in STAGES.items():
+                    if row.get(column) is not None:
+                        record[stage] = row[column].timestamp()
+                record['kaynak'] = row.get('kaynak') or record['kaynak']
+                self._dirty.discard(uid)
+
+    def mark(self, uids, stage, now=None, unknown=True):
+        """
+        Satırlara aşama zamanı yaz (ilk kayıt geçerlidir).
+        unknown: bu süreçte izlenmeyen uid'lerin zamanı da veri tabanına işlensin
+        """
+        if stage not in STAGES:
+            raise ValueError(f"Bilinmeyen aşama: {stage}")
+        with self._lock:
+            ts = self._now(now)
+            for uid in uids:
+                record = self._lines.get(uid)
+                if record is None:
+                    if unknown and self.store is not None:
+                        remote = self._remote.setdefault(uid, {'since': ts})
+                        remote.setdefault(stage, ts)
+                    continue
+                if record.get(stage) is not None:
+                    continue
+                # Önceki aşamalardan önce görünmesin
+                record[stage] = max([ts] + [record[s] for s in STAGES if record.get(s) is not None])
+                self._dirty.add(uid)
+                if stage == 'ready' and record.get('sent') is not None:
+                    self._add_sample(record, record['ready'] - record['sent'], record['ready'])
+
+    def _add_sample(self, record, seconds, ts):
+        self.stats['ready_lines'] += 1
+        station = record['istasyon'] or '-'
+        for key in (('station', station), ('product', (station, record['urun']))):
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=2000)
+            samples.append((ts, seconds))
+
+    def get(self, uid):
+        with self._lock:
+            record = self._lines.get(uid)
+            return dict(record) if record else None
+
+    # ==================== KALICILIK ====================
+
+    def flush(self, now=None):
+        """Değişen satırları tek toplu yazımla kaydet; kapanan/eskiyen satırları bırak"""
+        with self._lock:
+            now = self._now(now)
+            dirty, self._dirty = self._dirty, set()
+            rows = [self._row(self._lines[uid]) for uid in dirty if uid in self._lines]
+        self._flush_remote(now)
+        if rows and self.store is not None:
+            try:
+                self.store.save_line_timestamps(rows)
+                self.stats['written_rows'] += len(rows)
+                self.stats['write_batches'] += 1
+            except Exception as e:
+                self.stats['write_errors'] += 1
+                self.stats['last_error'] = str(e)
+                logger.error(f"Satır zamanları yazılamadı: {e}")
+                with self._lock:
+                    self._dirty.update(row['uid'] for row in rows)  # Sonraki turda tekrar
+                return
+        with self._lock:
+            for uid in [uid for uid, r in self._lines.items() if uid not in self._dirty and (
+                    any(r.get(s) is not None for s in CLOSING_STAGES) or now - r['created'] > self.max_age)]:
+                del self._lines[uid]
+            self.stats['tracked_lines'] = len(self._lines)
+
+    def _flush_remote(self, now):
+        """Başka süreçte oluşmuş satırların aşamalarını tablodaki kayıtlarına işle"""
+        with self._lock:
+            remote, self._remote = self._remote, {}
+        if not remote:
+            return
+        rows = [dict(self._row(dict(stages, uid=uid)), uid=uid) for uid, stages in remote.items()]
+        try:
+            found = set(self.store.mark_line_stages(rows))
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            self.stats['last_error'] = str(e)
+            logger.error(f"Satır zamanları yazılamadı: {e}")
+            found = set()
+        self.stats['remote_marks'] += len(found)
+        with self._lock:
+            for uid, stages in remote.items():
+                # Kaydı oluşturan süreç henüz yazmadı: sonraki turda tekrar (önceki zamanlar geçerli)
+                if uid not in found and now - stages['since'] <= self.max_age:
+                    self._remote[uid] = dict(self._remote.get(uid, {}), **stages)
+
+    @staticmethod
+    def _row(record):
+        row = {key: record.get(key) for key in ('uid', 'masa', 'urun', 'adet', 'istasyon', 'kaynak')}
+        for stage, column in STAGES.items():
+            ts = record.get(stage)
+            row[column] = datetime.datetime.fromtimestamp(ts).astimezone() if ts is not None else None
+        return row
+
+    # ==================== SÜRELER VE UYARI ====================
+
+    def _window_values(self, key, since):
+        samples = self._samples.get(key)
+        if not samples:
+            return []
+        while samples and samples[0][0] < since:
+            samples.popleft()
+        return [seconds for _, seconds in samples]
+
+    def prep_stats(self, now=None):
+        """İstasyon ve ürün başına son window saniyenin p50/p95 hazırlanma süresi"""
+        with self._lock:
+            now = self._now(now)
+            since = now - self.window
+            waiting = {}
+            for record in self._lines.values():
+                if record.get('sent') is not None and record.get('ready') is None and not any(
+                        record.get(s) is not None for s in CLOSING_STAGES):
+                    waiting.setdefault(record['istasyon'] or '-', []).append(now - record['sent'])
+            stations, products = {}, []
+            for (kind, name), _ in list(self._samples.items()):
+                values = sorted(self._window_values((kind, name), since))
+                if not values:
+                    continue
+                entry = {'count': len(values), 'p50_sec': round(percentile(values, 0.5), 1),
+                         'p95_sec': round(percentile(values, 0.95), 1)}
+                if kind == 'station':
+                    stations[name] = entry
+                else:
+                    products.append(dict(entry, station=name[0], urun=name[1]))
+            for name in set(stations) | set(waiting):
+                entry = stations.setdefault(name, {'count': 0, 'p50_sec': None, 'p95_sec': None})
+                queue = sorted(self._window_values(('station', name), since) + waiting.get(name, []))
+                entry['waiting'] = len(waiting.get(name, []))
+                entry['queue_p95_sec'] = round(percentile(queue, 0.95), 1) if queue else None
+                entry['alert'] = bool(self._alerts.get(name))
+            products.sort(key=lambda p: p['p95_sec'], reverse=True)
+            return {'window_sec': self.window, 'threshold_sec': self.threshold,
+                    'stations': stations, 'products': products}
+
+    def check_alerts(self, now=None):
+        """Eşik geçişlerini bul ve on_alert'e bildir; değişen uyarıları döndür"""
+        stats = self.prep_stats(now)
+        changes = []
+        empty = {'count': 0, 'waiting': 0, 'queue_p95_sec': None}
+        for name in set(stats['stations']) | {n for n, active in self._alerts.items() if active}:
+            entry = stats['stations'].get(name, empty)
+            count = entry['count'] + entry['waiting']
+            p95 = entry['queue_p95_sec']
+            active = p95 is not None and count >= self.min_samples and p95 > self.threshold
+            if active == bool(self._alerts.get(name)):
+                continue
+            self._alerts[name] = active
+            slowest = [p['urun'] for p in stats['products'] if p['station'] == name][:5]
+            alert = {'station': name, 'active': active, 'p95_sec': p95, 'threshold_sec': self.threshold,
+                     'waiting': entry['waiting'], 'slowest': slowest}
+            changes.append(alert)
+            if active:
+                self.stats['alerts'] += 1
+                logger.warning(f"⏱ Mutfak p95 eşiği aşıldı: {name} {p95:.0f} sn > {self.threshold} sn")
+            if self.on_alert:
+                try:
+                    self.on_alert(alert)
+                except Exception as e:
+                    logger.error(f"Mutfak uyarısı gönderilemedi: {e}")
+        return changes
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['pending_rows'] = len(self._dirty)
+            stats['pending_remote'] = len(self._remote)
+            stats['active_alerts'] = sorted(name for name, active in self._alerts.items() if active)
+        return stats
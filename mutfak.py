@@ -1,21 +1,85 @@
 import tkinter as tk
 from tkinter import ttk
 import socket
-import json
 import threading
+import time
+import random
+import argparse
+import statistics
+from collections import OrderedDict, deque
 from datetime import datetime
+from framed_protocol import RecentIds, serve_connection
 
 # --- AYARLAR ---
 MUTFAK_PORT = 5556  # Ana terminalden farklı bir port kullanıyoruz
+SUTUN_SAYISI = 4    # Kart ızgarası sütun sayısı
+SAYFA_BOYUTU = 12   # Ekranda aynı anda gösterilen en fazla kart (fazlası sonraki sayfalarda)
+
+
+class SiparisListesi:
+    """ Anahtarlı sipariş listesi ve sayfalama (Tk'den bağımsız).
+    Her fişin kalıcı bir anahtarı vardır; ekran sadece değişen kartları
+    ekler, kaldırır veya yerini değiştirir. """
+
+    def __init__(self, sayfa_boyutu=SAYFA_BOYUTU, sutun=SUTUN_SAYISI):
+        self.sayfa_boyutu = max(1, sayfa_boyutu)
+        self.sutun = max(1, sutun)
+        self.sayfa = 0
+        self._siparisler = OrderedDict()  # anahtar -> veri (geliş sırasıyla)
+        self._sayac = 0
+
+    def __len__(self):
+        return len(self._siparisler)
+
+    def __contains__(self, anahtar):
+        return anahtar in self._siparisler
+
+    def __getitem__(self, anahtar):
+        return self._siparisler[anahtar]
+
+    def ekle(self, veri):
+        """ Fişi ekle, anahtarını döndür (mesaj id'si varsa o kullanılır) """
+        anahtar = veri.get('id')
+        if anahtar is None or anahtar in self._siparisler:
+            self._sayac += 1
+            anahtar = f"k{self._sayac}"
+        self._siparisler[anahtar] = veri
+        return anahtar
+
+    def kaldir(self, anahtar):
+        self._siparisler.pop(anahtar, None)
+        self.sayfa = min(self.sayfa, self.sayfa_sayisi() - 1)
+
+    def sayfa_sayisi(self):
+        return max(1, -(-len(self._siparisler) // self.sayfa_boyutu))
+
+    def sayfaya_git(self, sayfa):
+        self.sayfa = max(0, min(sayfa, self.sayfa_sayisi() - 1))
+
+    def yerlesim(self):
+        """ Geçerli sayfadaki kartlar: {anahtar: (satır, sütun)} """
+        bas = self.sayfa * self.sayfa_boyutu
+        anahtarlar = list(self._siparisler)[bas:bas + self.sayfa_boyutu]
+        return {a: (i // self.sutun, i % self.sutun) for i, a in enumerate(anahtarlar)}
+
 
 class MutfakEkrani:
-    def __init__(self, root):
+    def __init__(self, root, dinle=True, tam_yenile=False):
         self.root = root
         self.root.title("👨‍🍳 MUTFAK SİPARİŞ TAKİP SİSTEMİ")
-        self.root.state('zoomed')
+        try:
+            self.root.state('zoomed')
+        except tk.TclError:
+            self.root.attributes('-zoomed', True)  # Linux/X11
         self.root.configure(bg="#2c3e50")
 
-        self.siparisler = [] # Aktif siparişleri tutar
+        self.siparisler = SiparisListesi() # Aktif siparişleri tutar
+        self.son_mesajlar = RecentIds() # Tekrar gönderilen fişler iki kez görünmesin
+        self.kartlar = {}   # anahtar -> (kart çerçevesi, (satır, sütun))
+        self.tam_yenile = tam_yenile  # Karşılaştırma için: her değişiklikte tüm kartları yeniden çiz
+        self.gelenler = deque()  # Ağ thread'lerinden gelen fişler (Tk thread'inde işlenir)
+        self.tazeleme_bekliyor = False
+        self.kare_sureleri = []  # ekranı tazeleme süreleri (ms)
 
         # Üst Başlık
         header = tk.Frame(self.root, bg="#1abc9c", height=60)
@@ -26,6 +90,8 @@ class MutfakEkrani:
         # Sipariş Kartlarının Dizileceği Alan
         self.main_container = tk.Frame(self.root, bg="#2c3e50")
         self.main_container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
+        for sutun in range(SUTUN_SAYISI):
+            self.main_container.grid_columnconfigure(sutun, weight=1, uniform="kart")
 
         # Alt Bilgi Barı
         self.footer = tk.Frame(self.root, bg="#34495e", height=30)
@@ -34,8 +100,22 @@ class MutfakEkrani:
                                      fg="#ecf0f1", bg="#34495e", font=("Consolas", 10))
         self.status_label.pack(side=tk.LEFT, padx=10)
 
+        # Sayfalama (ekrana sığmayan siparişler)
+        self.btn_sonraki = tk.Button(self.footer, text="Sonraki ▶", font=("Arial", 11, "bold"),
+                                     command=lambda: self.sayfa_degistir(1))
+        self.btn_sonraki.pack(side=tk.RIGHT, padx=5, pady=3)
+        self.sayfa_label = tk.Label(self.footer, text="", fg="#ecf0f1", bg="#34495e", font=("Arial", 11, "bold"))
+        self.sayfa_label.pack(side=tk.RIGHT, padx=10)
+        self.btn_onceki = tk.Button(self.footer, text="◀ Önceki", font=("Arial", 11, "bold"),
+                                    command=lambda: self.sayfa_degistir(-1))
+        self.btn_onceki.pack(side=tk.RIGHT, padx=5, pady=3)
+        self.root.bind("<Left>", lambda e: self.sayfa_degistir(-1))
+        self.root.bind("<Right>", lambda e: self.sayfa_degistir(1))
+        self.alt_bilgi_guncelle()
+
         # Server'ı Başlat
-        self.start_listener()
+        if dinle:
+            self.start_listener()
 
     def start_listener(self):
         def listen():
@@ -46,36 +126,85 @@ class MutfakEkrani:
                 server.listen(5)
                 while True:
                     client, addr = server.accept()
-                    data = client.recv(4096).decode('utf-8')
-                    if data:
-                        self.yeni_siparis_islem(json.loads(data))
-                    client.close()
+                    threading.Thread(target=self.baglanti_oku, args=(client,), daemon=True).start()
             except Exception as e:
                 print(f"Mutfak Server Hatası: {e}")
 
         threading.Thread(target=listen, daemon=True).start()
 
+    def baglanti_oku(self, client):
+        """ Açık kalan bağlantıdan satır satır JSON okur (framed_protocol).
+        id'li mesajlar onaylanır, tekrar gelen id ikinci kez gösterilmez.
+        Tek seferlik gönderenlerin (satır sonu olmadan gönderip kapatan) mesajı
+        bağlantı kapanınca işlenir. """
+        try:
+            serve_connection(client, self.yeni_siparis_islem, self.son_mesajlar)
+        except Exception as e:
+            print(f"Mutfak bağlantı hatası: {e}")
+        finally:
+            client.close()
+
     def yeni_siparis_islem(self, veri):
-        """ Gelen veriyi listeye ekler ve ekranı tazeler """
+        """ Gelen veriyi kuyruğa ekler; ekran kısa süre içinde tek seferde tazelenir """
         # Veri: {"masa": "Masa 5", "siparisler": [...], "saat": "14:30"}
         veri["giris_saati"] = datetime.now().strftime("%H:%M")
-        self.siparisler.append(veri)
-        self.root.after(0, self.ekrani_tazele)
+        self.gelenler.append(veri)
+        if not self.tazeleme_bekliyor:
+            self.tazeleme_bekliyor = True
+            self.root.after(0, self.gelenleri_isle)
+
+    def gelenleri_isle(self):
+        """ Biriken fişleri listeye al (Tk thread'i) """
+        self.tazeleme_bekliyor = False
+        while self.gelenler:
+            self.siparisler.ekle(self.gelenler.popleft())
+        self.ekrani_tazele()
 
     def ekrani_tazele(self):
-        """ Mevcut siparişleri kart şeklinde ekrana dizer """
-        # Önce eski kartları temizle
-        for widget in self.main_container.winfo_children():
-            widget.destroy()
+        """ Sadece değişen kartları ekler, kaldırır veya yerini değiştirir """
+        baslangic = time.perf_counter()
+        if self.tam_yenile:
+            self.tumunu_yeniden_ciz()
+        else:
+            yerlesim = self.siparisler.yerlesim()
+            # Sayfadan çıkan kartlar
+            for anahtar in [a for a in self.kartlar if a not in yerlesim]:
+                self.kartlar.pop(anahtar)[0].destroy()
+            for anahtar, konum in yerlesim.items():
+                kart = self.kartlar.get(anahtar)
+                if kart is None:
+                    self.kartlar[anahtar] = (self.kart_olustur(anahtar, konum), konum)
+                elif kart[1] != konum:
+                    # Öndeki kart tamamlandı: sadece yer değiştir
+                    kart[0].grid(row=konum[0], column=konum[1])
+                    self.kartlar[anahtar] = (kart[0], konum)
+        self.alt_bilgi_guncelle()
+        self.root.update_idletasks()
+        self.kare_sureleri.append((time.perf_counter() - baslangic) * 1000)
+
+    def tumunu_yeniden_ciz(self):
+        """ Eski davranış: tüm kartları silip baştan çiz (sentetik ölçümde karşılaştırma için) """
+        for kart, _ in self.kartlar.values():
+            kart.destroy()
+        self.kartlar = {anahtar: (self.kart_olustur(anahtar, konum), konum)
+                        for anahtar, konum in self.siparisler.yerlesim().items()}
 
-        # Her sipariş için bir 'Kart' oluştur (4 sütunlu grid)
-        for idx, siparis in enumerate(self.siparisler):
-            self.kart_olustur(siparis, idx)
+    def alt_bilgi_guncelle(self):
+        sayfa_sayisi = self.siparisler.sayfa_sayisi()
+        self.sayfa_label.config(text=f"Sayfa {self.siparisler.sayfa + 1}/{sayfa_sayisi} · "
+                                     f"{len(self.siparisler)} sipariş")
+        self.btn_onceki.config(state=tk.NORMAL if self.siparisler.sayfa > 0 else tk.DISABLED)
+        self.btn_sonraki.config(state=tk.NORMAL if self.siparisler.sayfa < sayfa_sayisi - 1 else tk.DISABLED)
 
-    def kart_olustur(self, veri, index):
+    def sayfa_degistir(self, adim):
+        self.siparisler.sayfaya_git(self.siparisler.sayfa + adim)
+        self.ekrani_tazele()
+
+    def kart_olustur(self, anahtar, konum):
+        veri = self.siparisler[anahtar]
         # Kart Çerçevesi
         kart = tk.Frame(self.main_container, bg="#ecf0f1", bd=2, relief=tk.RAISED, padx=10, pady=10)
-        kart.grid(row=index // 4, column=index % 4, padx=10, pady=10, sticky="nsew")
+        kart.grid(row=konum[0], column=konum[1], padx=10, pady=10, sticky="nsew")
 
         # Masa ve Saat Bilgisi
         ust_bilgi = tk.Frame(kart, bg="#ecf0f1")
@@ -89,21 +218,71 @@ class MutfakEkrani:
         for urun in veri['siparisler']:
             # Kivy'den gelen yapıda urun['urun'] kullanılır
             u_ad = urun.get('urun', 'Bilinmeyen')
-            tk.Label(kart, text=f"• {u_ad}", font=("Arial", 12), bg="#ecf0f1", anchor="w").pack(fill=tk.X)
+            adet = urun.get('adet', 1)
+            metin = f"• {adet} x {u_ad}" if adet != 1 else f"• {u_ad}"
+            tk.Label(kart, text=metin, font=("Arial", 12), bg="#ecf0f1", anchor="w").pack(fill=tk.X)
 
         # "HAZIR" Butonu
         btn_hazir = tk.Button(kart, text="TAMAMLANDI / HAZIR", bg="#27ae60", fg="white", 
                               font=("Arial", 11, "bold"), height=2,
-                              command=lambda s=veri: self.siparis_tamamla(s))
+                              command=lambda a=anahtar: self.siparis_tamamla(a))
         btn_hazir.pack(fill=tk.X, pady=(10, 0))
+        return kart
 
-    def siparis_tamamla(self, siparis_obj):
+    def siparis_tamamla(self, anahtar):
         """ Siparişi listeden kaldırır """
-        if siparis_obj in self.siparisler:
-            self.siparisler.remove(siparis_obj)
+        if anahtar in self.siparisler:
+            self.siparisler.kaldir(anahtar)
             self.ekrani_tazele()
 
+
+def sentetik_akis(app, acik=100, sure=20.0, aralik_ms=200):
+    """ Ölçüm modu: önce 'acik' kadar fiş yüklenir, sonra her aralıkta bir fiş
+    gelir ve ilk sayfadan bir fiş tamamlanır. Sonunda kare süreleri yazılır. """
+    urunler = ["Tost", "Hamburger", "Çay", "Ayran", "Patates", "Kola", "Lahmacun", "Döner"]
+    sayac = [0]
+
+    def fis():
+        sayac[0] += 1
+        return {"id": f"sentetik:{sayac[0]}", "masa": f"Masa {random.randint(1, 40)}",
+                "siparisler": [{"urun": random.choice(urunler), "adet": random.randint(1, 3)}
+                               for _ in range(random.randint(1, 6))]}
+
+    for _ in range(acik):
+        app.yeni_siparis_islem(fis())
+    app.root.update()
+    app.kare_sureleri.clear()  # İlk yükleme ölçüme katılmaz
+    bitis = time.perf_counter() + sure
+
+    def adim():
+        if time.perf_counter() >= bitis:
+            sureler = sorted(app.kare_sureleri) or [0.0]
+            p95 = sureler[min(len(sureler) - 1, int(len(sureler) * 0.95))]
+            mod = "tam yenileme" if app.tam_yenile else "artımlı"
+            print(f"{mod}: {len(sureler)} kare, açık fiş {len(app.siparisler)} | "
+                  f"p50 {statistics.median(sureler):.1f} ms, p95 {p95:.1f} ms, en çok {sureler[-1]:.1f} ms")
+            app.root.destroy()
+            return
+        ilk = next(iter(app.siparisler.yerlesim()), None)
+        if ilk is not None:
+            app.siparis_tamamla(ilk)
+        app.yeni_siparis_islem(fis())
+        app.root.after(aralik_ms, adim)
+
+    app.root.after(aralik_ms, adim)
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mutfak sipariş ekranı")
+    parser.add_argument("--sentetik", type=int, metavar="FIS",
+                        help="Dinlemeden sentetik fişlerle kare süresini ölç (açık fiş sayısı, ör. 100)")
+    parser.add_argument("--sure", type=float, default=20.0, help="Sentetik ölçüm süresi (sn)")
+    parser.add_argument("--tam-yenile", action="store_true",
+                        help="Karşılaştırma: her değişiklikte tüm kartları yeniden çiz")
+    args = parser.parse_args()
+
     root = tk.Tk()
-    app = MutfakEkrani(root)
+    app = MutfakEkrani(root, dinle=args.sentetik is None, tam_yenile=args.tam_yenile)
+    if args.sentetik is not None:
+        sentetik_akis(app, acik=args.sentetik, sure=args.sure)
     root.mainloop()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""
+Satış Defteri (toplu kayıt)
+FastFootSatış
+
+Ödemede satılan satırlar tek parti olarak yazılır:
+- Veri tabanında Database.save_sales_batch: tek çok satırlı INSERT
+  (execute_values), büyük partide COPY FROM STDIN. Eklenen id'ler döner.
+- Veri tabanı yoksa veya yazım hata verirse aynı parti Excel'e
+  (satislar.xlsx) tek okuma/yazımla eklenir.
+
+Satış sözlükleri terminal ve masaüstü uygulamalarındaki biçimdedir:
+{'urun', 'adet', 'fiyat', 'odeme', 'tip', 'Tarih_Saat', 'masa', ...}.
+Tarih_Saat datetime veya "gg-aa-yyyy ss:dd:sn" metni olabilir; veri
+tabanına PostgreSQL'in DateStyle ayarından bağımsız olarak datetime
+gönderilir.
+"""
+
+import io
+import os
+from datetime import datetime
+
+SATIS_FILE = "satislar.xlsx"
+
+# satislar tablosuna yazılan kolonlar (sırayla)
+SALES_COLUMNS = ('urun', 'adet', 'fiyat', 'odeme', 'tip', 'tarih_saat', 'masa', 'terminal_id', 'vardiya_id')
+
+# Uygulamaların kullandığı tarih biçimleri
+TIME_FORMATS = ("%d-%m-%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M:%S")
+
+
+def parse_sale_time(value, default=None):
+    """Tarih_Saat alanını datetime'a çevir (bilinmeyen metin olduğu gibi bırakılır)"""
+    if value is None or value == '':
+        return default or datetime.now()
+    if isinstance(value, datetime):
+        return value
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.strptime(str(value), fmt)
+        except ValueError:
+            continue
+    return value
+
+
+def sale_row(sale, now=None):
+    """Satış sözlüğü -> SALES_COLUMNS sırasında satır"""
+    return (
+        sale.get('urun'),
+        sale.get('adet', 1),
+        sale.get('fiyat'),
+        sale.get('odeme', 'Nakit'),
+        sale.get('tip', 'normal'),
+        parse_sale_time(sale.get('Tarih_Saat', sale.get('tarih_saat')), now),
+        sale.get('masa'),
+        sale.get('terminal_id'),
+        sale.get('vardiya_id')
+    )
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def copy_buffer(rows):
+    """COPY FROM STDIN (text biçimi) için satırlar: sekme ayraçlı, NULL = \\N"""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(_copy_value(value) for value in row))
+        buf.write('\n')
+    buf.seek(0)
+    return buf
+
+
+def append_sales_to_excel(sales_list, path=SATIS_FILE):
+    """Partiyi Excel'e tek seferde ekle"""
+    import pandas as pd
+    df = pd.DataFrame(sales_list)
+    old = pd.read_excel(path) if os.path.exists(path) else pd.DataFrame()
+    pd.concat([old, df]).to_excel(path, index=False)
+
+
+def save_sales(sales_list, db=None, excel_path=SATIS_FILE):
+    """
+    Satışları kaydet: db verildiyse toplu veri tabanı yazımı, hata olursa Excel.
+    Dönen: veri tabanı id'leri, Excel'e yazıldıysa [], kaydedilemediyse None
+    """
+    if not sales_list:
+        return []
+    if db is not None:
+        try:
+            return db.save_sales_batch(sales_list)
+        except Exception as e:
+            print(f"DB Hatası: {e}, Excel'e geçiliyor...")
+    try:
+        append_sales_to_excel(sales_list, excel_path)
+        return []
+    except Exception as e:
+        print(f"Excel Hatası: {e}")
+        return None
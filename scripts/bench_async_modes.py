@@ -0,0 +1,202 @@
+"""
+Eşzamanlılık modu karşılaştırması: threading / eventlet / gevent
+
+Her mod için sunucu ayrı bir süreçte (FASTFOOT_ASYNC_MODE ile) başlatılır.
+N kasa istemcisi (Socket.IO, long-polling) birkaç ayrı istemci sürecinde
+bağlanır; ardından online sipariş API'sine art arda sipariş gönderilir ve
+her istemcinin item_added olayını alma gecikmesi ölçülür (siparişin
+gönderilmesinden olayın istemcide işlenmesine kadar, duvar saati). Bir mod, p99 gecikmesi eşiğin altında
+kaldığı en yüksek istemci sayısını "taşıyor" kabul edilir.
+
+İstemciler de aynı makinede çalıştığı için mutlak değerler üst sınır
+değil karşılaştırma içindir.
+
+Kullanım:
+    python scripts/bench_async_modes.py --modes threading eventlet --clients 50 100 200 400
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(mode, port):
+    """Alt süreç: seçilen modda sunucuyu çalıştır"""
+    os.environ["FASTFOOT_ASYNC_MODE"] = mode
+    os.environ["FASTFOOT_ADISYON_FILE"] = os.path.join(tempfile.mkdtemp(prefix="ff_bench_"),
+                                                       "active_adisyonlar.json")
+    os.environ["FASTFOOT_EMIT_WINDOW_MS"] = "0"  # Ölçülen: taşıma gecikmesi
+    sys.path.insert(0, ROOT)
+    import web_server  # async_runtime.setup() monkey-patch'i burada yapar
+    logging.disable(logging.CRITICAL)
+    web_server.server._send_kitchen_ticket = lambda *a, **kw: None
+    print(f"mode={web_server.ASYNC_MODE}", flush=True)
+    web_server.socketio.run(web_server.app, host="127.0.0.1", port=port, allow_unsafe_werkzeug=True,
+                            log_output=False)
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def wait_for_server(url, timeout=20):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url + "/api/system/events", timeout=1)
+            return True
+        except Exception:
+            time.sleep(0.2)
+    return False
+
+
+def client_worker(url, clients):
+    """Alt süreç: clients adet kasa istemcisi aç, item_added alış zamanlarını topla.
+    stdin kapanınca [[masa, zaman], ...] JSON'unu yazar."""
+    import json
+    import socketio
+
+    received = []
+    lock = threading.Lock()
+    connected = []
+    failures = [0]
+
+    def connect():
+        c = socketio.Client(reconnection=False)
+
+        @c.on('item_added')
+        def on_item(data):
+            with lock:
+                received.append([data.get('masa'), time.time()])
+
+        try:
+            # Menü/sistem (binary) bölümleri bu ölçümde gereksiz
+            c.connect(url + "?role=cashier", transports=['polling'], wait_timeout=30,
+                      auth={'skip': ['menu', 'system']})
+            with lock:
+                connected.append(c)
+        except Exception:
+            failures[0] += 1
+
+    # Bağlantılar 25'lik dalgalarla açılır (gerçek açılışta tabletler de dağınık gelir)
+    for start in range(0, clients, 25):
+        threads = [threading.Thread(target=connect) for _ in range(start, min(clients, start + 25))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    print(json.dumps({'connected': len(connected), 'failed': failures[0]}), flush=True)
+
+    sys.stdin.read()  # Ölçüm bitene kadar bekle
+    for c in connected:
+        try:
+            c.disconnect()
+        except Exception:
+            pass
+    print(json.dumps(received), flush=True)
+
+
+def measure(url, clients, orders, interval, workers):
+    import json
+    import requests
+
+    per_worker = [clients // workers + (1 if n < clients % workers else 0) for n in range(workers)]
+    procs = [subprocess.Popen([sys.executable, os.path.abspath(__file__), "--client-worker", str(count),
+                               "--port", url.rsplit(":", 1)[1]],
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+             for count in per_worker if count]
+    connected = failed = 0
+    for proc in procs:
+        status = json.loads(proc.stdout.readline())
+        connected += status['connected']
+        failed += status['failed']
+    time.sleep(0.5)
+
+    sent_at = {}
+    for k in range(orders):
+        # Her adımda yeni ad/telefon: açık adisyon adı çakışmaz, oran sınırına takılmaz
+        name = f"Bench {clients}-{k}"
+        sent_at[f"Online - {name}"] = time.time()
+        requests.post(url + "/api/online/order", json={
+            'musteri_adi': name, 'telefon': f"05{clients:04d}{k:05d}", 'adres': 'Bench',
+            'items': [{'urun': 'Çay', 'adet': 1, 'fiyat': 20.0}]
+        }, timeout=30)
+        time.sleep(interval)
+    time.sleep(3)
+
+    latencies = []
+    for proc in procs:
+        out, _ = proc.communicate("", timeout=120)
+        for masa, at in json.loads(out.strip().splitlines()[-1]):
+            if masa in sent_at:
+                latencies.append((at - sent_at[masa]) * 1000)
+    lost = connected * orders - len(latencies)
+    return connected, failed, latencies, lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eşzamanlılık modu benchmark")
+    parser.add_argument("--modes", nargs="+", default=["threading", "eventlet", "gevent"])
+    parser.add_argument("--clients", nargs="+", type=int, default=[50, 100, 200, 400])
+    parser.add_argument("--orders", type=int, default=20, help="Her adımda gönderilen sipariş sayısı")
+    parser.add_argument("--interval", type=float, default=0.1, help="Siparişler arası bekleme (sn)")
+    parser.add_argument("--p99-ms", type=float, default=250.0, help="Taşıma eşiği (p99 gecikme)")
+    parser.add_argument("--workers", type=int, default=4, help="İstemci süreç sayısı")
+    parser.add_argument("--port", type=int, default=8790)
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--client-worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return
+    if args.client_worker:
+        client_worker(f"http://127.0.0.1:{args.port}", args.client_worker)
+        return
+
+    logging.disable(logging.CRITICAL)
+    url = f"http://127.0.0.1:{args.port}"
+    summary = {}
+    for mode in args.modes:
+        proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode,
+                                 "--port", str(args.port)],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            actual = ""
+            for line in proc.stdout:  # İlk satırlar DB bağlantı mesajları olabilir
+                if line.startswith("mode="):
+                    actual = line.strip().split("=", 1)[1]
+                    break
+            if actual != mode or not wait_for_server(url):
+                print(f"{mode:10} atlandı (kurulu değil veya başlamadı: {actual or '-'})")
+                continue
+            summary[mode] = 0
+            for clients in args.clients:
+                ok, failed, latencies, lost = measure(url, clients, args.orders, args.interval, args.workers)
+                p50, p99 = percentile(latencies, 50), percentile(latencies, 99)
+                print(f"{mode:10} {clients:4} istemci (bağlı {ok:4}, hata {failed:3}) | "
+                      f"p50 {p50:7.1f} ms | p99 {p99:7.1f} ms | kayıp olay {lost}")
+                if failed or lost or p99 > args.p99_ms:
+                    break
+                summary[mode] = clients
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    print(f"\np99 < {args.p99_ms:.0f} ms ile taşınan en yüksek istemci sayısı:")
+    for mode, clients in summary.items():
+        print(f"  {mode:10} {clients}")
+
+
+if __name__ == "__main__":
+    main()
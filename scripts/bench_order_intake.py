@@ -0,0 +1,79 @@
+"""
+Toplu sipariş alımı karşılaştırması: add_order_item döngüsü vs add_order_items
+
+Sunucu süreç içinde kurulur; adisyon dosyası geçici dizine yazılır, legacy
+mutfak TCP gönderimi ve Socket.IO yayını sayılarak taklit edilir.
+
+Kullanım:
+    python scripts/bench_order_intake.py --lines 50 --rounds 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Toplu sipariş alımı benchmark")
+    parser.add_argument("--lines", type=int, default=50, help="Sipariş satır sayısı")
+    parser.add_argument("--rounds", type=int, default=20, help="Tekrar sayısı")
+    parser.add_argument("--persist-ms", type=int, default=0,
+                        help="FASTFOOT_PERSIST_INTERVAL_MS (0: her kayıt fsync)")
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="ff_bench_")
+    os.environ["FASTFOOT_ADISYON_FILE"] = os.path.join(tmp_dir, "active_adisyonlar.json")
+    os.environ["FASTFOOT_PERSIST_INTERVAL_MS"] = str(args.persist_ms)
+    os.environ["FASTFOOT_EMIT_WINDOW_MS"] = "0"
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.CRITICAL)
+
+    import web_server
+
+    server = web_server.server
+    counters = {"emits": 0, "tickets": 0}
+
+    def fake_emit(*a, **kw):
+        counters["emits"] += 1
+
+    def fake_ticket(masa_adi, siparisler):
+        counters["tickets"] += 1
+
+    web_server.socketio.emit = fake_emit
+    server.events._emit = fake_emit
+    server._send_kitchen_ticket = fake_ticket
+
+    masa = next(iter(server.adisyonlar))
+    lines = [{"urun": f"Ürün {n % 7}", "fiyat": 45.0, "adet": 1} for n in range(args.lines)]
+
+    def run(label, fn):
+        counters.update(emits=0, tickets=0)
+        records_before = server.journal.stats["records"] + len(server.journal._pending)
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            fn()
+            server.adisyonlar[masa].clear()
+        elapsed = (time.perf_counter() - started) * 1000 / args.rounds
+        server.journal.flush()
+        records = server.journal.stats["records"] - records_before
+        print(f"{label:28} {elapsed:9.2f} ms/sipariş | "
+              f"günlük kaydı {records / args.rounds:5.0f} | "
+              f"yayın {counters['emits'] / args.rounds:5.0f} | "
+              f"mutfak fişi {counters['tickets'] / args.rounds:4.0f}")
+
+    print(f"{args.lines} satırlık sipariş, {args.rounds} tekrar, persist={args.persist_ms} ms")
+    run("add_order_item döngüsü", lambda: [
+        server.add_order_item(masa, line["urun"], line["fiyat"], garson="Bench") for line in lines
+    ])
+    run("add_order_items (toplu)", lambda: server.add_order_items(masa, lines, garson="Bench"))
+
+    server.events.close()
+    server.journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Yeniden bağlanma fırtınası: N istemci aynı anda bağlanır, initial_data'nın
+gelme süresi ve boyutu ölçülür.
+
+Sunucu süreç içinde ayrı bir portta başlatılır (adisyon dosyası geçici
+dizine yazılır). Her turda önce "soğuk" bağlantı (istemcide sürüm yok),
+sonra "sıcak" bağlantı (istemci elindeki menu/system sürümlerini auth ile
+gönderir - Wi-Fi kopması sonrası tablet/el terminali durumu) ölçülür.
+
+Kullanım:
+    python scripts/bench_reconnect_storm.py --clients 50 --menu-items 400
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def payload_size(data):
+    size = 0
+    for key, value in data.items():
+        if isinstance(value, (bytes, bytearray)):
+            size += len(value)
+        else:
+            size += len(json.dumps({key: value}, ensure_ascii=False).encode('utf-8'))
+    return size
+
+
+def storm(url, clients, auth):
+    import socketio
+
+    latencies, sizes, errors = [], [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(clients)
+
+    def run():
+        c = socketio.Client(reconnection=False)
+        done = threading.Event()
+        started = [0.0]
+
+        @c.on('initial_data')
+        def on_initial(data):
+            with lock:
+                latencies.append((time.perf_counter() - started[0]) * 1000)
+                sizes.append(payload_size(data))
+            done.set()
+
+        try:
+            barrier.wait()
+            started[0] = time.perf_counter()
+            c.connect(url + "?role=waiter", auth=auth, transports=['polling'], wait_timeout=30)
+            if not done.wait(30):
+                errors.append("timeout")
+        except Exception as e:
+            errors.append(str(e))
+        finally:
+            try:
+                c.disconnect()
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=run) for _ in range(clients)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, sizes, errors, (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="initial_data yeniden bağlanma fırtınası benchmark")
+    parser.add_argument("--clients", type=int, default=50, help="Eşzamanlı istemci sayısı")
+    parser.add_argument("--menu-items", type=int, default=400, help="Menüdeki ürün sayısı")
+    parser.add_argument("--lines", type=int, default=10, help="Her masadaki açık satır sayısı")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix="ff_bench_")
+    os.environ["FASTFOOT_ADISYON_FILE"] = os.path.join(tmp_dir, "active_adisyonlar.json")
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.CRITICAL)
+
+    import web_server
+
+    server = web_server.server
+    server.menu_data = {
+        f"Kategori {c}": [[f"Ürün {c}-{n}", 50.0 + n, 0, 0, 0, 0, f"/static/img/{c}-{n}.jpg"]
+                          for n in range(args.menu_items // 10)]
+        for c in range(10)
+    }
+    if hasattr(server, 'invalidate_section'):
+        server.invalidate_section('menu')
+    for masa in list(server.adisyonlar)[:10]:
+        server.add_order_items(masa, [{"urun": "Çay", "fiyat": 20.0}] * args.lines, garson="Bench")
+    server._send_kitchen_ticket = lambda *a, **kw: None
+
+    threading.Thread(
+        target=lambda: web_server.socketio.run(web_server.app, host="127.0.0.1", port=args.port,
+                                               allow_unsafe_werkzeug=True),
+        daemon=True
+    ).start()
+    time.sleep(1.0)
+    url = f"http://127.0.0.1:{args.port}"
+
+    # Sıcak tur için istemcinin elinde tutacağı sürümler
+    versions = {}
+    if hasattr(server, 'build_initial_data'):
+        data = server.build_initial_data()
+        versions = {k: data[k] for k in ('menu_version', 'system_version')}
+
+    print(f"{args.clients} istemci, menü {args.menu_items} ürün, {len(server.adisyonlar)} masa")
+    for label, auth in (("soğuk (sürüm yok)", None), ("sıcak (sürüm gönderildi)", versions)):
+        latencies, sizes, errors, wall = storm(url, args.clients, auth)
+        print(f"{label:26} p50 {percentile(latencies, 50):7.1f} ms | p95 {percentile(latencies, 95):7.1f} ms | "
+              f"toplam {wall:7.1f} ms | initial_data {sum(sizes) / max(1, len(sizes)) / 1024:6.1f} KB | "
+              f"hata {len(errors)}")
+
+    server.events.close()
+    server.journal.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Satış kaydı karşılaştırması: satır başına INSERT döngüsü vs execute_values vs COPY
+
+db_config.py'deki PostgreSQL'e bağlanır. Her yöntem aynı partiyi
+satislar tablosuna yazar; yazılan satırlar tip='bench' ile işaretlenir ve
+sonunda silinir. Süre, ödeme ekranının beklediği tek parti yazımıdır
+(bağlantı havuzdan alınır, commit dahil).
+
+Kullanım:
+    python scripts/bench_sales_batch.py --lines 1 10 100 1000 --rounds 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Toplu satış kaydı benchmark")
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100, 1000], help="Parti satır sayıları")
+    parser.add_argument("--rounds", type=int, default=20, help="Tekrar sayısı")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from database import db
+    from sales_ledger import SALES_COLUMNS, sale_row
+
+    db.init_database()
+
+    def loop(cursor, rows):
+        # Eski save_sales_batch: satır başına bir gidiş-dönüş
+        for row in rows:
+            cursor.execute(f"""
+                INSERT INTO satislar ({', '.join(SALES_COLUMNS)})
+                VALUES ({', '.join(['%s'] * len(SALES_COLUMNS))})
+                RETURNING id
+            """, row)
+            cursor.fetchone()
+
+    methods = [
+        ("döngü", loop),
+        ("execute_values", db._insert_sales),
+        ("copy", db._copy_sales),
+    ]
+
+    print(f"{'satır':>6} {'yöntem':>15} {'p50 ms':>9} {'p95 ms':>9} {'satır/sn':>10}")
+    try:
+        for lines in args.lines:
+            sales = [{"urun": f"Ürün {n % 7}", "adet": 1, "fiyat": 45.0, "odeme": "Nakit",
+                      "tip": "bench", "masa": "Masa 1", "terminal_id": "bench"} for n in range(lines)]
+            rows = [sale_row(sale) for sale in sales]
+            for label, fn in methods:
+                times = []
+                for _ in range(args.rounds):
+                    started = time.perf_counter()
+                    with db.get_cursor(dict_cursor=False) as cursor:
+                        fn(cursor, rows)
+                    times.append((time.perf_counter() - started) * 1000)
+                times.sort()
+                p50 = statistics.median(times)
+                p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+                print(f"{lines:>6} {label:>15} {p50:>9.2f} {p95:>9.2f} {lines / (p50 / 1000):>10.0f}")
+    finally:
+        with db.get_cursor(dict_cursor=False) as cursor:
+            cursor.execute("DELETE FROM satislar WHERE tip = 'bench'")
+        db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Terminal sunucusu karşılaştırması: bağlantı başına thread vs asyncio ağ geçidi
+
+Sunucu süreç içinde kurulur (Socket.IO yayını ve mutfak fişi sayılarak
+taklit edilir); siparişler gerçek handle_terminal_message ile adisyonlara
+eklenir. Ayrı bir süreçteki asyncio istemcisi yüzlerce terminali aynı anda
+bağlar; her terminal açık bağlantıdan art arda sipariş gönderir ve her
+siparişin onayını bekler.
+
+Kullanım:
+    python scripts/bench_terminal_gateway.py --terminals 100 300 600 --orders 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import logging
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ==================== İSTEMCİ (ayrı süreç) ====================
+
+async def _terminal(port, n, orders, masalar, start, latencies, errors):
+    await start.wait()
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    except OSError:
+        errors.append('connect')
+        return
+    try:
+        for k in range(orders):
+            message = {'id': f"T{n}:{k}", 'masa': masalar[(n + k) % len(masalar)], 'terminal': f"T{n}",
+                       'siparisler': [{'urun': 'Tost', 'fiyat': 80.0}, {'urun': 'Çay', 'fiyat': 20.0}]}
+            sent = time.perf_counter()
+            writer.write((json.dumps(message) + "\n").encode('utf-8'))
+            await writer.drain()
+            ack = await asyncio.wait_for(reader.readline(), 60)
+            if not ack or not json.loads(ack).get('ok'):
+                errors.append('nack')
+                return
+            latencies.append((time.perf_counter() - sent) * 1000)
+    except (OSError, asyncio.TimeoutError, ValueError):
+        errors.append('io')
+    finally:
+        writer.close()
+
+
+async def _clients(port, terminals, orders, masalar):
+    start = asyncio.Event()
+    latencies, errors = [], []
+    tasks = [asyncio.create_task(_terminal(port, n, orders, masalar, start, latencies, errors))
+             for n in range(terminals)]
+    await asyncio.sleep(0.2)
+    started = time.perf_counter()
+    start.set()
+    await asyncio.gather(*tasks)
+    return {'elapsed': time.perf_counter() - started, 'latencies': latencies, 'errors': len(errors)}
+
+
+def client_worker(port, terminals, orders, masalar):
+    result = asyncio.run(_clients(port, terminals, orders, masalar))
+    print(json.dumps(result))
+
+
+# ==================== SUNUCU ====================
+
+def serve_threads(port, handle, recent):
+    """user-016 öncesi yapı: accept döngüsü + bağlantı başına thread"""
+    from framed_protocol import serve_connection
+
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', port))
+    listener.listen(1024)
+
+    def run():
+        while True:
+            try:
+                client, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=lambda c=client: (serve_connection(c, handle, recent), c.close()),
+                             daemon=True).start()
+
+    threading.Thread(target=run, daemon=True).start()
+    return listener.close
+
+
+def serve_gateway(port, handle, recent, workers):
+    from terminal_gateway import TerminalGateway
+
+    gateway = TerminalGateway(max_connections=5000, read_timeout=60, queue_size=1000, workers=workers)
+    gateway.listen('terminal', port, handle, host='127.0.0.1', recent=recent)
+    gateway.start()
+    return gateway.stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Terminal ağ geçidi benchmark")
+    parser.add_argument("--terminals", nargs="+", type=int, default=[100, 300, 600])
+    parser.add_argument("--orders", type=int, default=10, help="Terminal başına sipariş")
+    parser.add_argument("--workers", type=int, default=4, help="Ağ geçidi işçi sayısı")
+    parser.add_argument("--client-worker", nargs=3, type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--masalar", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.client_worker:
+        client_worker(*args.client_worker, json.loads(args.masalar))
+        return
+
+    tmp_dir = tempfile.mkdtemp(prefix="ff_bench_")
+    os.environ["FASTFOOT_ADISYON_FILE"] = os.path.join(tmp_dir, "active_adisyonlar.json")
+    os.environ["FASTFOOT_EMIT_WINDOW_MS"] = "0"
+    sys.path.insert(0, ROOT)
+    logging.disable(logging.CRITICAL)
+
+    import web_server
+    from framed_protocol import RecentIds
+
+    server = web_server.server
+    web_server.socketio.emit = lambda *a, **kw: None
+    server.events._emit = lambda *a, **kw: None
+    server._send_kitchen_ticket = lambda masa_adi, siparisler: None
+    masalar = list(server.adisyonlar)[:20]
+
+    print(f"Terminal başına {args.orders} sipariş (2 satır), açık bağlantı + onay")
+    print(f"{'yapı':10} {'terminal':>8} {'sipariş/sn':>11} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'en çok thread':>14} {'hata':>5}")
+    port = 5700
+    for terminals in args.terminals:
+        for label in ("thread", "asyncio"):
+            port += 1
+            recent = RecentIds(terminals * args.orders)
+            if label == "thread":
+                stop = serve_threads(port, server.handle_terminal_message, recent)
+            else:
+                stop = serve_gateway(port, server.handle_terminal_message, recent, args.workers)
+
+            peak = [threading.active_count()]
+            done = threading.Event()
+
+            def sample():
+                while not done.wait(0.01):
+                    peak[0] = max(peak[0], threading.active_count())
+
+            threading.Thread(target=sample, daemon=True).start()
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--client-worker", str(port),
+                                   str(terminals), str(args.orders), "--masalar", json.dumps(masalar)],
+                                  capture_output=True, text=True)
+            done.set()
+            stop()
+            for masa in masalar:
+                server.adisyonlar[masa].clear()
+
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            latencies = sorted(result['latencies']) or [0.0]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            rate = len(result['latencies']) / result['elapsed'] if result['elapsed'] else 0.0
+            print(f"{label:10} {terminals:8} {rate:11.0f} {statistics.median(latencies):8.1f} {p99:8.1f} "
+                  f"{peak[0]:14} {result['errors']:5}")
+
+    server.events.close()
+    server.journal.close()
+
+
+if __name__ == "__main__":
+    main()
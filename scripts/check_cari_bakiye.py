@@ -0,0 +1,43 @@
+"""
+cari_hesaplar.bakiye tutarlılık kontrolü.
+
+Her carinin tutulan bakiyesini cari_hareketler toplamıyla karşılaştırır.
+Bakiye save_cari_transaction ile aynı işlemde güncellendiği için fark
+beklenmez; cari_hareketler elle düzeltildiyse veya dışarıdan yüklendiyse
+--fix ile hareket toplamına eşitlenir.
+
+Kullanım:
+    python scripts/check_cari_bakiye.py
+    python scripts/check_cari_bakiye.py --fix
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cari bakiye kontrolü")
+    parser.add_argument("--fix", action="store_true", help="Farklı bakiyeleri hareket toplamına eşitle")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from database import db
+
+    db.init_database()
+    diffs = db.check_cari_balances(fix=args.fix)
+    for row in diffs:
+        print(f"  {row['cari_isim']}: bakiye {row['bakiye']} / hareketler {row['hareket_toplami']}")
+    if not diffs:
+        print("✓ Tüm cari bakiyeleri hareketlerle tutarlı")
+    elif args.fix:
+        print(f"✓ {len(diffs)} cari bakiyesi düzeltildi")
+    else:
+        print(f"⚠️ {len(diffs)} cari bakiyesi farklı (düzeltmek için --fix)")
+    db.close_pool()
+    sys.exit(1 if diffs and not args.fix else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+satislar ve cari_hareketler için aylık bölümleme (PostgreSQL 11+).
+
+--migrate mevcut dolu tabloları tek işlemde bölümlü tabloya taşır; işlem
+sürerken tablolar kilitlidir, satış almayan bir saatte çalıştırılmalıdır.
+Yeni kurulumda init_database tabloları zaten bölümlü oluşturur. Komut her
+çalıştırmada gelecek ayların bölümlerini açar; --retention verilirse o
+kadar aydan eski bölümler --archive-dir altına .csv.gz olarak yazılıp
+silinir (--detach-only ile sadece ayrılır).
+
+Kullanım:
+    python scripts/partition_tables.py --migrate
+    python scripts/partition_tables.py --ahead 3 --retention 24 --archive-dir arsiv
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aylık bölümleme ve arşiv")
+    parser.add_argument("--migrate", action="store_true", help="Dolu tabloları bölümlü tabloya taşı")
+    parser.add_argument("--ahead", type=int, default=3, help="Önceden açılacak ay sayısı")
+    parser.add_argument("--retention", type=int, default=0, help="Saklanacak ay sayısı (0 = arşivleme yok)")
+    parser.add_argument("--archive-dir", default=os.path.join(ROOT, "arsiv"), help="Arşiv dosyalarının klasörü")
+    parser.add_argument("--detach-only", action="store_true", help="Eski bölümleri dosyaya yazmadan sadece ayır")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from database import db
+
+    db.init_database()
+    started = time.perf_counter()
+    if args.migrate:
+        for table, rows in db.migrate_to_partitions(ahead=args.ahead).items():
+            print(f"  {table}: {rows} satır taşındı")
+    result = db.maintain_partitions(args.ahead, args.retention, None if args.detach_only else args.archive_dir)
+    for table in db.PARTITIONED_TABLES:
+        if db.is_partitioned(table):
+            months = db.list_partitions(table)
+            print(f"  {table}: {len(months)} aylık bölüm ({months[0][1]:%Y-%m} - {months[-1][1]:%Y-%m})")
+        else:
+            print(f"  {table}: bölümlü değil (--migrate)")
+    print(f"✓ Bölüm bakımı: {len(result['created'])} yeni, {len(result['archived'])} arşiv, "
+          f"{time.perf_counter() - started:.1f} sn")
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
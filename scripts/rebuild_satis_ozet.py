@@ -0,0 +1,39 @@
+"""
+satis_ozet (gün/saat satış özeti) tablosunu satislar'dan yeniden hesaplar.
+
+İlk kurulumda geçmiş satışlar için bir kez, sonra satislar elle
+düzeltildiğinde veya dışarıdan toplu veri yüklendiğinde çalıştırılır.
+Aralık verilmezse tüm özet silinip yeniden yazılır. İşlem sürerken yeni
+satışların özet yazımı bekler; satış kaydı kaybolmaz.
+
+Kullanım:
+    python scripts/rebuild_satis_ozet.py
+    python scripts/rebuild_satis_ozet.py --baslangic 2026-01-01 --bitis 2026-02-01
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="satis_ozet yeniden hesaplama")
+    parser.add_argument("--baslangic", help="İlk gün (YYYY-MM-DD, dahil)")
+    parser.add_argument("--bitis", help="Son gün (YYYY-MM-DD, hariç)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT)
+    from database import db
+
+    db.init_database()
+    started = time.perf_counter()
+    rows = db.rebuild_sales_rollup(args.baslangic, args.bitis)
+    aralik = f"{args.baslangic or 'başlangıç'} - {args.bitis or 'bugün'}"
+    print(f"✓ satis_ozet yeniden hesaplandı ({aralik}): {rows} satır, {time.perf_counter() - started:.1f} sn")
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+# -*- coding: utf-8 -*-
+"""
+Çok Süreçli Mod İçin Ortak Durum Deposu
+FastFootSatış
+
+cluster.py ile N web_server süreci tek port arkasında çalışırken açık
+adisyonlar, ödeme/ad ayırma kilitleri ve public QR oturumları bu depoda
+tutulur. Depo, PostgreSQL tabloları yerine kurulum gerektirmeyen yerel bir
+SQLite dosyasıdır (WAL modu); aynı şema PostgreSQL'e birebir taşınabilir.
+
+- adisyon_ops: adisyon_journal kayıt formatında değişiklik günlüğü.
+  seq sırası tüm süreçlerde ortak sıradır.
+- shared_kv: snapshot, sayaçlar, ortak set ve sözlükler (JSON değer).
+
+SharedLock tüm masaların ortak kilididir. Süreç içinde yeniden girilebilir
+bir kilit, süreçler arasında ise SQLite yazma kilidi (BEGIN IMMEDIATE) olarak
+çalışır. Kilit alınınca diğer süreçlerin yazdığı kayıtlar belleğe uygulanır
+(AdisyonStore.apply_record), bırakılınca kilit altında yazılan kayıtlar tek
+commit ile kalıcı olur. Böylece "oku - kontrol et - değiştir" adımları
+(ödeme sahiplenme, iptal, taşıma) tüm süreçlerde sıralı çalışır.
+
+Sadece okuyan yollar (initial_data, masa_state, ortak sözlük listeleme)
+SharedLock.reading() kullanır: ertelenmiş (BEGIN) bir okuma işlemiyle
+bekleyen kayıtlar uygulanır, yazma kilidi alınmaz ve fsync yapılmaz. Okuma
+bloğu içinde alınan kilit süreç içinde yeniden girilir, yazma işlemi açmaz.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+
+from adisyon_journal import AdisyonJournal, apply_record
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NS = "adisyon"
+SNAPSHOT_KEY = "snapshot"
+COUNTER_NS = "counter"
+CLAIM_SETS = ("payments", "reserved")  # Değeri sahibi sürecin pid'i olan kümeler
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS adisyon_ops (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    record TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS shared_kv (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+"""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+class SharedLock:
+    """Süreç içinde RLock, süreçler arasında SQLite yazma kilidi"""
+
+    def __init__(self, shared):
+        self._shared = shared
+        self.local = threading.RLock()  # Bağlantıya erişen tek thread
+        self._depth = 0
+        self._writing = False
+
+    def acquire(self, blocking=True, timeout=-1):
+        """Yazma kilidi (değiştiren yollar). İç içe alımlar dıştaki işlemi kullanır."""
+        if not self.local.acquire(blocking, timeout):
+            return False
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                self._shared._begin()
+            except Exception:
+                self._depth = 0
+                self.local.release()
+                raise
+            self._writing = True
+        return True
+
+    def release(self):
+        try:
+            if self._depth == 1:
+                if self._writing:
+                    # Bellek kilit altında değişti: istisna olsa da kayıtlar commit edilir
+                    self._writing = False
+                    self._shared._commit()
+                else:
+                    self._shared._end_read()
+        finally:
+            self._depth -= 1
+            self.local.release()
+
+    @contextmanager
+    def reading(self):
+        """
+        Okuma kilidi: süreç içi kilit + diğer süreçlerin kayıtlarını uygula,
+        süreçler arası yazma kilidi alınmaz. Blok içinde değişiklik yapılmamalıdır
+        (iç içe alınan kilit yazma işlemi açmaz).
+        """
+        self.local.acquire()
+        self._depth += 1
+        if self._depth == 1:
+            try:
+                self._shared._begin_read()
+            except Exception:
+                self._depth = 0
+                self.local.release()
+                raise
+        try:
+            yield self
+        finally:
+            self.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class SharedStore:
+    def __init__(self, path, busy_timeout=30.0):
+        """
+        :param path: SQLite dosyası (süreçler arasında ortak)
+        :param busy_timeout: Yazma kilidi için en fazla bekleme (saniye)
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        # Kilit beklemesi SQLite içinde değil _begin'de time.sleep ile yapılır:
+        # eventlet/gevent modunda bekleyen süreç diğer bağlantıları bloklamaz
+        self._conn = sqlite3.connect(path, timeout=0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.executescript(SCHEMA)
+        self.lock = SharedLock(self)
+        self.owner = os.getpid()    # Ödeme/ad ayırmalarının sahibi (çöken süreç temizliği)
+        self.store = None           # Kayıtların uygulanacağı AdisyonStore
+        self.on_record = None       # Diğer süreçlerin her kaydı için ek işleyici (mutfak kuyruğu)
+        self.applied_seq = None     # None: adisyonlar henüz yüklenmedi, uygulama yapılmaz
+        self.stats = {'transactions': 0, 'read_transactions': 0, 'applied_records': 0, 'appended_records': 0,
+                      'lock_waits': 0, 'lock_wait_ms': 0.0, 'max_lock_wait_ms': 0.0}
+
+    # ==================== KİLİT / UYGULAMA ====================
+
+    def _begin(self):
+        started = time.perf_counter()
+        delay = 0.001
+        while True:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                break
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or time.perf_counter() - started > self.busy_timeout:
+                    raise
+                time.sleep(delay)
+                delay = min(delay * 2, 0.02)
+        if delay > 0.001:
+            waited_ms = (time.perf_counter() - started) * 1000
+            self.stats['lock_waits'] += 1
+            self.stats['lock_wait_ms'] += waited_ms
+            self.stats['max_lock_wait_ms'] = max(self.stats['max_lock_wait_ms'], round(waited_ms, 3))
+        self.stats['transactions'] += 1
+        try:
+            self._apply_pending()
+        except Exception:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def _commit(self):
+        self._conn.execute("COMMIT")
+
+    def _begin_read(self):
+        # WAL'da ertelenmiş işlem yazanları beklemez, yazanlar da onu beklemez
+        self._conn.execute("BEGIN")
+        self.stats['read_transactions'] += 1
+        try:
+            self._apply_pending()
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.execute("ROLLBACK")
+            raise
+
+    def _end_read(self):
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+
+    def _apply_pending(self):
+        """Diğer süreçlerin kayıtlarını belleğe uygula (kilit altında)"""
+        if self.store is None or self.applied_seq is None:
+            return
+        rows = self._conn.execute("SELECT seq, record FROM adisyon_ops WHERE seq > ? ORDER BY seq",
+                                  (self.applied_seq,)).fetchall()
+        for seq, record in rows:
+            record = json.loads(record)
+            self.store.apply_record(record)
+            self.applied_seq = seq
+            if self.on_record is not None:
+                self.on_record(record)
+        self.stats['applied_records'] += len(rows)
+
+    def attach(self, store):
+        """Kayıtların uygulanacağı AdisyonStore'u bağla"""
+        self.store = store
+
+    def last_seq(self):
+        with self.lock.local:
+            row = self._conn.execute("SELECT MAX(seq) FROM adisyon_ops").fetchone()
+        return row[0] or 0
+
+    def catch_up(self):
+        """Yeni kayıt varsa okuma kilidiyle uygula (arka plan eşitlemesi)"""
+        if self.applied_seq is None or self.last_seq() <= self.applied_seq:
+            return False
+        with self.lock.reading():
+            pass
+        return True
+
+    def append_op(self, record):
+        """Kaydı günlüğe ekle, seq döndür (kilidi tutan süreç kendi kaydını tekrar uygulamaz)"""
+        with self.lock:
+            cur = self._conn.execute("INSERT INTO adisyon_ops (record) VALUES (?)", (_dumps(record),))
+            if self.applied_seq is not None:
+                self.applied_seq = cur.lastrowid
+            self.stats['appended_records'] += 1
+            return cur.lastrowid
+
+    # ==================== SNAPSHOT ====================
+
+    def read_state(self):
+        """(snapshot {masa: [kalemler]}, snapshot seq, [snapshot sonrası kayıtlar]) - tutarlı okuma"""
+        with self.lock.reading():
+            snapshot = self.kv_get(SNAPSHOT_NS, SNAPSHOT_KEY) or {}
+            seq = int(snapshot.get("seq", 0))
+            records = []
+            for op_seq, record in self._conn.execute(
+                    "SELECT seq, record FROM adisyon_ops WHERE seq > ? ORDER BY seq", (seq,)):
+                record = json.loads(record)
+                record["seq"] = op_seq
+                records.append(record)
+            return snapshot.get("state", {}), seq, records
+
+    def has_snapshot(self):
+        return self.kv_get(SNAPSHOT_NS, SNAPSHOT_KEY) is not None
+
+    def compact(self):
+        """Kayıtları snapshot'a katla (sadece süreçler çalışmıyorken - supervisor)"""
+        with self.lock:
+            state, seq, records = self.read_state()
+            for record in records:
+                apply_record(state, record)
+                seq = record["seq"]
+            self.kv_set(SNAPSHOT_NS, SNAPSHOT_KEY, {"seq": seq, "state": state})
+            self._conn.execute("DELETE FROM adisyon_ops WHERE seq <= ?", (seq,))
+        return state
+
+    def import_state(self, state):
+        """Dosyadaki adisyonları depoya al (ilk açılış)"""
+        with self.lock:
+            self._conn.execute("DELETE FROM adisyon_ops")
+            self.kv_set(SNAPSHOT_NS, SNAPSHOT_KEY, {"seq": self.last_seq(), "state": state})
+
+    # ==================== ANAHTAR / DEĞER ====================
+
+    def kv_get(self, ns, key, default=None):
+        with self.lock.local:
+            row = self._conn.execute("SELECT value FROM shared_kv WHERE ns = ? AND key = ?",
+                                     (ns, key)).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def kv_set(self, ns, key, value):
+        with self.lock:
+            self._conn.execute("INSERT OR REPLACE INTO shared_kv (ns, key, value) VALUES (?, ?, ?)",
+                               (ns, key, _dumps(value)))
+
+    def kv_delete(self, ns, key):
+        with self.lock:
+            return self._conn.execute("DELETE FROM shared_kv WHERE ns = ? AND key = ?", (ns, key)).rowcount > 0
+
+    def kv_items(self, ns):
+        with self.lock.reading():
+            return [(key, json.loads(value)) for key, value in
+                    self._conn.execute("SELECT key, value FROM shared_kv WHERE ns = ? ORDER BY key", (ns,))]
+
+    def kv_clear(self, ns):
+        with self.lock:
+            self._conn.execute("DELETE FROM shared_kv WHERE ns = ?", (ns,))
+
+    def bump(self, name):
+        """Ortak sayacı bir artır, yeni değeri döndür (menü/ayar sürümleri)"""
+        with self.lock:
+            value = self.kv_get(COUNTER_NS, name, 0) + 1
+            self.kv_set(COUNTER_NS, name, value)
+            return value
+
+    def counter(self, name):
+        return self.kv_get(COUNTER_NS, name, 0)
+
+    def map(self, name):
+        return SharedMap(self, f"map:{name}")
+
+    def set(self, name):
+        return SharedSet(self, f"set:{name}")
+
+    def reset_claims(self):
+        """Çöken süreçten kalan ödeme/ad ayırmalarını temizle (supervisor açılışı)"""
+        with self.lock:
+            for name in CLAIM_SETS:
+                self.kv_clear(f"set:{name}")
+
+    def release_claims(self, owner):
+        """Kapanan sürecin ödeme/ad ayırmalarını bırak (supervisor, yeniden başlatmada)"""
+        with self.lock:
+            return self._conn.execute(
+                f"DELETE FROM shared_kv WHERE ns IN ({', '.join('?' * len(CLAIM_SETS))}) AND value = ?",
+                [f"set:{name}" for name in CLAIM_SETS] + [_dumps(owner)]).rowcount
+
+    def close(self):
+        self._conn.close()
+
+
+class SharedMap(MutableMapping):
+    """JSON değerli ortak sözlük. Değerler kopya döner: iç içe değişiklik
+    için değer okunup değiştirilip tekrar atanmalıdır."""
+
+    def __init__(self, shared, ns):
+        self._shared = shared
+        self._ns = ns
+
+    def __getitem__(self, key):
+        value = self._shared.kv_get(self._ns, key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return self._shared.kv_get(self._ns, key, default)
+
+    def __setitem__(self, key, value):
+        self._shared.kv_set(self._ns, key, value)
+
+    def __delitem__(self, key):
+        if not self._shared.kv_delete(self._ns, key):
+            raise KeyError(key)
+
+    def pop(self, key, *default):
+        with self._shared.lock:
+            value = self._shared.kv_get(self._ns, key, _MISSING)
+            if value is _MISSING:
+                if default:
+                    return default[0]
+                raise KeyError(key)
+            self._shared.kv_delete(self._ns, key)
+            return value
+
+    def items(self):
+        return self._shared.kv_items(self._ns)
+
+    def values(self):
+        return [value for _, value in self.items()]
+
+    def __iter__(self):
+        return iter([key for key, _ in self.items()])
+
+    def __len__(self):
+        return len(self.items())
+
+
+class SharedSet:
+    """Ortak string kümesi (ödeme sahiplenme, open_new ad ayırma). Değer,
+    elemanı ekleyen sürecin pid'idir; çöken sürecin elemanları bırakılabilir."""
+
+    def __init__(self, shared, ns):
+        self._shared = shared
+        self._ns = ns
+
+    def __contains__(self, key):
+        return self._shared.kv_get(self._ns, key) is not None
+
+    def add(self, key):
+        self._shared.kv_set(self._ns, key, self._shared.owner)
+
+    def discard(self, key):
+        self._shared.kv_delete(self._ns, key)
+
+    def __iter__(self):
+        return iter([key for key, _ in self._shared.kv_items(self._ns)])
+
+    def __len__(self):
+        return len(self._shared.kv_items(self._ns))
+
+
+_MISSING = object()
+
+
+class SharedJournal(AdisyonJournal):
+    """
+    Ortak depoya yazan adisyon günlüğü. Kayıtlar SharedLock altında eklenir
+    ve kilit bırakılınca commit edilir; ayrı bir persister/flush yoktur.
+    Snapshot'a katlama süreçler çalışmıyorken supervisor tarafından yapılır.
+    """
+
+    def __init__(self, shared):
+        super().__init__(shared.path)
+        self.shared = shared
+
+    def start(self):
+        pass
+
+    def append(self, op, tables=(), **fields):
+        record = {"op": op}
+        record.update(fields)
+        self.seq = self.shared.append_op(record)
+        self.stats['records'] += 1
+        self.entries_since_snapshot += 1
+
+    def flush(self):
+        return 0
+
+    def compact(self, adisyonlar):
+        return True
+
+    def close(self):
+        pass
+
+    def load(self):
+        with self.shared.lock:
+            state, seq, records = self.shared.read_state()
+            self._loaded = (state, seq, records)
+            state = super().load()
+            # Bundan sonraki kayıtlar canlı olarak uygulanır
+            self.shared.applied_seq = self.seq
+        self.entries_since_snapshot = 0
+        return state
+
+    def read_snapshot(self):
+        state, seq, _ = self._loaded
+        return state, seq
+
+    def read_records(self):
+        return iter(self._loaded[2])
+
+
+def export_to_file(shared, snapshot_path):
+    """Ortak depodaki son durumu active_adisyonlar.json'a yaz (tek süreçli moda dönüş)"""
+    state = shared.compact()
+    journal = AdisyonJournal(snapshot_path)
+    journal.load()
+    journal.compact(state)
+    journal.close()
+    return state
+
+
+def import_from_file(shared, snapshot_path):
+    """active_adisyonlar.json (+ günlük) içeriğini ortak depoya al"""
+    state = AdisyonJournal(snapshot_path).load()
+    shared.import_state(state)
+    logger.info(f"✓ Ortak depoya {sum(1 for items in state.values() if items)} açık adisyon alındı")
+    return state
+
+
+def remove_store_files(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
@@ -16,6 +16,8 @@ except Exception as e:
     USE_DATABASE = False
     print(f"⚠ Veri tabanı bağlantısı yapılamadı, Excel modu kullanılıyor: {e}")
 
+from sales_ledger import save_sales
+
 # --- PDF VE TÜRKÇE FONT DESTEĞİ ---
 try:
     from reportlab.lib.pagesizes import letter
@@ -637,23 +639,8 @@ class RestaurantApp:
             self.adisyonlar[self.current_masa] = []; self.update_order_display(); self.update_masa_status()
 
     def save_sale_to_excel(self, data):
-        """Satış kaydetme - Otomatik olarak DB veya Excel kullanır"""
-        if USE_DATABASE:
-            try:
-                db.save_sales_batch(data)
-                return True
-            except Exception as e:
-                print(f"DB Hatası: {e}, Excel'e geçiliyor...")
-                # Hata varsa Excel'e fallback
-        
-        # Excel modu
-        try:
-            df = pd.DataFrame(data)
-            old = pd.read_excel(SATIS_FILE) if os.path.exists(SATIS_FILE) else pd.DataFrame()
-            pd.concat([old, df]).to_excel(SATIS_FILE, index=False)
-            return True
-        except:
-            return False
+        """Satış kaydetme - DB'ye tek toplu yazım, yoksa / hata olursa Excel (sales_ledger)"""
+        return save_sales(data, db if USE_DATABASE else None, SATIS_FILE) is not None
 
     def manual_print_fis(self):
         order = [i for i in self.adisyonlar.get(self.current_masa, []) if i.get('tip') != 'tip']
@@ -16,6 +16,7 @@ try:
 except Exception as e:
     USE_DATABASE = False
     print(f"⚠ Veri tabanı bağlantısı yapılamadı, Excel modu kullanılıyor: {e}")
+from sales_ledger import save_sales
 # --- PDF VE TÜRKÇE FONT DESTEĞİ ---
 try:
     from reportlab.lib.pagesizes import letter
@@ -952,10 +953,8 @@ class RestaurantApp:
             self.update_masa_status()    
         
     def save_sale_to_excel(self, data):
-        try:
-            df = pd.DataFrame(data); old = pd.read_excel(SATIS_FILE) if os.path.exists(SATIS_FILE) else pd.DataFrame()
-            pd.concat([old, df]).to_excel(SATIS_FILE, index=False); return True
-        except: return False
+        # Raporlar (dashboard, PDF) satislar.xlsx'ten okunduğu için defter Excel'dir
+        return save_sales(data, excel_path=SATIS_FILE) is not None
     def manual_print_fis(self):
         order = [i for i in self.adisyonlar.get(self.current_masa, []) if i.get('tip') != 'tip']
         if not order: return
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Terminal Ağ Geçidi (asyncio)
+FastFootSatış
+
+El terminali (5555, framed_protocol) ve TCP Caller ID bağlantıları tek bir
+asyncio olay döngüsünde karşılanır; bağlantı başına thread açılmaz.
+
+- Her okuma read_timeout ile sınırlıdır; bu süre boyunca veri göndermeyen
+  bağlantı kapatılır.
+- Aynı anda en fazla max_connections bağlantı açık kalır, fazlası hemen
+  kapatılır (sayaçlara yazılır).
+- Gelen mesajlar sınırlı bir kuyrukla sipariş motoruna (işçi thread'leri)
+  aktarılır. Kuyruk doluysa bağlantı bekler; read_timeout içinde yer
+  açılmazsa id'li mesaja "meşgul" onayı döner, terminal tekrar gönderir.
+  Aynı bağlantının mesajları sırayla işlenir ve onaylanır.
+
+Olay döngüsü kendi thread'inde (eventlet/gevent modunda green thread'de)
+çalışır; işçiler spawn ile (socketio.start_background_task) başlatılır,
+böylece sipariş motoru sunucunun eşzamanlılık modunda çalışır.
+"""
+
+import time
+import queue
+import asyncio
+import threading
+import logging
+from functools import partial
+
+from framed_protocol import FrameReader, encode, process_message
+
+logger = logging.getLogger(__name__)
+
+BUSY_ERROR = "Sunucu meşgul, tekrar gönderin"
+
+
+class GatewayBusy(Exception):
+    """Sipariş kuyruğunda read_timeout içinde yer açılmadı"""
+
+
+def _default_spawn(fn):
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    return thread
+
+
+class TerminalGateway:
+    def __init__(self, max_connections=500, read_timeout=300.0, queue_size=1000, workers=4,
+                 spawn=None):
+        """
+        :param max_connections: Aynı anda açık kalabilecek toplam bağlantı
+        :param read_timeout: Bağlantı başına okuma zaman aşımı (saniye)
+        :param queue_size: Sipariş motoruna giden kuyruğun kapasitesi
+        :param workers: Kuyruğu işleyen işçi sayısı
+        :param spawn: Thread/green thread başlatıcı (varsayılan threading.Thread)
+        """
+        self.max_connections = max(1, int(max_connections))
+        self.read_timeout = read_timeout
+        self.workers = max(1, int(workers))
+        self._spawn = spawn or _default_spawn
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._listeners = {}  # name -> ayarlar
+        self._servers = {}
+        self._loop = None
+        self._ready = threading.Event()
+        self._active = 0
+        self.stats = {
+            'max_active_connections': 0,
+            'rejected_connections': 0,
+            'max_queue_depth': 0,
+            'busy': 0,
+            'listeners': {}
+        }
+
+    # ==================== KURULUM ====================
+
+    def listen(self, name, port, handler, kind='framed', host='0.0.0.0', recent=None, read_size=65536):
+        """
+        Dinleyici ekle (start öncesi veya sonrası).
+
+        :param kind: 'framed' (framed_protocol, onaylı) veya 'oneshot' (ilk veri
+                     parçası metin olarak handler'a verilir, bağlantı kapanır)
+        :param handler: Sipariş motorunda (işçi thread'inde) çağrılır
+        :param recent: framed için tekrar gönderilen id'lerin tutulduğu RecentIds
+        """
+        self._listeners[name] = dict(port=port, handler=handler, kind=kind, host=host,
+                                     recent=recent, read_size=read_size)
+        self.stats['listeners'][name] = {
+            'port': port, 'kind': kind, 'listening': False, 'connections': 0, 'active': 0,
+            'messages': 0, 'invalid': 0, 'timeouts': 0, 'errors': 0
+        }
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._open(name), self._loop)
+
+    def start(self):
+        """Olay döngüsünü ve sipariş motoru işçilerini başlat"""
+        if self._loop is not None or self._ready.is_set():
+            return
+        for _ in range(self.workers):
+            self._spawn(self._worker)
+        self._spawn(self._run_loop)
+        self._ready.wait(timeout=5)
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        for name in list(self._listeners):
+            loop.run_until_complete(self._open(name))
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    async def _open(self, name):
+        opts = self._listeners[name]
+        try:
+            server = await asyncio.start_server(partial(self._client, name), opts['host'], opts['port'],
+                                                reuse_address=True)
+        except OSError as e:
+            logger.error(f"❌ {name} portu ({opts['port']}) açılamadı: {e}")
+            return
+        self._servers[name] = server
+        self.stats['listeners'][name]['listening'] = True
+        logger.info(f"📡 Ağ geçidi dinliyor: {name} port {opts['port']}")
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['listeners'] = {name: dict(s) for name, s in self.stats['listeners'].items()}
+        stats['active_connections'] = self._active
+        stats['max_connections'] = self.max_connections
+        stats['queue_depth'] = self._queue.qsize()
+        stats['queue_size'] = self._queue.maxsize
+        stats['workers'] = self.workers
+        return stats
+
+    # ==================== BAĞLANTILAR ====================
+
+    async def _client(self, name, reader, writer):
+        stats = self.stats['listeners'][name]
+        if self._active >= self.max_connections:
+            self.stats['rejected_connections'] += 1
+            writer.close()
+            return
+        self._active += 1
+        stats['active'] += 1
+        stats['connections'] += 1
+        self.stats['max_active_connections'] = max(self.stats['max_active_connections'], self._active)
+        opts = self._listeners[name]
+        try:
+            if opts['kind'] == 'oneshot':
+                await self._serve_oneshot(name, opts, reader)
+            else:
+                await self._serve_framed(name, opts, reader, writer)
+        except asyncio.TimeoutError:
+            stats['timeouts'] += 1
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            stats['errors'] += 1
+            logger.warning(f"⚠ {name} bağlantısı kapatıldı: {e}")
+        finally:
+            self._active -= 1
+            stats['active'] -= 1
+            writer.close()
+
+    async def _serve_framed(self, name, opts, reader, writer):
+        frames = FrameReader()
+        stats = self.stats['listeners'][name]
+        while True:
+            data = await asyncio.wait_for(reader.read(opts['read_size']), self.read_timeout)
+            invalid = frames.invalid
+            messages = frames.feed(data) if data else frames.finish()
+            stats['invalid'] += frames.invalid - invalid
+            for message in messages:
+                stats['messages'] += 1
+                try:
+                    ack = await self._submit(process_message, message, opts['handler'], opts['recent'])
+                except GatewayBusy:
+                    self.stats['busy'] += 1
+                    msg_id = message.get('id') if isinstance(message, dict) else None
+                    if msg_id is None:
+                        raise
+                    ack = {'ack': msg_id, 'ok': False, 'error': BUSY_ERROR, 'busy': True}
+                if ack is not None:
+                    writer.write(encode(ack))
+                    await writer.drain()
+            if not data:
+                return
+
+    async def _serve_oneshot(self, name, opts, reader):
+        data = await asyncio.wait_for(reader.read(opts['read_size']), self.read_timeout)
+        text = data.decode('utf-8', errors='ignore').strip()
+        if text:
+            self.stats['listeners'][name]['messages'] += 1
+            await self._submit(opts['handler'], text)
+
+    async def _submit(self, fn, *args):
+        """İşi sipariş motoru kuyruğuna koy, sonucu bekle (kuyruk doluysa beklenir)"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        deadline = time.monotonic() + self.read_timeout
+        while True:
+            try:
+                self._queue.put_nowait((fn, args, future, loop))
+                break
+            except queue.Full:
+                if time.monotonic() >= deadline:
+                    raise GatewayBusy(BUSY_ERROR)
+                await asyncio.sleep(0.005)
+        self.stats['max_queue_depth'] = max(self.stats['max_queue_depth'], self._queue.qsize())
+        return await future
+
+    # ==================== SİPARİŞ MOTORU ====================
+
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            fn, args, future, loop = job
+            try:
+                result = fn(*args)
+                loop.call_soon_threadsafe(_resolve, future, result, None)
+            except Exception as e:
+                logger.error(f"Ağ geçidi işleme hatası: {e}")
+                loop.call_soon_threadsafe(_resolve, future, None, e)
+
+    def stop(self):
+        """Dinleyicileri kapat, döngüyü ve işçileri durdur"""
+        loop = self._loop
+        if loop is not None:
+            async def shutdown():
+                for server in self._servers.values():
+                    server.close()
+                for task in asyncio.all_tasks():
+                    if task is not asyncio.current_task():
+                        task.cancel()
+                loop.stop()
+            asyncio.run_coroutine_threadsafe(shutdown(), loop)
+            self._loop = None
+        for _ in range(self.workers):
+            self._queue.put(None)
+        self._ready.clear()
+
+
+def _resolve(future, result, error):
+    if future.done():  # Bağlantı bu arada kapandı
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
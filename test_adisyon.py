@@ -0,0 +1,388 @@
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from adisyon import Adisyon, AdisyonStore, OrderItem
+from adisyon_journal import AdisyonJournal
+
+
+def _journal(tmp_dir, **kwargs):
+    return AdisyonJournal(os.path.join(tmp_dir, "active_adisyonlar.json"), **kwargs)
+
+
+@contextmanager
+def _web_server(tmp_dir):
+    """
+    web_server modülü, veri tabanısız ve tmp_dir'deki adisyon günlüğüyle.
+    Sunucu nesnesinin değiştirilen alanları çıkışta geri alınır.
+    """
+    if "web_server" not in sys.modules:
+        # İlk import depodaki active_adisyonlar.json'a dokunmasın
+        os.environ.setdefault("FASTFOOT_ADISYON_FILE",
+                              os.path.join(tempfile.mkdtemp(prefix="ff_web_"), "active_adisyonlar.json"))
+    import web_server as w
+
+    server = w.server
+    saved = (w.USE_DATABASE, w._finalize_payment, w.SETTINGS_FILE, dict(vars(server)), dict(vars(server.lifecycle)))
+    w.USE_DATABASE = False
+    w.SETTINGS_FILE = os.path.join(tmp_dir, "config.txt")
+    # Sunucudaki gibi arka plan yazıcısıyla (sıkıştırma tablo kilidi dışında yapılır)
+    server.journal = _journal(tmp_dir, snapshot_provider=server.serialize_adisyonlar, flush_interval=0.01)
+    server.journal.start()
+    server.refresh_adisyonlar()
+    try:
+        yield w
+    finally:
+        server.journal.close()
+        w.USE_DATABASE, w._finalize_payment, w.SETTINGS_FILE, attrs, lifecycle_attrs = saved
+        vars(server).clear()
+        vars(server).update(attrs)
+        vars(server.lifecycle).clear()
+        vars(server.lifecycle).update(lifecycle_attrs)
+
+
+def test_journal_replay_after_crash():
+    """Snapshot alınmadan kapanan süreçteki kayıtlar açılışta geri gelmeli"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        j = _journal(tmp_dir)
+        j.log_add("Masa 1", {"uid": "a1", "urun": "Çay", "adet": 1, "fiyat": 20.0})
+        j.log_add("Masa 1", {"uid": "a2", "urun": "Tost", "adet": 1, "fiyat": 80.0})
+        j.log_add("Masa 2", {"uid": "b1", "urun": "Kola", "adet": 1, "fiyat": 50.0})
+        j.log_status("Masa 1", ["a2"], "hazir")
+        j.log_remove("Masa 1", ["a1"])
+        j.log_move("Masa 2", "Masa 3", ["b1"])
+        j.close()  # compact çağrılmadan "çökme"
+
+        state = _journal(tmp_dir).load()
+        assert [i["uid"] for i in state["Masa 1"]] == ["a2"]
+        assert state["Masa 1"][0]["durum"] == "hazir"
+        assert state["Masa 2"] == []
+        assert [i["uid"] for i in state["Masa 3"]] == ["b1"]
+        print("✅ Günlük oynatma doğru")
+
+
+def test_journal_bulk_add_is_one_record():
+    """Toplu sipariş tek kayıt olarak yazılmalı ve tekrar oynatılınca çoğalmamalı"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        j = _journal(tmp_dir)
+        items = [{"uid": f"t{n}", "urun": "Pide", "adet": 1, "fiyat": 120.0} for n in range(50)]
+        j.log_add_many("Paket 1", items)
+        j.log_add_many("Paket 1", items[:5])  # Aynı uid'ler ikinci kez eklenmez
+        j.close()
+        assert j.stats['records'] == 2
+
+        state = _journal(tmp_dir).load()
+        assert [i["uid"] for i in state["Paket 1"]] == [f"t{n}" for n in range(50)]
+        print("✅ Toplu ekleme tek kayıt")
+
+
+def test_journal_compaction_skips_old_records():
+    """Snapshot sonrası eski kayıtlar ikinci kez uygulanmamalı"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        state = {"Masa 1": []}
+        j = _journal(tmp_dir, compact_every=3, snapshot_provider=lambda: state)
+        for n in range(7):
+            item = {"uid": f"u{n}", "urun": "Su", "adet": 1, "fiyat": 10.0}
+            state["Masa 1"].append(item)
+            j.log_add("Masa 1", item)
+        state["Masa 1"] = []
+        j.log_clear("Masa 1")
+        j.close()
+
+        j2 = _journal(tmp_dir)
+        assert j2.load() == {"Masa 1": []}
+        assert j2.seq == 8
+        print("✅ Snapshot + günlük birleşimi doğru")
+
+
+def test_persister_coalesces_burst_into_one_write():
+    """10 adetlik online sipariş tek flush ile yazılmalı"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        j = _journal(tmp_dir, flush_interval=60)  # Otomatik flush beklenmez
+        j.start()
+        for n in range(10):
+            j.log_add("Online - Test", {"uid": f"o{n}", "urun": "Lahmacun", "adet": 1, "fiyat": 90.0})
+        assert j.stats['flushes'] == 0
+        j.flush()  # Ödeme/kapanış zorunlu flush'ı
+        stats = j.get_stats()
+        assert stats['flushes'] == 1
+        assert stats['last_batch_records'] == 10
+        assert stats['last_batch_tables'] == 1
+        j.close()
+
+        assert len(_journal(tmp_dir).load()["Online - Test"]) == 10
+        print(f"✅ 10 kayıt tek yazımda: {stats['last_flush_ms']} ms")
+
+
+def test_adisyon_running_totals():
+    """Toplamlar ve durum sayıları her değişiklikte güncel kalmalı"""
+    adisyon = Adisyon.from_list([
+        {"uid": "a1", "urun": "Çay", "adet": 2, "fiyat": 20.0, "durum": "mutfakta"},
+        {"uid": "a2", "urun": "Tatlı", "adet": 1, "fiyat": 95.5, "tip": "ikram", "durum": "mutfakta"},
+    ])
+    kola = adisyon.append(OrderItem(uid="a3", urun="Kola", fiyat=50.0, durum="mutfakta"))
+    assert adisyon.total == 185.5
+    assert adisyon.total_ikramsiz == 90.0
+    assert adisyon.status_counts["mutfakta"] == 3
+
+    adisyon.set_status(kola, "hazir")
+    assert adisyon.status_counts == {"mutfakta": 2, "hazir": 1}
+    adisyon.pop(0)
+    assert adisyon.total == 145.5
+    assert adisyon.total_ikramsiz == 50.0
+
+    # JSON formatı eskisiyle aynı anahtarları kullanır
+    assert adisyon.to_list()[1] == {"uid": "a3", "urun": "Kola", "adet": 1, "fiyat": 50.0,
+                                    "tip": "normal", "durum": "hazir"}
+    assert kola["fiyat"] == 50.0 and kola.get("not", "") == ""
+
+    adisyon.clear()
+    assert adisyon.total == 0 and not adisyon.status_counts
+    print("✅ Adisyon toplamları doğru")
+
+
+def test_remove_keeps_order_without_shifting():
+    """İptal/ödeme satırı sıra no ile çıkarır; kalan satırların sırası ve indeksle erişim korunur"""
+    adisyon = Adisyon.from_list([{"uid": f"a{n}", "urun": "Çay", "fiyat": 20.0} for n in range(6)])
+    adisyon.remove(adisyon.find("a2"))
+    assert [i.uid for i in adisyon.remove_uids(["a4", "zz", "a0"])] == ["a0", "a4"]
+    assert [i.uid for i in adisyon] == ["a1", "a3", "a5"] and adisyon[1].uid == "a3"
+    assert adisyon.pop().uid == "a5" and adisyon.pop(0).uid == "a1"
+    try:
+        adisyon.remove(OrderItem(uid="a3", urun="Çay"))
+        assert False, "başka adisyonun satırı çıkarılmamalı"
+    except ValueError:
+        pass
+    adisyon.append({"uid": "a6", "urun": "Su", "fiyat": 10.0})
+    assert adisyon.to_list()[-1]["uid"] == "a6" and adisyon.total == 30.0
+    print("✅ Satır çıkarma sırayı koruyor")
+
+
+def test_store_uid_index_follows_transfer_and_payment():
+    """uid -> satır ve uid -> masa haritaları taşıma/ödemeden sonra tutarlı kalmalı"""
+    store = AdisyonStore()
+    store["1"] = Adisyon()
+    store["2"] = Adisyon()
+    store["1"].append({"uid": "a1", "urun": "Çay", "fiyat": 20.0})
+    store["1"].append({"uid": "a2", "urun": "Tost", "fiyat": 80.0})
+    assert store.locate("a2") == ("1", store["1"].find("a2"))
+
+    moved = store.move("1", "2")
+    assert [i.uid for i in moved] == ["a1", "a2"]
+    assert store.uid_masa == {"a1": "2", "a2": "2"}
+    assert store["1"].find("a1") is None and store["2"].find("a1") is not None
+    assert store.group_by_masa(["a1", "zz"]) == {"2": ["a1"]}
+
+    store["2"].remove_uids(["a1"])
+    assert store.uid_masa == {"a2": "2"} and store["2"].total == 80.0
+    store["2"].clear()
+    assert store.uid_masa == {} and store.locate("a2") == (None, None)
+
+    store["3"] = Adisyon.from_list([{"uid": "c1", "urun": "Su", "fiyat": 10.0}])
+    assert store.uid_masa == {"c1": "3"}
+    del store["3"]
+    assert store.uid_masa == {}
+    print("✅ uid indeksleri tutarlı")
+
+
+def test_concurrent_add_cancel_transfer_pay_keeps_totals():
+    """
+    Socket.IO ekle/iptal/kaldır/taşı/öde işleyicileri aynı masalarda eşzamanlı:
+    ödenen satır iptal edilmiş ya da ödeme sürerken taşınmış olamaz,
+    eklenen = ödenen + iptal + açık kalan
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir, _web_server(tmp_dir) as w:
+        server = w.server
+        masalar = tuple(server.adisyonlar)[:2]
+        added, cancelled, moves, paid, errors = [], [], [], [], []
+        record_lock = threading.Lock()
+
+        def track_added(masa_adi, items, routed, source=None):
+            with record_lock:
+                added.extend(item.uid for item in items)
+        server.lifecycle.track = track_added
+
+        def mark(uids, stage):
+            if stage == 'cancelled':
+                with record_lock:
+                    cancelled.extend(uids)
+        server.lifecycle.mark = mark
+
+        log_move = server.journal.log_move
+
+        def record_move(source, target, uids):
+            with record_lock:
+                moves.append(set(uids))
+            log_move(source, target, uids)
+        server.journal.log_move = record_move
+
+        finalize = w._finalize_payment
+
+        def slow_finalize(sid, masa_adi, adisyon, items, payments, payment_type):
+            # POS / veri tabanı yazımı sürerken diğer garsonlar masada işlem yapar
+            with record_lock:
+                moves_before = len(moves)
+            time.sleep(0.002)
+            with record_lock:
+                paid.extend(items)
+                moved_meanwhile = set().union(*moves[moves_before:])
+            if moved_meanwhile & {item.uid for item in items}:
+                errors.append(f"{masa_adi}: ödenen satır ödeme sırasında taşındı")
+            finalize(sid, masa_adi, adisyon, items, payments, payment_type)
+        w._finalize_payment = slow_finalize
+
+        def client():
+            return w.socketio.test_client(w.app, query_string="role=waiter")
+
+        def adder(n):
+            c = client()
+            for k in range(100):
+                c.emit('add_item', {'masa': random.choice(masalar), 'urun': 'Su', 'fiyat': 10.0})
+
+        def canceller():
+            c = client()
+            for _ in range(150):
+                masa = random.choice(masalar)
+                items = list(server.adisyonlar[masa])
+                if items:
+                    c.emit('cancel_item', {'masa': masa, 'uid': random.choice(items).uid})
+
+        def remover():
+            c = client()
+            for _ in range(100):
+                masa = random.choice(masalar)
+                c.emit('select_masa', {'masa': masa})
+                items = list(server.adisyonlar[masa])
+                if items:
+                    c.emit('remove_item', {'uid': random.choice(items).uid})
+
+        def mover():
+            c = client()
+            for _ in range(100):
+                source, target = random.sample(masalar, 2)
+                c.emit('transfer_table', {'source_masa': source, 'target_masa': target})
+
+        def payer():
+            c = client()
+            for n in range(100):
+                masa = random.choice(masalar)
+                c.emit('select_masa', {'masa': masa})
+                uids = [item.uid for item in list(server.adisyonlar[masa])[:3]]
+                c.emit('finalize_payment', {'type': 'Nakit', 'item_uids': uids if n % 2 else []})
+
+        def run(target, *args):
+            try:
+                target(*args)
+            except Exception as e:  # pragma: no cover - hata testte raporlanır
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(adder, n)) for n in range(3)]
+        threads += [threading.Thread(target=run, args=(f,)) for f in (canceller, remover, mover, payer, payer)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert not errors, errors[:5]
+        paid_uids = [item.uid for item in paid]
+        open_uids = [item.uid for masa in masalar for item in server.adisyonlar[masa]]
+        assert len(set(paid_uids)) == len(paid_uids), "aynı satır iki kez ödendi"
+        assert not set(paid_uids) & set(cancelled), "iptal edilen satır satışa yazıldı"
+        assert not set(paid_uids) & set(open_uids), "ödenen satır masada açık kaldı"
+        assert sorted(paid_uids + cancelled + open_uids) == sorted(added)
+
+        paid_total = round(sum(item.tutar for item in paid), 2)
+        open_total = sum(server.adisyonlar[masa].total for masa in masalar)
+        assert round(paid_total + open_total + 10.0 * len(cancelled), 2) == 10.0 * len(added)
+        for masa in masalar:
+            adisyon = server.adisyonlar[masa]
+            assert adisyon.total == round(sum(i.tutar for i in adisyon), 2)
+            assert all(server.adisyonlar.uid_masa[i.uid] == masa for i in adisyon)
+        server.journal.close()
+        replayed = _journal(tmp_dir).load()
+        for masa in masalar:
+            assert [i["uid"] for i in replayed.get(masa, [])] == [i.uid for i in server.adisyonlar[masa]]
+        print(f"✅ Eşzamanlı işleyiciler tutarlı (ödenen {paid_total:.2f} TL, {len(cancelled)} iptal)")
+
+
+def test_settings_change_keeps_open_tickets():
+    """Paket sayısı değiştiren ayar kaydı açık adisyonları silmez; yeniden açılışta da yerindedir"""
+    with tempfile.TemporaryDirectory() as tmp_dir, _web_server(tmp_dir) as w:
+        server = w.server
+        masa = next(iter(server.adisyonlar))
+        paket = f"Paket {server.paket_sayisi}"
+        tost = server.add_order_item(masa, "Tost", 80.0)
+        kola = server.add_order_item(paket, "Kola", 50.0)
+
+        response = w.app.test_client().post('/api/settings', json={
+            'mevcut_sifre': server.admin_password,
+            'paket_sayisi': server.paket_sayisi - 2,
+        })
+        assert response.get_json() == {'success': True}
+        # Yapıdan çıkan boş paket silinir, kalemi olan paket ödenene kadar kalır
+        assert f"Paket {server.paket_sayisi + 1}" not in server.adisyonlar
+        assert [i.uid for i in server.adisyonlar[masa]] == [tost.uid]
+        assert [i.uid for i in server.adisyonlar[paket]] == [kola.uid]
+        assert server.adisyonlar.locate(kola.uid)[0] == paket
+        server.journal.close()
+        state = _journal(tmp_dir).load()
+        assert [i["uid"] for i in state[masa]] == [tost.uid]
+        assert [i["uid"] for i in state[paket]] == [kola.uid]
+        print("✅ Ayar kaydı açık adisyonları koruyor")
+
+
+def test_station_rooms_follow_the_line_across_workers():
+    """
+    Satırı başka süreç yönlendirmiş (bu sürecin kuyruğu bilmiyor) olsa da
+    iptal deltası istasyon odasına gider; başka süreçteki iptal/hazır kaydı
+    yönlendiren sürecin kuyruğunu kapatır
+    """
+    from kitchen_engine import KitchenEngine
+
+    with tempfile.TemporaryDirectory() as tmp_dir, _web_server(tmp_dir) as w:
+        server = w.server
+        masa = next(iter(server.adisyonlar))
+        tost, cay = server.add_order_item(masa, "Tost", 80.0), server.add_order_item(masa, "Çay", 20.0)
+        assert tost.istasyon == server.kitchen_engine.station_for("Tost")
+
+        routing_engine = server.kitchen_engine
+        server.kitchen_engine = KitchenEngine(server.load_kitchen_stations())  # "Diğer süreç"
+        sent = []
+        server.events.emit = lambda event, data, to=None, **kwargs: sent.append((event, to))
+        try:
+            client = w.socketio.test_client(w.app, query_string="role=waiter")
+            client.emit('cancel_item', {'masa': masa, 'uid': tost.uid})
+        finally:
+            del server.events.emit
+        rooms = {event: to for event, to in sent}
+        assert w.station_room(tost.istasyon) in rooms['item_removed']
+        assert w.station_room(tost.istasyon) in rooms['kitchen_cancel_order']
+        client.disconnect()
+        server.journal.close()
+        assert [i.get("istasyon") for i in _journal(tmp_dir).load()[masa]] == [cay.istasyon]
+
+        # Yönlendiren süreç diğerinin kayıtlarını uygular
+        server.kitchen_engine = routing_engine
+        discarded = routing_engine.get_stats()['discarded_lines']
+        server.apply_kitchen_record({"op": "remove", "masa": masa, "uids": [tost.uid], "reason": "cancel"})
+        server.apply_kitchen_record({"op": "status", "masa": masa, "uids": [cay.uid], "durum": "hazir"})
+        assert routing_engine.stations_for([tost.uid, cay.uid]) == []
+        assert routing_engine.get_stats()['discarded_lines'] == discarded + 1
+        print("✅ İstasyon odası satırdan; diğer sürecin iptal/hazır kaydı kuyruğu kapatıyor")
+
+
+if __name__ == "__main__":
+    test_journal_replay_after_crash()
+    test_journal_bulk_add_is_one_record()
+    test_journal_compaction_skips_old_records()
+    test_persister_coalesces_burst_into_one_write()
+    test_adisyon_running_totals()
+    test_remove_keeps_order_without_shifting()
+    test_store_uid_index_follows_transfer_and_payment()
+    test_concurrent_add_cancel_transfer_pay_keeps_totals()
+    test_settings_change_keeps_open_tickets()
+    test_station_rooms_follow_the_line_across_workers()
@@ -0,0 +1,85 @@
+"""
+cari_hesaplar.bakiye testi: hareketlerle aynı işlemde güncellenir,
+kontrol aracı farkı bulur ve düzeltir. PostgreSQL yoksa test atlanır.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import pytest
+from psycopg2 import pool
+from psycopg2.extras import RealDictCursor
+
+from customer_cache import CustomerCache
+from db_config import DB_CONFIG
+
+SCHEMA = "ff_cari_test"
+
+
+def test_balance_follows_transactions():
+    """Eşzamanlı hareketlerde bakiye = SUM(tutar); liste ve profil kolonu okur; check/fix farkı giderir"""
+    try:
+        admin = psycopg2.connect(connect_timeout=3, **DB_CONFIG)
+    except Exception as e:
+        pytest.skip(f"PostgreSQL yok: {e}")
+    from database import Database
+
+    admin.autocommit = True
+    cursor = admin.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE cari_hesaplar (
+            id SERIAL PRIMARY KEY, cari_isim TEXT NOT NULL UNIQUE, telefon TEXT, adres TEXT,
+            olusturma_tarihi TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            bakiye DECIMAL(14, 2) NOT NULL DEFAULT 0
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE cari_hareketler (
+            id SERIAL PRIMARY KEY, cari_id INTEGER NOT NULL REFERENCES cari_hesaplar(id) ON DELETE CASCADE,
+            tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP, islem TEXT NOT NULL, tutar DECIMAL(10, 2) NOT NULL
+        )
+    """)
+    cursor.execute("CREATE TABLE satislar (urun TEXT, adet INTEGER, fiyat DECIMAL(10, 2), odeme TEXT, "
+                   "tarih_saat TIMESTAMP, masa TEXT)")
+
+    test_db = object.__new__(Database)
+    test_db.customer_cache = CustomerCache()
+    test_db._pool = pool.ThreadedConnectionPool(1, 8, options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+    try:
+        def hareket(i):
+            test_db.save_cari_transaction(f"Cari {i % 3}", 'borc' if i % 4 else 'odeme', 12.5 if i % 4 else -20)
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(hareket, range(120)))
+        assert test_db.check_cari_balances() == []
+        assert test_db.get_cari_balance("Cari 0") == 30 * 12.5 - 10 * 20
+        assert test_db.get_cari_balance("Yok") == 0.0
+        cursor.execute("SELECT COUNT(*) AS n FROM cari_hesaplar WHERE cari_isim = 'Yok'")
+        assert cursor.fetchone()['n'] == 0
+
+        accounts = {a['cari_isim']: float(a['bakiye']) for a in test_db.get_all_cari_accounts()}
+        assert accounts == {f"Cari {i}": test_db.get_cari_balance(f"Cari {i}") for i in range(3)}
+        test_db.update_cari_details("Cari 1", telefon="0532 111 22 33")
+        assert test_db.get_customer_profile("+905321112233")['bakiye'] == accounts["Cari 1"]
+
+        # Elle düzeltilen hareket: kontrol bulur, --fix eşitler
+        cursor.execute("UPDATE cari_hareketler SET tutar = tutar + 5 WHERE id = 1")
+        diffs = test_db.check_cari_balances()
+        assert len(diffs) == 1
+        assert test_db.check_cari_balances(fix=True) == diffs
+        assert test_db.check_cari_balances() == []
+        assert test_db.get_customer_profile("05321112233")['bakiye'] == test_db.get_cari_balance("Cari 1")
+
+        test_db.delete_cari_account("Cari 2")
+        assert test_db.get_cari_balance("Cari 2") == 0.0 and test_db.check_cari_balances() == []
+    finally:
+        test_db._pool.closeall()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        admin.close()
+    print("✅ Cari bakiyesi hareketlerle tutarlı")
+
+
+if __name__ == "__main__":
+    test_balance_follows_transactions()
@@ -0,0 +1,238 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+import requests
+import socketio
+from engineio import payload
+
+
+from adisyon import AdisyonStore
+from cluster import Cluster, free_port, worker_from_sid
+from shared_store import SharedJournal, SharedStore
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Birleştirme penceresi kapalıyken (her olay ayrı paket) tek long-poll cevabında
+# istemcinin varsayılan 16 paket sınırı aşılabilir
+payload.Payload.max_decode_packets = 512
+
+
+def _start_cluster(tmp_dir, workers=2):
+    port = free_port()
+    env = dict(os.environ, FASTFOOT_ADISYON_FILE=os.path.join(tmp_dir, "active_adisyonlar.json"),
+               FASTFOOT_EMIT_WINDOW_MS="0")
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "cluster.py"), "--workers", str(workers),
+                             "--port", str(port), "--host", "127.0.0.1"],
+                            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    deadline = time.time() + 90
+    for line in proc.stdout:
+        if line.startswith("cluster ready") or time.time() > deadline:
+            break
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def _client(url, events):
+    """Kasa istemcisi; gelen olayları (ad, veri) olarak toplar"""
+    c = socketio.Client(reconnection=False)
+    lock = threading.Lock()
+
+    @c.on('*')
+    def on_any(event, data=None):
+        with lock:
+            events.append((event, data))
+
+    c.connect(url + "?role=cashier", transports=['polling'], wait_timeout=30)
+    return c
+
+
+def _clients_on_each_worker(url, workers):
+    """Her süreçte bir istemci (proxy yeni bağlantıları sırayla dağıtır)"""
+    clients = {}
+    for _ in range(workers * 4):
+        events = []
+        c = _client(url, events)
+        worker = worker_from_sid(c.eio.sid)
+        if worker in clients:
+            c.disconnect()
+        else:
+            clients[worker] = (c, events)
+        if len(clients) == workers:
+            break
+    return clients
+
+
+def _wait_for(condition, timeout=15):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.1)
+    return condition()
+
+
+def _snapshot(events, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        for event, data in list(events):
+            if event == 'initial_data':
+                return data['adisyonlar']
+        time.sleep(0.05)
+    raise AssertionError("initial_data gelmedi")
+
+
+def _worker_states(url, workers):
+    states = {}
+    for worker, (c, events) in _clients_on_each_worker(url, workers).items():
+        states[worker] = _snapshot(events)
+        c.disconnect()
+    return states
+
+
+def _shared_process(path):
+    """Tek süreç gibi davranan ortak depo bağlantısı + adisyonlar + günlük"""
+    shared = SharedStore(path, busy_timeout=0.2)
+    store = AdisyonStore(lock=shared.lock, reserved=shared.set('reserved'))
+    shared.attach(store)
+    journal = SharedJournal(shared)
+    journal.load()
+    return shared, store, journal
+
+
+def test_reads_do_not_take_the_write_lock():
+    """Okuma yolu başka süreç yazma kilidini tutarken beklemez ve yazma işlemi açmaz"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "shared.db")
+        writer, w_store, w_journal = _shared_process(path)
+        reader, r_store, r_journal = _shared_process(path)
+        with w_store.lock:
+            item = w_store.get_or_create("Masa 1").append({"uid": "a1", "urun": "Çay", "fiyat": 20.0})
+            w_journal.log_add("Masa 1", item.to_dict())
+
+        writes = reader.stats['transactions']
+        with writer.lock:  # Diğer süreç yazıyor
+            with r_store.reading():
+                assert [i.uid for i in r_store["Masa 1"]] == ["a1"]
+            with r_store["Masa 1"].reading():
+                assert r_store["Masa 1"].total == 20.0
+            assert list(reader.set('payments')) == []
+            with pytest.raises(Exception, match="locked"):
+                with r_store.lock:
+                    pass
+        assert reader.stats['transactions'] == writes and reader.stats['read_transactions'] >= 2
+
+        # Yazma kilidi bırakılınca okuyan taraf da yazabilir; yazan taraf okumayla günceller
+        with r_store.lock:
+            r_store["Masa 1"].remove_uids(["a1"])
+            r_journal.log_remove("Masa 1", ["a1"])
+        with w_store.reading():
+            assert not w_store["Masa 1"]
+        for shared in (writer, reader):
+            shared.close()
+    print("✅ Okumalar ortak yazma kilidini almıyor")
+
+
+def test_dead_worker_claims_are_released():
+    """Çöken sürecin ödeme/ad ayırmaları yeniden başlatmada bırakılır, diğer süreçlerinki kalır"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "shared.db")
+        dead, alive = SharedStore(path), SharedStore(path)
+        dead.owner, alive.owner = 101, 102
+        dead.set('payments').add('B1')
+        dead.set('reserved').add('Online - Ali')
+        alive.set('payments').add('B2')
+
+        cluster = Cluster(1, free_port(), snapshot_path=os.path.join(tmp_dir, "active_adisyonlar.json"),
+                          store_path=path)
+        assert cluster.release_claims(101) == 2
+        assert 'B1' not in alive.set('payments') and list(alive.set('payments')) == ['B2']
+        assert list(alive.set('reserved')) == []
+        assert cluster.release_claims(101) == 0
+        dead.close()
+        alive.close()
+    print("✅ Çöken sürecin ödeme ayırmaları bırakılıyor")
+
+
+def test_cluster_order_and_payment_consistency():
+    """2 süreç: eşzamanlı sipariş/ödeme sonrası tüm süreçlerde aynı adisyonlar"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        proc, url = _start_cluster(tmp_dir, workers=2)
+        try:
+            clients = _clients_on_each_worker(url, 2)
+            assert sorted(clients) == [0, 1], clients.keys()
+
+            # Online siparişler proxy üzerinden iki sürece dağılır
+            def order(k):
+                r = requests.post(url + "/api/online/order", json={
+                    'musteri_adi': f"Cluster {k}", 'telefon': f"0555000{k:04d}", 'adres': 'Test',
+                    'items': [{'urun': 'Çay', 'adet': 2, 'fiyat': 20.0}]
+                }, timeout=30)
+                assert r.json()['success'], r.text
+
+            # Aynı masaya iki süreçten eşzamanlı satır ekleme
+            def add_items(c):
+                for _ in range(15):
+                    c.emit('add_item', {'masa': 'Paket 1', 'urun': 'Tost', 'fiyat': 80.0})
+
+            for c, _ in clients.values():
+                c.emit('select_masa', {'masa': 'Paket 1'})
+            threads = [threading.Thread(target=order, args=(k,)) for k in range(10)]
+            threads += [threading.Thread(target=add_items, args=(c,)) for c, _ in clients.values()]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+            # Bir süreçte yapılan emit diğer süreçteki istemciye de ulaşır
+            def received(events, masa_prefix, count):
+                return lambda: sum(len(data['items']) for event, data in list(events)
+                                   if event == 'item_added' and data['masa'].startswith(masa_prefix)) >= count
+            for worker, (_, events) in clients.items():
+                assert _wait_for(received(events, 'Online - ', 20)), worker
+                assert _wait_for(received(events, 'Paket 1', 30)), worker
+
+            states = _worker_states(url, 2)
+            assert states[0] == states[1]
+            assert len(states[0]['Paket 1']) == 30
+            assert all(len(states[0][f"Online - Cluster {k}"]) == 2 for k in range(10))
+
+            # Aynı masaya iki süreçten eşzamanlı ödeme: sadece biri alınır
+            pay = [threading.Thread(target=c.emit, args=('finalize_payment', {
+                'payments': [{'type': 'Nakit', 'amount': 2400.0}]})) for c, _ in clients.values()]
+            for t in pay:
+                t.start()
+            for t in pay:
+                t.join()
+            for worker, (_, events) in clients.items():
+                def completed():
+                    return [data for event, data in list(events)
+                            if event == 'payment_completed' and data['masa'] == 'Paket 1']
+                assert _wait_for(completed), worker
+                time.sleep(0.5)  # İkinci bir ödeme gelmemeli
+                assert len(completed()) == 1, (worker, completed())
+
+            states = _worker_states(url, 2)
+            assert states[0] == states[1]
+            assert states[0]['Paket 1'] == []
+            for c, _ in clients.values():
+                c.disconnect()
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait(timeout=30)
+
+        # Kapanışta ortak durum dosyaya yazılır (tek süreçli mod devam eder)
+        with open(os.path.join(tmp_dir, "active_adisyonlar.json"), encoding="utf-8") as f:
+            saved = json.load(f)
+        assert saved['Paket 1'] == []
+        assert len(saved['Online - Cluster 3']) == 2
+        print("✅ Süreçler arası sipariş/ödeme tutarlı")
+
+
+if __name__ == "__main__":
+    test_reads_do_not_take_the_write_lock()
+    test_dead_worker_claims_are_released()
+    test_cluster_order_and_payment_consistency()
@@ -0,0 +1,71 @@
+from customer_cache import CustomerCache, normalize_phone
+
+
+class FakeLoader:
+    """db._load_customer_profile yerine: telefon -> profil, çağrı sayacı"""
+
+    def __init__(self, profiles):
+        self.profiles = profiles
+        self.calls = 0
+
+    def __call__(self, phone):
+        self.calls += 1
+        return self.profiles.get(phone)
+
+
+def test_normalized_phone_hits_and_lru():
+    """Farklı yazılan aynı numara tek kayıt; kayıtsız numara da önbellekte; en eski kullanılan düşer"""
+    assert normalize_phone('+90 (532) 123 45 67') == normalize_phone('05321234567') == '5321234567'
+    loader = FakeLoader({'5321234567': {'cari_isim': 'Ali', 'bakiye': 50.0, 'history': []}})
+    cache = CustomerCache(maxsize=2, ttl=60)
+
+    assert cache.get('0532 123 45 67', loader, now=0)['cari_isim'] == 'Ali'
+    assert cache.get('+905321234567', loader, now=1)['cari_isim'] == 'Ali'
+    assert cache.get('05550000000', loader, now=2) is None
+    assert cache.get('5550000000', loader, now=3) is None
+    assert loader.calls == 2 and cache.get('', loader) is None
+
+    cache.get('5321234567', loader, now=4)  # Ali en son kullanılan
+    cache.get('5440000000', loader, now=5)  # 555 düşer
+    cache.get('5321234567', loader, now=6)
+    assert loader.calls == 3 and cache.get_stats()['evictions'] == 1
+
+    cache.get('5321234567', loader, now=100)  # ttl doldu
+    assert loader.calls == 4
+    print("✅ Normalize telefon, LRU ve ttl")
+
+
+def test_invalidated_by_name_and_phone():
+    """Satış/cari yazımı cari ismiyle, telefon güncellemesi telefonla düşürür; yükleme sırasında yazım önbelleğe girmez"""
+    profiles = {'5321234567': {'cari_isim': 'Ali', 'bakiye': 50.0, 'history': []}}
+    loader = FakeLoader(profiles)
+    cache = CustomerCache()
+    cache.get('5321234567', loader, now=0)
+    cache.get('5440000000', loader, now=0)
+
+    profiles['5321234567'] = {'cari_isim': 'Ali', 'bakiye': 80.0, 'history': []}
+    cache.invalidate(cari_isim='Masa 1')  # İlgisiz satış
+    assert cache.get('5321234567', loader, now=1)['bakiye'] == 50.0
+    cache.invalidate(cari_isim='Ali')
+    assert cache.get('5321234567', loader, now=1)['bakiye'] == 80.0
+
+    profiles['5440000000'] = {'cari_isim': 'Ayşe', 'bakiye': 0.0, 'history': []}
+    cache.invalidate(cari_isim='Ayşe', phone='0544 000 00 00')  # Yeni müşteriye telefon yazıldı
+    assert cache.get('5440000000', loader, now=1)['cari_isim'] == 'Ayşe'
+
+    def racing_loader(phone):
+        value = loader(phone)
+        cache.invalidate(cari_isim='Ali')  # Yükleme sürerken satış yazıldı
+        return value
+
+    cache.invalidate(cari_isim='Ali')
+    calls = loader.calls
+    cache.get('5321234567', racing_loader, now=2)
+    cache.get('5321234567', loader, now=2)
+    assert loader.calls == calls + 2
+    print("✅ Cari ismi / telefonla geçersiz kılma")
+
+
+if __name__ == "__main__":
+    test_normalized_phone_hits_and_lru()
+    test_invalidated_by_name_and_phone()
@@ -0,0 +1,89 @@
+from event_aggregator import EventAggregator
+
+
+def test_burst_is_coalesced_per_table_and_kitchen():
+    """Pencere içindeki art arda deltalar ve mutfak satırları tek olayda gitmeli"""
+    sent = []
+    events = EventAggregator(lambda event, payload, to=None: sent.append((event, payload, to)), window=60)
+    events.start()  # Otomatik flush beklenmez, aşağıda elle flush edilir
+    for n in range(15):
+        events.emit('item_added', {'masa': '1', 'version': n + 1, 'items': [{'uid': f"u{n}"}], 'total': 10.0 * (n + 1)},
+                    to=['masa:1'], stream='1', merge_key=('item_added', None))
+        events.emit('kitchen_new_orders', {'orders': [{'uid': f"u{n}", 'masa': '1'}]},
+                    to='kitchen', stream='@kitchen', merge_key=('kitchen_new_orders',))
+    events.emit('payment_completed', {'masa': '1'}, stream='1')
+    events.emit('item_added', {'masa': '1', 'version': 16, 'items': [{'uid': 'x'}], 'total': 5.0},
+                stream='1', merge_key=('item_added', None))
+    events.close()
+
+    names = [event for event, _, _ in sent]
+    assert names == ['item_added', 'kitchen_new_orders', 'payment_completed', 'item_added']
+    merged = sent[0][1]
+    assert len(merged['items']) == 15
+    assert (merged['from_version'], merged['version'], merged['total']) == (1, 15, 150.0)
+    assert len(sent[1][1]['orders']) == 15
+    # Ödeme olayından sonraki delta öncekilerle birleşmez (sıra korunur)
+    assert 'from_version' not in sent[3][1]
+
+    stats = events.get_stats()
+    assert stats['received'] == 32 and stats['emitted'] == 4 and stats['coalesced'] == 28
+    print(f"✅ 32 olay 4 yayına indi (oran {stats['coalesce_ratio']})")
+
+
+def test_reconnect_replays_only_missed_events_for_client_rooms():
+    """Tampondaki boşluk: sadece kaçırılan ve istemcinin odalarına giden olaylar tekrar gelmeli"""
+    events = EventAggregator(lambda event, payload, to=None: None, window=0, replay_size=5)
+    events.emit('item_added', {'masa': '1', 'items': []}, to=['masa:1', 'cashier'])
+    last_seq = events.seq
+    events.emit('order_ready', {'masa': '1'}, to=['garson:Ali'])
+    events.emit('item_added', {'masa': '2', 'items': []}, to=['masa:2', 'cashier'])
+    events.emit('kitchen_cancel_order', {'masa': '1', 'uid': 'u1'}, to='kitchen')
+    events.emit('item_status', {'masa': '1', 'uids': ['u1']}, to=['masa:1', 'cashier', 'kitchen'])
+
+    replies = []
+    assert events.replay(last_seq, events.epoch, {'sid', 'waiter', 'garson:Ali', 'masa:1'},
+                         lambda missed, seq: replies.append((missed, seq)))
+    missed, seq = replies[0]
+    assert [(event, payload['seq']) for event, payload in missed] == [('order_ready', 2), ('item_status', 5)]
+    assert seq == 5
+
+    # Boşluk tamponu aştı veya sunucu yeniden başladı: tam snapshot gerekir
+    for n in range(5):
+        events.emit('item_added', {'masa': '3', 'items': []}, to='cashier')
+    assert not events.replay(last_seq, events.epoch, {'cashier'}, replies.append)
+    assert not events.replay(events.seq, 'eski-epoch', {'cashier'}, replies.append)
+    assert len(replies) == 1 and events.get_stats()['replay_misses'] == 2
+    print("✅ Yeniden bağlanınca sadece kaçırılan olaylar")
+
+
+def test_deltas_for_other_station_rooms_are_not_merged():
+    """Farklı istasyonların satırları için gelen deltalar birleşmez; her istasyon kendi olayını alır"""
+    sent = []
+    events = EventAggregator(lambda event, payload, to=None: sent.append((event, payload, to)), window=60)
+    events.start()
+    rooms = ['masa:1', 'cashier', 'kitchen']
+    events.emit('item_status', {'masa': '1', 'version': 1, 'uids': ['u1'], 'durum': 'hazir'},
+                to=rooms + ['kitchen:izgara'], stream='1', merge_key=('item_status', 'hazir'))
+    events.emit('item_status', {'masa': '1', 'version': 2, 'uids': ['u2'], 'durum': 'hazir'},
+                to=rooms + ['kitchen:icecek'], stream='1', merge_key=('item_status', 'hazir'))
+    events.emit('item_status', {'masa': '1', 'version': 3, 'uids': ['u3'], 'durum': 'hazir'},
+                to=rooms + ['kitchen:icecek'], stream='1', merge_key=('item_status', 'hazir'))
+    events.emit('item_removed', {'masa': '1', 'version': 4, 'uids': ['u4'], 'reason': 'cancel'},
+                to=['kitchen:icecek'] + rooms, stream='1', merge_key=('item_removed', 'cancel'))
+    events.emit('item_removed', {'masa': '1', 'version': 5, 'uids': ['u5'], 'reason': 'cancel'},
+                to=rooms + ['kitchen:icecek'], stream='1', merge_key=('item_removed', 'cancel'))
+    events.close()
+
+    assert [(event, payload['uids']) for event, payload, _ in sent] == [
+        ('item_status', ['u1']), ('item_status', ['u2', 'u3']), ('item_removed', ['u4', 'u5'])]
+    for station, uids in (('kitchen:izgara', {'u1'}), ('kitchen:icecek', {'u2', 'u3', 'u4', 'u5'})):
+        received = {uid for _, payload, to in sent if station in to for uid in payload['uids']}
+        assert received == uids
+    assert (sent[1][1]['from_version'], sent[1][1]['version']) == (2, 3)
+    print("✅ İstasyon odaları farklı deltalar ayrı yayınlandı")
+
+
+if __name__ == "__main__":
+    test_burst_is_coalesced_per_table_and_kitchen()
+    test_reconnect_replays_only_missed_events_for_client_rooms()
+    test_deltas_for_other_station_rooms_are_not_merged()
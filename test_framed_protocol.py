@@ -0,0 +1,97 @@
+import json
+import socket
+import threading
+
+from framed_protocol import FrameReader, FramedClient, RecentIds, serve_connection
+
+
+def _server(handle, recent=None):
+    """Tek bağlantı kabul edip serve_connection ile işleyen dinleyici"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+
+    def run():
+        client, _ = listener.accept()
+        listener.close()
+        with client:
+            serve_connection(client, handle, recent)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return listener.getsockname()[1], thread
+
+
+def test_keepalive_acks_large_and_duplicate_messages():
+    """Tek bağlantıda çok mesaj; büyük fiş bölünmez, tekrar gelen id bir kez işlenir"""
+    received = []
+
+    def handle(message):
+        if not message.get('masa'):
+            raise ValueError("masa yok")
+        received.append(message)
+        return {'eklenen': len(message['siparisler'])}
+
+    port, thread = _server(handle, RecentIds())
+    client = FramedClient('127.0.0.1', port, sender='T1')
+    big = {'masa': '7', 'siparisler': [{'urun': f"Ürün {n}", 'fiyat': 10.0} for n in range(400)]}
+    assert len(json.dumps(big)) > 4096 * 4
+
+    acks = client.request([big, {'masa': '8', 'siparisler': [{'urun': 'Çay'}]}, {'masa': ''}])
+    assert [acks[f"T1:{n}"]['ok'] for n in (1, 2, 3)] == [True, True, False]
+    assert acks['T1:1']['eklenen'] == 400 and 'masa yok' in acks['T1:3']['error']
+
+    # Onayı kaybolmuş gibi aynı id ile tekrar gönder: tekrar işlenmez
+    acks = client.request([{'id': 'T1:2', 'masa': '8', 'siparisler': [{'urun': 'Çay'}]},
+                           {'islem': 'ping'}])
+    assert acks['T1:2']['duplicate'] and acks['T1:4']['ok']
+    assert [m['masa'] for m in received] == ['7', '8']
+    assert len(received[0]['siparisler']) == 400
+
+    client.close()
+    thread.join(timeout=5)
+    print("✅ Açık bağlantı, onaylar, büyük fiş ve tekrar id'si")
+
+
+def test_legacy_one_shot_sender_still_works():
+    """Term.aktar gibi satır sonu olmadan tek JSON gönderip kapatan istemci"""
+    received = []
+    port, thread = _server(received.append)
+    paket = json.dumps({'masa': '3', 'siparisler': [{'urun': 'Tost', 'fiyat': 80.0}] * 200,
+                        'terminal': 'El Terminali'}).encode('utf-8')
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(2)
+    s.connect(('127.0.0.1', port))
+    s.sendall(paket)
+    s.close()
+    thread.join(timeout=5)
+    assert len(received) == 1 and len(received[0]['siparisler']) == 200
+    print("✅ Eski tek seferlik gönderen (200 satır, kesilmeden)")
+
+
+def test_malformed_line_does_not_drop_other_messages():
+    """Bozuk satır atlanır; aynı parçadaki geçerli mesajlar işlenir, bağlantı açık kalır"""
+    reader = FrameReader()
+    chunk = b'{"id": "T1:1", "masa": "1"}\n{bozuk\n\xff\xfe\n{"id": "T1:2", "masa": "2"}\n{"id": "T1:3"'
+    assert [m['id'] for m in reader.feed(chunk)] == ['T1:1', 'T1:2']
+    assert reader.invalid == 2
+    assert reader.feed(b', "masa": "3"}\n') == [{'id': 'T1:3', 'masa': '3'}]
+
+    received = []
+    port, thread = _server(lambda message: received.append(message['masa']))
+    s = socket.create_connection(('127.0.0.1', port), timeout=2)
+    s.sendall(b'{"id": "a", "masa": "4"}\nnot json\n{"id": "b", "masa": "5"}\n')
+    acks = b""
+    while acks.count(b"\n") < 2:
+        acks += s.recv(4096)
+    assert [json.loads(line)['ack'] for line in acks.splitlines()] == ['a', 'b']
+    s.close()
+    thread.join(timeout=5)
+    assert received == ['4', '5']
+    print("✅ Bozuk satır atlanıyor, bağlantı düşmüyor")
+
+
+if __name__ == "__main__":
+    test_keepalive_acks_large_and_duplicate_messages()
+    test_legacy_one_shot_sender_still_works()
+    test_malformed_line_does_not_drop_other_messages()
@@ -0,0 +1,103 @@
+import socket
+import threading
+import time
+
+from framed_protocol import RecentIds, serve_connection
+from kitchen_dispatcher import KitchenDispatcher
+
+
+class FakeKitchen:
+    """mutfak.py gibi satır satır JSON okuyup onaylayan dinleyici"""
+
+    def __init__(self, port=0):
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(('127.0.0.1', port))
+        self.server.listen(5)
+        self.port = self.server.getsockname()[1]
+        self.messages = []
+        self.connections = 0
+        self.recent = RecentIds()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=serve_connection, args=(client, self.messages.append, self.recent),
+                             daemon=True).start()
+
+    def close(self):
+        self.server.close()
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_lines_for_same_table_share_one_message_and_connection():
+    """20 satırlık sipariş tek mesajda, tüm fişler tek bağlantıda gitmeli"""
+    kitchen = FakeKitchen()
+    dispatcher = KitchenDispatcher('127.0.0.1', kitchen.port, batch_window=0.05)
+    dispatcher.start()
+    try:
+        for n in range(20):
+            dispatcher.submit('5', [{'urun': f"Ürün {n % 4}", 'adet': 1}])
+        dispatcher.submit('Paket 1', [{'urun': 'Tost', 'adet': 2}])
+        assert _wait_for(lambda: len(kitchen.messages) == 2)
+
+        masa5 = kitchen.messages[0]
+        assert masa5['islem'] == 'yeni_siparis' and masa5['masa'] == '5'
+        assert masa5['siparisler'] == [{'urun': f"Ürün {n}", 'adet': 5} for n in range(4)]
+
+        dispatcher.submit('5', [{'urun': 'Çay', 'adet': 1}])
+        assert _wait_for(lambda: len(kitchen.messages) == 3)
+        assert kitchen.connections == 1
+
+        stats = dispatcher.get_stats()
+        assert stats['sent_lines'] == 22 and stats['sent_tickets'] == 3 and stats['queue_depth'] == 0
+        print(f"✅ 22 satır {stats['sent_tickets']} mesajda, tek bağlantıda gitti")
+    finally:
+        dispatcher.close()
+        kitchen.close()
+
+
+def test_unreachable_kitchen_bounds_queue_and_reconnects():
+    """Mutfak kapalıyken kuyruk sınırlı kalmalı, açılınca bekleyenler gitmeli"""
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+
+    dispatcher = KitchenDispatcher('127.0.0.1', port, max_queue=10, batch_window=0.01, max_backoff=0.2)
+    dispatcher.start()
+    kitchen = None
+    try:
+        started = time.perf_counter()
+        accepted = [dispatcher.submit('3', [{'urun': 'Kola', 'adet': 1}]) for _ in range(15)]
+        assert time.perf_counter() - started < 0.5  # Sipariş akışı mutfağı beklemez
+        assert accepted.count(True) == 10
+        assert _wait_for(lambda: dispatcher.get_stats()['connect_failures'] >= 2)
+
+        stats = dispatcher.get_stats()
+        assert stats['queue_depth'] == 10 and stats['dropped_lines'] == 5 and not stats['connected']
+
+        kitchen = FakeKitchen(port)
+        assert _wait_for(lambda: dispatcher.get_stats()['queue_depth'] == 0)
+        assert sum(s['adet'] for message in kitchen.messages for s in message['siparisler']) == 10
+        print("✅ Kuyruk sınırlı kaldı, mutfak açılınca bekleyen fiş gitti")
+    finally:
+        dispatcher.close()
+        if kitchen:
+            kitchen.close()
+
+
+if __name__ == "__main__":
+    test_lines_for_same_table_share_one_message_and_connection()
+    test_unreachable_kitchen_bounds_queue_and_reconnects()
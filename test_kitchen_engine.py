@@ -0,0 +1,63 @@
+from adisyon import OrderItem
+from kitchen_engine import KitchenEngine
+
+MENU = {
+    'Yemekler': [['Köfte', 180.0]],
+    'Tatlılar': [['Sütlaç', 60.0]],
+    'İçecekler': [['Ayran', 20.0], ['Çay', 10.0]]
+}
+
+
+def _items(*names):
+    return [OrderItem(uid=f"{name}-{n}", urun=name, adet=1) for n, name in enumerate(names)]
+
+
+def test_lines_routed_by_category_and_sla_first():
+    """Kategoriye göre istasyon; yeni platform fişi yeni salon fişinin önüne, eski salon fişinin arkasına"""
+    engine = KitchenEngine()
+    engine.set_menu(MENU)
+
+    routed = engine.submit('Masa 1', _items('Köfte', 'Ayran', 'Sütlaç', 'Bilinmeyen'), now=0)
+    assert {uid: r['station'] for uid, r in routed.items()} == {
+        'Köfte-0': 'izgara', 'Ayran-1': 'icecek', 'Sütlaç-2': 'soguk', 'Bilinmeyen-3': 'izgara'}
+
+    engine.submit('Masa 2', [OrderItem(uid='m2', urun='Köfte')], now=500)
+    engine.submit('Yemeksepeti-1', [OrderItem(uid='ys', urun='Köfte')], source='yemeksepeti', now=700)
+    queue = engine.queue('izgara', now=800)
+    assert [t['masa'] for t in queue] == ['Masa 1', 'Yemeksepeti-1', 'Masa 2']
+    assert queue[1]['sla'] and [line['uid'] for line in queue[0]['lines']] == ['Köfte-0', 'Bilinmeyen-3']
+    assert [t['masa'] for t in engine.queue('icecek', now=800)] == ['Masa 1']
+    print("✅ İstasyon yönlendirme ve SLA önceliği")
+
+
+def test_station_stats_ready_cancel_and_transfer():
+    """Kuyruk uzunluğu/bekleme; hazır fiş süresi yazılır, iptal yazılmaz, taşımada fiş bölünür"""
+    engine = KitchenEngine(max_age=3600)
+    engine.set_menu(MENU)
+    engine.submit('Masa 1', _items('Köfte', 'Köfte', 'Çay'), now=0)
+    engine.submit('Masa 2', [OrderItem(uid='m2', urun='Köfte')], now=60)
+
+    stats = engine.get_stats(now=120)['stations']
+    assert stats['izgara']['tickets'] == 2 and stats['izgara']['lines'] == 3
+    assert stats['izgara']['oldest_wait_sec'] == 120 and stats['izgara']['avg_wait_sec'] == 90
+    assert stats['soguk']['tickets'] == 0
+
+    engine.move(['Köfte-1'], 'Masa 5')  # Fişin yarısı taşındı
+    assert sorted(t['masa'] for t in engine.queue('izgara', now=120)) == ['Masa 1', 'Masa 2', 'Masa 5']
+    assert engine.stations_for(['Köfte-1', 'Çay-2']) == ['icecek', 'izgara']
+
+    engine.complete(['Köfte-0', 'Köfte-1'], now=300)
+    engine.discard(['Çay-2'])
+    stats = engine.get_stats(now=300)
+    assert stats['stations']['izgara']['completed'] == 2 and stats['stations']['izgara']['avg_prep_sec'] == 300
+    assert stats['stations']['icecek']['completed'] == 0 and stats['discarded_lines'] == 1
+    assert stats['open_tickets'] == 1
+
+    stats = engine.get_stats(now=4000)  # Hiç kapanmayan fiş max_age sonunda düşer
+    assert stats['open_lines'] == 0 and stats['expired_tickets'] == 1
+    print("✅ İstasyon sayaçları, hazır/iptal/taşıma")
+
+
+if __name__ == "__main__":
+    test_lines_routed_by_category_and_sla_first()
+    test_station_stats_ready_cancel_and_transfer()
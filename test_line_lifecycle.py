@@ -0,0 +1,143 @@
+from adisyon import OrderItem
+from line_lifecycle import LineLifecycle
+
+
+class FakeStore:
+    """db.save_line_timestamps / get_line_timestamps yerine bellekte tablo"""
+
+    def __init__(self):
+        self.rows = {}
+        self.batches = 0
+
+    def save_line_timestamps(self, rows):
+        self.batches += 1
+        for row in rows:
+            saved = self.rows.setdefault((row['uid'], row['olusturma']), dict(row))
+            for column, value in row.items():
+                if saved.get(column) is None:
+                    saved[column] = value
+
+    def mark_line_stages(self, rows):
+        found = []
+        for row in rows:
+            saved = [r for (uid, _), r in sorted(self.rows.items(), key=lambda kv: kv[0][1]) if uid == row['uid']]
+            if not saved:
+                continue
+            for column, value in row.items():
+                if column not in ('uid', 'olusturma') and value is not None and saved[-1].get(column) is None:
+                    saved[-1][column] = value
+            found.append(row['uid'])
+        return found
+
+    def get_line_timestamps(self, uids):
+        return [row for (uid, _), row in self.rows.items()
+                if uid in uids and row['odeme'] is None and row['iptal'] is None]
+
+
+def _route(uids, station):
+    return {uid: {'station': station} for uid in uids}
+
+
+def test_stages_are_persisted_in_one_batch_and_monotonic():
+    """Aşamalar toplu yazılır, önceki aşamadan önce görünmez; ödenen satır bellekten düşer"""
+    store = FakeStore()
+    life = LineLifecycle(store)
+    items = [OrderItem(uid='a1', urun='Köfte'), OrderItem(uid='a2', urun='Ayran')]
+    life.track('Masa 1', items, _route(['a1', 'a2'], 'izgara'), source='terminal', now=1000)
+    life.mark(['a1'], 'ready', now=1300)
+    life.mark(['a1'], 'ready', now=1400)   # İlk kayıt geçerli
+    life.mark(['a1'], 'served', now=1250)  # Saat geri gitti: hazırdan önce olamaz
+    life.mark(['a2'], 'cancelled', now=1100)
+    life.flush(now=1400)
+
+    assert store.batches == 1 and len(store.rows) == 2
+    row = next(r for r in store.rows.values() if r['uid'] == 'a1')
+    assert row['hazir'].timestamp() == 1300 and row['servis'].timestamp() == 1300
+    assert row['istasyon'] == 'izgara' and row['kaynak'] == 'terminal'
+
+    life.mark(['a1'], 'paid', now=1500)
+    life.flush(now=1500)
+    assert life.get('a1') is None and life.get('a2') is None
+    assert next(r for r in store.rows.values() if r['uid'] == 'a1')['odeme'].timestamp() == 1500
+    print("✅ Aşama zamanları toplu ve monoton yazıldı")
+
+
+def test_rolling_percentiles_and_p95_alert():
+    """Ürün/istasyon p50/p95; kuyrukta bekleyenler p95'i eşiğin üstüne çıkarınca bir kez uyarı"""
+    alerts = []
+    life = LineLifecycle(window=3600, threshold=600, min_samples=5, on_alert=alerts.append)
+    for n in range(10):
+        uid = f"k{n}"
+        life.track('Masa 1', [OrderItem(uid=uid, urun='Köfte')], _route([uid], 'izgara'), now=n)
+        life.mark([uid], 'ready', now=n + 100 + n * 10)
+    life.track('Masa 2', [OrderItem(uid='c1', urun='Çay')], _route(['c1'], 'icecek'), now=0)
+    life.mark(['c1'], 'ready', now=30)
+
+    stats = life.prep_stats(now=300)
+    assert stats['stations']['izgara']['p50_sec'] == 140 and stats['stations']['izgara']['p95_sec'] == 190
+    assert [p['urun'] for p in stats['products']] == ['Köfte', 'Çay']
+    assert life.check_alerts(now=300) == [] and not alerts
+
+    # Izgara tıkandı: 10 satır 15 dakikadır bekliyor
+    uids = [f"s{n}" for n in range(10)]
+    life.track('Masa 3', [OrderItem(uid=uid, urun='Köfte') for uid in uids], _route(uids, 'izgara'), now=400)
+    life.check_alerts(now=1300)
+    life.check_alerts(now=1310)
+    assert [(a['station'], a['active']) for a in alerts] == [('izgara', True)]
+    assert alerts[0]['waiting'] == 10 and alerts[0]['slowest'] == ['Köfte']
+
+    life.mark(uids, 'cancelled', now=1320)
+    life.check_alerts(now=1320)
+    assert [(a['station'], a['active']) for a in alerts] == [('izgara', True), ('izgara', False)]
+    print("✅ Kayan p50/p95 ve istasyon p95 uyarısı")
+
+
+def test_restore_keeps_original_timestamps():
+    """Yeniden başlatmada veri tabanındaki oluşma zamanı kullanılır (yaklaşık saat değil)"""
+    store = FakeStore()
+    life = LineLifecycle(store)
+    life.track('Masa 1', [OrderItem(uid='r1', urun='Köfte')], _route(['r1'], 'izgara'), now=1000.25)
+    life.flush(now=1001)
+
+    restarted = LineLifecycle(store)
+    restarted.restore('Masa 1', [{'uid': 'r1', 'urun': 'Köfte'}], _route(['r1'], 'izgara'), created=1000)
+    assert restarted.get('r1')['created'] == 1000.25
+    restarted.mark(['r1'], 'ready', now=1200)
+    restarted.flush(now=1200)
+    assert len(store.rows) == 1 and next(iter(store.rows.values()))['hazir'].timestamp() == 1200
+    print("✅ Yeniden başlatmada zamanlar korundu")
+
+
+def test_stage_of_line_created_on_another_worker():
+    """Başka süreçte oluşan satırın hazır/ödeme zamanı o satırın kaydına işlenir (kayıt sonradan yazılsa da)"""
+    store = FakeStore()
+    creator, other = LineLifecycle(store), LineLifecycle(store)
+    creator.track('Masa 1', [OrderItem(uid='w1', urun='Köfte')], _route(['w1'], 'izgara'), now=1000)
+
+    other.mark(['w1'], 'ready', now=1300)
+    other.mark(['w1'], 'served', now=1350, unknown=False)  # Sadece izlenen satırlar
+    other.flush(now=1300)  # Oluşturan süreç henüz yazmadı: bekler
+    assert not store.rows and other.get_stats()['pending_remote'] == 1
+
+    creator.flush(now=1301)
+    other.mark(['w1'], 'paid', now=1400)
+    other.flush(now=1400)
+    row = next(iter(store.rows.values()))
+    assert row['hazir'].timestamp() == 1300 and row['odeme'].timestamp() == 1400 and row['servis'] is None
+    assert other.get_stats()['pending_remote'] == 0 and other.get_stats()['remote_marks'] == 1
+
+    creator.mark(['w1'], 'ready', now=1500)  # Oluşturan sonradan işaretlese de ilk zaman kalır
+    creator.flush(now=1500)
+    assert row['hazir'].timestamp() == 1300
+
+    other.mark(['yok'], 'ready', now=2000)  # Hiç yazılmayan satır max_age sonunda bırakılır
+    other.flush(now=2000 + other.max_age + 1)
+    assert other.get_stats()['pending_remote'] == 0
+    print("✅ Başka süreçte oluşan satırın zamanları yazıldı")
+
+
+if __name__ == "__main__":
+    test_stages_are_persisted_in_one_batch_and_monotonic()
+    test_rolling_percentiles_and_p95_alert()
+    test_restore_keeps_original_timestamps()
+    test_stage_of_line_created_on_another_worker()
@@ -0,0 +1,32 @@
+from mutfak import SiparisListesi
+
+
+def test_keyed_cards_and_paging():
+    """Fiş tamamlanınca sadece kayan kartların yeri değişmeli, fazla fişler sonraki sayfada"""
+    liste = SiparisListesi(sayfa_boyutu=12, sutun=4)
+    anahtarlar = [liste.ekle({'id': f"m:{n}", 'masa': str(n), 'siparisler': []}) for n in range(30)]
+    assert anahtarlar[0] == "m:0" and liste.sayfa_sayisi() == 3
+
+    ilk = liste.yerlesim()
+    assert list(ilk) == anahtarlar[:12]
+    assert ilk["m:5"] == (1, 1)
+
+    # Birinci sayfadan bir fiş tamamlandı: sonraki sayfadan tek kart girer
+    liste.kaldir("m:5")
+    sonra = liste.yerlesim()
+    assert set(sonra) - set(ilk) == {"m:12"}
+    assert [a for a in sonra if a in ilk and sonra[a] == ilk[a]] == anahtarlar[:5]
+
+    # id'siz veya aynı id ile gelen fiş kendi anahtarını alır
+    assert liste.ekle({'masa': 'Paket 1', 'siparisler': []}) != liste.ekle({'id': 'm:0', 'masa': '0'})
+
+    liste.sayfaya_git(9)
+    assert liste.sayfa == 2 and len(liste.yerlesim()) == 7
+    for anahtar in list(liste.yerlesim()):
+        liste.kaldir(anahtar)
+    assert liste.sayfa == 1 and len(liste.yerlesim()) == 12
+    print("✅ Anahtarlı kartlar ve sayfalama")
+
+
+if __name__ == "__main__":
+    test_keyed_cards_and_paging()
@@ -0,0 +1,169 @@
+"""
+satislar / cari_hareketler aylık bölümleme ve arşiv testi.
+
+db_config.py'deki PostgreSQL'de geçici bir şemada eski (bölümsüz) tablolar
+kurulur, migrate_to_partitions ile taşınır, yeni ay bölümleri açılır ve
+saklama süresini aşan aylar arşivlenir. PostgreSQL yoksa test atlanır.
+"""
+import gzip
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+import psycopg2
+import pytest
+from psycopg2 import extensions, pool
+from psycopg2.extras import RealDictCursor, wait_select
+
+import async_runtime
+from customer_cache import CustomerCache
+from db_config import DB_CONFIG
+
+SCHEMA = "ff_partition_test"
+
+
+def _balances(cursor):
+    cursor.execute("SELECT cari_id, SUM(tutar) AS bakiye FROM cari_hareketler GROUP BY cari_id ORDER BY cari_id")
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def test_migrate_maintain_and_archive():
+    """Taşıma satır ve id kaybetmez; yeni ay açılır; arşivlenen ay dosyaya yazılır, bakiye ve özet değişmez"""
+    try:
+        admin = psycopg2.connect(connect_timeout=3, **DB_CONFIG)
+    except Exception as e:
+        pytest.skip(f"PostgreSQL yok: {e}")
+    from database import Database
+
+    admin.autocommit = True
+    cursor = admin.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE satislar (
+            id SERIAL PRIMARY KEY, urun TEXT NOT NULL, adet INTEGER NOT NULL,
+            fiyat DECIMAL(10, 2) NOT NULL, odeme TEXT NOT NULL, tip TEXT DEFAULT 'normal',
+            tarih_saat TIMESTAMP DEFAULT CURRENT_TIMESTAMP, masa TEXT, terminal_id TEXT, vardiya_id INTEGER
+        )
+    """)
+    cursor.execute("CREATE TABLE cari_hesaplar (id SERIAL PRIMARY KEY, cari_isim TEXT NOT NULL UNIQUE)")
+    cursor.execute("""
+        CREATE TABLE cari_hareketler (
+            id SERIAL PRIMARY KEY, cari_id INTEGER NOT NULL,
+            tarih TIMESTAMP DEFAULT CURRENT_TIMESTAMP, islem TEXT NOT NULL, tutar DECIMAL(10, 2) NOT NULL,
+            FOREIGN KEY (cari_id) REFERENCES cari_hesaplar(id) ON DELETE CASCADE
+        )
+    """)
+    for statement in Database.SALES_INDEXES + Database.SALES_ROLLUP_DDL:
+        cursor.execute(statement)
+    # Ocak - Haziran 2025, her gün 24 satış; bir satış tarihsiz
+    cursor.execute("""
+        INSERT INTO satislar (urun, adet, fiyat, odeme, tarih_saat, masa)
+        SELECT 'Ürün ' || mod(g, 5), 1, 45.00, 'Nakit', TIMESTAMP '2025-01-01' + g * INTERVAL '1 hour', 'Masa 1'
+        FROM generate_series(0, 181 * 24 - 1) g
+    """)
+    cursor.execute("INSERT INTO satislar (urun, adet, fiyat, odeme, tarih_saat) VALUES ('Çay', 1, 10, 'Nakit', NULL)")
+    cursor.execute("INSERT INTO cari_hesaplar (cari_isim) VALUES ('Ali'), ('Veli')")
+    cursor.execute("""
+        INSERT INTO cari_hareketler (cari_id, tarih, islem, tutar)
+        SELECT 1 + mod(g, 2), TIMESTAMP '2025-01-01' + g * INTERVAL '1 day', 'satis', 100 - mod(g, 7) * 30
+        FROM generate_series(0, 180) g
+    """)
+
+    test_db = object.__new__(Database)
+    test_db.customer_cache = CustomerCache()
+    test_db._pool = pool.ThreadedConnectionPool(1, 2, options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+    archive_dir = tempfile.mkdtemp(prefix="ff_arsiv_")
+    try:
+        test_db.rebuild_sales_rollup()
+        cursor.execute("SELECT COUNT(*) AS n, MAX(id) AS max_id FROM satislar")
+        before = cursor.fetchone()
+        balances = _balances(cursor)
+        cursor.execute("SELECT * FROM satis_ozet ORDER BY 1, 2, 3, 4, 5, 6, 7")
+        rollup = cursor.fetchall()
+
+        # Açılıştaki only_empty çağrısı dolu tabloyu kilitlemez (açık satış işlemi beklemez)
+        blocker = psycopg2.connect(options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+        blocker.cursor().execute("LOCK TABLE satislar, cari_hareketler IN ROW EXCLUSIVE MODE")
+        result = []
+        worker = threading.Thread(target=lambda: result.append(test_db.migrate_to_partitions(only_empty=True)))
+        worker.start()
+        worker.join(timeout=10)
+        finished = not worker.is_alive()
+        blocker.rollback()
+        blocker.close()
+        worker.join()
+        assert finished and result == [{}]
+        migrated = test_db.migrate_to_partitions(now=datetime(2025, 6, 15))
+        assert migrated == {'satislar': before['n'], 'cari_hareketler': 181}
+        assert test_db.is_partitioned('satislar') and test_db.is_partitioned('cari_hareketler')
+        months = test_db.list_partitions('satislar')
+        assert months[0] == ('satislar_2025_01', datetime(2025, 1, 1)) and months[-1][1] == datetime(2025, 9, 1)
+        cursor.execute("SELECT COUNT(*) AS n FROM satislar_default")
+        assert cursor.fetchone()['n'] == 1
+        assert _balances(cursor) == balances
+
+        # id sequence'ı devam eder; gün sonu sorgusu sadece o ayın bölümünü okur
+        ids = test_db.save_sales_batch([{'urun': 'Dürüm', 'adet': 1, 'fiyat': 90, 'odeme': 'Nakit',
+                                         'Tarih_Saat': '20-06-2025 12:00:00'}])
+        assert ids[0] > before['max_id']
+        cursor.execute("EXPLAIN (FORMAT JSON) SELECT * FROM satislar WHERE tarih_saat >= %s AND tarih_saat < %s",
+                       (datetime(2025, 6, 20), datetime(2025, 6, 21)))
+        plan = str(cursor.fetchone()['QUERY PLAN'])
+        assert 'satislar_2025_06' in plan and 'satislar_2025_05' not in plan
+
+        # Ekim için bölüm yok: default'a düşen satır yeni bölüme taşınır
+        cursor.execute("INSERT INTO satislar (urun, adet, fiyat, odeme, tarih_saat) VALUES ('Çay', 1, 10, 'Nakit', '2025-10-02')")
+        created = test_db.ensure_partitions(ahead=1, now=datetime(2025, 10, 1))
+        assert created == ['satislar_2025_10', 'satislar_2025_11', 'cari_hareketler_2025_10', 'cari_hareketler_2025_11']
+        cursor.execute("SELECT COUNT(*) AS n FROM satislar_2025_10")
+        assert cursor.fetchone()['n'] == 1
+        assert test_db.ensure_partitions(ahead=1, now=datetime(2025, 10, 1)) == []
+
+        # 2025-08 itibarıyla 5 ay sakla: Ocak ve Şubat arşivlenir
+        archived = test_db.archive_partitions(5, archive_dir, now=datetime(2025, 8, 10))
+        assert archived == ['satislar_2025_01', 'satislar_2025_02', 'cari_hareketler_2025_01', 'cari_hareketler_2025_02']
+        with gzip.open(os.path.join(archive_dir, 'satislar_2025_01.csv.gz'), 'rt', encoding='utf-8') as f:
+            assert len(f.read().splitlines()) == 31 * 24 + 1
+        cursor.execute("SELECT to_regclass('satislar_2025_01') AS t")
+        assert cursor.fetchone()['t'] is None
+        cursor.execute("SELECT MIN(tarih_saat) AS t FROM satislar WHERE tarih_saat > 'epoch'")
+        assert cursor.fetchone()['t'] == datetime(2025, 3, 1)
+        assert _balances(cursor) == balances
+        cursor.execute("SELECT COUNT(*) AS n FROM cari_hareketler WHERE islem = 'devir' AND tarih = '2025-03-01'")
+        assert cursor.fetchone()['n'] == 2
+
+        # eventlet/gevent modunda (wait callback, COPY yok) Mart aynı biçimde arşivlenir
+        previous_mode = async_runtime._active_mode
+        async_runtime._active_mode = 'gevent'
+        extensions.set_wait_callback(wait_select)
+        test_db._pool.closeall()
+        test_db._pool = pool.ThreadedConnectionPool(1, 2, options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+        try:
+            archived = test_db.archive_partitions(5, archive_dir, now=datetime(2025, 9, 10))
+        finally:
+            extensions.set_wait_callback(None)
+            async_runtime._active_mode = previous_mode
+        assert archived == ['satislar_2025_03', 'cari_hareketler_2025_03']
+        with gzip.open(os.path.join(archive_dir, 'satislar_2025_01.csv.gz'), 'rt', encoding='utf-8') as f:
+            header = f.readline()
+        with gzip.open(os.path.join(archive_dir, 'satislar_2025_03.csv.gz'), 'rt', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        assert lines[0] + '\n' == header and len(lines) == 31 * 24 + 1
+        assert _balances(cursor) == balances
+
+        # Özet arşivden etkilenmez, yeniden hesaplama arşivlenen ayları silmez
+        test_db.rebuild_sales_rollup()
+        cursor.execute("SELECT * FROM satis_ozet WHERE tarih < '2025-06-20' ORDER BY 1, 2, 3, 4, 5, 6, 7")
+        assert cursor.fetchall() == [r for r in rollup if r['tarih'] < datetime(2025, 6, 20).date()]
+    finally:
+        test_db._pool.closeall()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        admin.close()
+    print("✅ Aylık bölümleme, yeni ay bölümleri ve arşiv")
+
+
+if __name__ == "__main__":
+    test_migrate_maintain_and_archive()
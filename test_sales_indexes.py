@@ -0,0 +1,216 @@
+"""
+satislar rapor sorgularının EXPLAIN regresyon testi.
+
+db_config.py'deki PostgreSQL'de geçici bir şemaya 1M satırlık satislar
+tablosu kurulur (FASTFOOT_EXPLAIN_ROWS ile değiştirilebilir). Rapor
+metotlarının çalıştırdığı SQL'in planında Seq Scan olmamalı, beklenen
+indeks kullanılmalıdır. Gün sonu özeti ve vardiya toplamları satis_ozet'ten
+okunur; satis_ozet'in save_sales_batch ve yeniden hesaplama ile satislar'a
+eşit kaldığı küçük bir tabloda denenir. PostgreSQL yoksa testler atlanır.
+"""
+import os
+from contextlib import contextmanager
+
+import psycopg2
+import pytest
+from psycopg2 import extensions, pool
+from psycopg2.extras import RealDictCursor, wait_select
+
+import async_runtime
+from customer_cache import CustomerCache
+from db_config import DB_CONFIG
+
+SCHEMA = "ff_explain_test"
+ROWS = int(os.getenv("FASTFOOT_EXPLAIN_ROWS", "1000000"))
+
+
+class ExplainCursor:
+    """Çalıştırılan sorgunun yerine planını döndüren cursor"""
+
+    def __init__(self, cursor, plans):
+        self.cursor = cursor
+        self.plans = plans
+
+    def execute(self, query, params=None):
+        self.cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        self.plans.append(self.cursor.fetchone()['QUERY PLAN'][0]['Plan'])
+
+    def fetchall(self):
+        return []
+
+    def fetchone(self):
+        return None
+
+
+def _nodes(plan):
+    yield plan
+    for child in plan.get('Plans', []):
+        yield from _nodes(child)
+
+
+def _scans(plan):
+    """Tablo tarama düğümleri: [(düğüm türü, indeks adı)]"""
+    return [(n['Node Type'], n.get('Index Name')) for n in _nodes(plan)
+            if n.get('Relation Name') or n['Node Type'] == 'Bitmap Index Scan']
+
+
+@contextmanager
+def _scratch_db():
+    """Geçici şemada satislar/satis_ozet; şemaya bağlı Database örneği ve yönetici cursor'ı"""
+    try:
+        admin = psycopg2.connect(connect_timeout=3, **DB_CONFIG)
+    except Exception as e:
+        pytest.skip(f"PostgreSQL yok: {e}")
+    from database import Database
+
+    admin.autocommit = True
+    cursor = admin.cursor(cursor_factory=RealDictCursor)
+    cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cursor.execute(f"CREATE SCHEMA {SCHEMA}")
+    cursor.execute(f"SET search_path TO {SCHEMA}")
+    cursor.execute("""
+        CREATE TABLE satislar (
+            id SERIAL PRIMARY KEY,
+            urun TEXT NOT NULL,
+            adet INTEGER NOT NULL,
+            fiyat DECIMAL(10, 2) NOT NULL,
+            odeme TEXT NOT NULL,
+            tip TEXT DEFAULT 'normal',
+            tarih_saat TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            masa TEXT,
+            terminal_id TEXT,
+            vardiya_id INTEGER
+        )
+    """)
+    for statement in Database.SALES_INDEXES + Database.SALES_ROLLUP_DDL:
+        cursor.execute(statement)
+    test_db = object.__new__(Database)
+    test_db.customer_cache = CustomerCache()
+    test_db._pool = pool.ThreadedConnectionPool(1, 2, options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+    try:
+        yield test_db, cursor
+    finally:
+        test_db._pool.closeall()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        admin.close()
+
+
+def _seed(cursor):
+    # ~1 yıl, 2000 vardiya, 50 masa + 5000 paket müşterisi
+    cursor.execute("""
+        INSERT INTO satislar (urun, adet, fiyat, odeme, tip, tarih_saat, masa, terminal_id, vardiya_id)
+        SELECT 'Ürün ' || mod(g, 40), 1 + mod(g, 3), 45.00,
+               (ARRAY['Nakit', 'Kredi Kartı', 'Açık Hesap', 'Yemek Kartı'])[1 + mod(g, 4)], 'normal',
+               TIMESTAMP '2025-01-01' + g * (INTERVAL '365 days' / %s),
+               CASE WHEN mod(g, 10) = 0 THEN 'Müşteri ' || mod(g, 5000) ELSE 'Masa ' || mod(g, 50) END,
+               'T1', g * 2000 / %s
+        FROM generate_series(1, %s) g
+    """, (ROWS, ROWS, ROWS))
+
+
+def test_report_queries_use_indexes():
+    """Gün sonu, vardiya toplamı ve müşteri geçmişi indeksle okunur; eski DATE() filtresi tüm tabloyu tarar"""
+    with _scratch_db() as (test_db, cursor):
+        _seed(cursor)
+        rows = test_db.rebuild_sales_rollup()
+        cursor.execute("ANALYZE satislar")
+        cursor.execute("ANALYZE satis_ozet")
+
+        plans = []
+
+        @contextmanager
+        def explain_cursor(dict_cursor=True):
+            with test_db.get_connection() as conn:
+                yield ExplainCursor(conn.cursor(cursor_factory=RealDictCursor), plans)
+
+        test_db.get_cursor = explain_cursor
+        test_db.get_sales_by_date('2025-06-01')
+        test_db.get_daily_summary('2025-06-01')
+        test_db.get_hourly_summary('2025-06-01')
+        test_db.get_shift_totals(1000)
+        test_db.get_customer_order_history('Masa 7')
+        by_date, summary, hourly, shift, history = plans
+
+        assert ('Seq Scan', None) not in _scans(by_date)
+        assert any(index == 'idx_satislar_tarih' for _, index in _scans(by_date)), _scans(by_date)
+        for plan in (summary, hourly):
+            assert ('Seq Scan', None) not in _scans(plan)
+            assert any(index == 'satis_ozet_pkey' for _, index in _scans(plan)), _scans(plan)
+        assert ('Seq Scan', None) not in _scans(shift)
+        assert any(index == 'idx_satis_ozet_vardiya' for _, index in _scans(shift)), _scans(shift)
+        assert _scans(history) == [('Index Scan', 'idx_satislar_masa_tarih')]
+        assert all(n['Node Type'] != 'Sort' for n in _nodes(history))
+
+        # Eski biçim: DATE(tarih_saat) = ... indeksi kullanamaz
+        cursor.execute("EXPLAIN (FORMAT JSON) SELECT * FROM satislar WHERE DATE(tarih_saat) = %s", ('2025-06-01',))
+        assert ('Seq Scan', None) in _scans(cursor.fetchone()['QUERY PLAN'][0]['Plan'])
+    print(f"✅ Rapor sorguları {ROWS} satırda ({rows} özet satırı) indeks kullanıyor")
+
+
+def _raw_summary(cursor, where, params=()):
+    cursor.execute(f"""
+        SELECT odeme, tip, SUM(fiyat * adet) AS toplam, COUNT(*) AS adet
+        FROM satislar WHERE {where} GROUP BY odeme, tip ORDER BY odeme, tip
+    """, params)
+    return [dict(r) for r in cursor.fetchall()]
+
+
+def test_rollup_follows_sales_batches():
+    """satis_ozet save_sales_batch (INSERT ve COPY) ile aynı işlemde artar; yeniden hesaplama aynı sonucu verir"""
+    with _scratch_db() as (test_db, cursor):
+        def sales(n, odeme, saat, vardiya):
+            return [{'urun': f'Ürün {i % 3}', 'adet': 1 + i % 2, 'fiyat': 45.5, 'odeme': odeme,
+                     'Tarih_Saat': f'18-10-2026 {saat}:15:00', 'masa': 'Masa 1', 'terminal_id': 'T1',
+                     'vardiya_id': vardiya} for i in range(n)]
+
+        ids = test_db.save_sales_batch(sales(40, 'Nakit', 12, 7))
+        test_db.save_sales_batch(sales(3, 'Kredi Kartı', 12, 7) + sales(2, 'Nakit', 13, None))
+        test_db.SALES_COPY_THRESHOLD = 10
+        test_db.save_sales_batch(sales(25, 'Nakit', 19, 8))
+        test_db.save_sale('Çay', 1, 10, 'Nakit', masa='Masa 2')
+        assert len(ids) == 40 and ids == sorted(ids)
+
+        summary = sorted((dict(r) for r in test_db.get_daily_summary('2026-10-18')),
+                         key=lambda r: (r['odeme'], r['tip']))
+        assert summary == _raw_summary(cursor, "tarih_saat >= '2026-10-18' AND tarih_saat < '2026-10-19'")
+        shift = {r['odeme']: float(r['toplam']) for r in test_db.get_shift_totals(7)}
+        assert shift == {'Nakit': 40 * 45.5 * 1.5, 'Kredi Kartı': 45.5 * 4}
+        hours = {(r['saat'], r['odeme']): r['satir'] for r in test_db.get_hourly_summary('2026-10-18')}
+        assert hours[(12, 'Nakit')] == 40 and hours[(13, 'Nakit')] == 2 and hours[(19, 'Nakit')] == 25
+
+        cursor.execute("SELECT * FROM satis_ozet ORDER BY 1, 2, 3, 4, 5, 6, 7")
+        before = cursor.fetchall()
+        cursor.execute("DELETE FROM satis_ozet WHERE saat = 19")
+        test_db.rebuild_sales_rollup('2026-10-18', '2026-10-19')
+        cursor.execute("SELECT * FROM satis_ozet ORDER BY 1, 2, 3, 4, 5, 6, 7")
+        assert cursor.fetchall() == before
+    print("✅ satis_ozet satış partileriyle birlikte güncellendi")
+
+
+def test_green_mode_batch_uses_insert():
+    """eventlet/gevent modunda (wait callback kurulu) büyük parti COPY yerine INSERT ile yazılır"""
+    with _scratch_db() as (test_db, cursor):
+        test_db.SALES_COPY_THRESHOLD = 10
+        sales = [{'urun': 'Su', 'adet': 1, 'fiyat': 10, 'odeme': 'Nakit',
+                  'Tarih_Saat': '18-10-2026 12:00:00', 'masa': 'Masa 1'} for _ in range(25)]
+        previous_mode = async_runtime._active_mode
+        # Green modun psycopg2 tarafı: copy_expert wait callback ile reddedilir
+        async_runtime._active_mode = 'gevent'
+        extensions.set_wait_callback(wait_select)
+        test_db._pool.closeall()
+        test_db._pool = pool.ThreadedConnectionPool(1, 2, options=f"-c search_path={SCHEMA}", **DB_CONFIG)
+        try:
+            ids = test_db.save_sales_batch(sales)
+        finally:
+            extensions.set_wait_callback(None)
+            async_runtime._active_mode = previous_mode
+        assert len(ids) == 25 and ids == sorted(ids)
+        cursor.execute("SELECT satir FROM satis_ozet WHERE tarih = '2026-10-18'")
+        assert cursor.fetchone()['satir'] == 25
+    print("✅ Green modda büyük parti INSERT ile yazıldı")
+
+
+if __name__ == "__main__":
+    test_report_queries_use_indexes()
+    test_rollup_follows_sales_batches()
+    test_green_mode_batch_uses_insert()
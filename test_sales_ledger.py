@@ -0,0 +1,61 @@
+import os
+import tempfile
+from datetime import datetime
+
+import pandas as pd
+
+from sales_ledger import SALES_COLUMNS, copy_buffer, sale_row, save_sales
+
+
+class FakeDb:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    def save_sales_batch(self, sales_list):
+        if self.fail:
+            raise RuntimeError("bağlantı yok")
+        self.batches.append(list(sales_list))
+        return list(range(1, len(sales_list) + 1))
+
+
+def _sales(n):
+    return [{'urun': f'Ürün {i}', 'adet': 1, 'fiyat': 45.0, 'odeme': 'Nakit',
+             'Tarih_Saat': '18-10-2026 12:30:05', 'masa': 'Masa 1'} for i in range(n)]
+
+
+def test_sale_row_and_copy_buffer():
+    """Terminal tarih metni datetime'a çevrilir; COPY satırında sekme/yeni satır kaçırılır, None -> \\N"""
+    row = sale_row(_sales(1)[0])
+    assert len(row) == len(SALES_COLUMNS)
+    assert row[SALES_COLUMNS.index('tarih_saat')] == datetime(2026, 10, 18, 12, 30, 5)
+    assert row[SALES_COLUMNS.index('tip')] == 'normal'
+
+    now = datetime(2026, 10, 18, 9, 0)
+    assert sale_row({'urun': 'Çay', 'fiyat': 10}, now)[SALES_COLUMNS.index('tarih_saat')] == now
+
+    buf = copy_buffer([(7, 'Dürüm\tacılı\nbol', 2, None, now)])
+    assert buf.read() == '7\tDürüm\\tacılı\\nbol\t2\t\\N\t2026-10-18 09:00:00\n'
+    print("✅ Satış satırı ve COPY tamponu")
+
+
+def test_one_batch_to_db_and_excel_fallback():
+    """Parti veri tabanına tek çağrıyla gider; hata olursa aynı parti Excel'e tek seferde eklenir"""
+    path = os.path.join(tempfile.mkdtemp(prefix="ff_ledger_"), "satislar.xlsx")
+    db = FakeDb()
+    assert save_sales(_sales(40), db, path) == list(range(1, 41))
+    assert len(db.batches) == 1 and not os.path.exists(path)
+
+    assert save_sales(_sales(3), FakeDb(fail=True), path) == []
+    assert save_sales(_sales(2), None, path) == []
+    df = pd.read_excel(path)
+    assert len(df) == 5 and list(df['urun'][:3]) == ['Ürün 0', 'Ürün 1', 'Ürün 2']
+
+    assert save_sales(_sales(1), None, os.path.join(path, "yok", "x.xlsx")) is None
+    assert save_sales([], db, path) == [] and len(db.batches) == 1
+    print("✅ Toplu defter yazımı ve Excel yedeği")
+
+
+if __name__ == "__main__":
+    test_sale_row_and_copy_buffer()
+    test_one_batch_to_db_and_excel_fallback()
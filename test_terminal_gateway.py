@@ -0,0 +1,101 @@
+import socket
+import threading
+import time
+
+from framed_protocol import FramedClient, RecentIds
+from terminal_gateway import TerminalGateway
+
+
+def _free_port():
+    probe = socket.socket()
+    probe.bind(('127.0.0.1', 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.02)
+    return condition()
+
+
+def test_many_terminals_and_caller_id_on_one_loop():
+    """200 terminal aynı anda; tüm siparişler bir kez işlenip onaylanmalı, CID de aynı döngüde"""
+    orders, calls = [], []
+    lock = threading.Lock()
+
+    def handle_order(message):
+        with lock:
+            orders.append(message['masa'])
+        return {'eklenen': len(message['siparisler'])}
+
+    gateway = TerminalGateway(max_connections=300, read_timeout=10, queue_size=50, workers=2)
+    terminal_port, cid_port = _free_port(), _free_port()
+    gateway.listen('terminal', terminal_port, handle_order, host='127.0.0.1', recent=RecentIds())
+    gateway.listen('caller_id', cid_port, calls.append, kind='oneshot', host='127.0.0.1', read_size=1024)
+    gateway.start()
+    try:
+        clients = [FramedClient('127.0.0.1', terminal_port, timeout=10, sender=f"T{n}") for n in range(200)]
+        for client in clients:
+            client.connect()
+        assert _wait_for(lambda: gateway.get_stats()['active_connections'] == 200)
+
+        results = []
+
+        def push(client):
+            acks = client.request([{'masa': str(k), 'siparisler': [{'urun': 'Tost', 'fiyat': 80.0}]}
+                                   for k in range(5)])
+            results.append(all(ack['ok'] for ack in acks.values()) and len(acks) == 5)
+
+        threads = [threading.Thread(target=push, args=(client,)) for client in clients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results.count(True) == 200
+        assert len(orders) == 1000
+
+        cid = socket.create_connection(('127.0.0.1', cid_port))
+        cid.sendall(b"ID=1,NO=05321234567,DATE=21/02/2026\r\n")
+        cid.close()
+        assert _wait_for(lambda: calls == ["ID=1,NO=05321234567,DATE=21/02/2026"])
+
+        stats = gateway.get_stats()
+        assert stats['listeners']['terminal']['messages'] == 1000
+        assert stats['max_queue_depth'] <= 50
+        for client in clients:
+            client.close()
+        assert _wait_for(lambda: gateway.get_stats()['active_connections'] == 0)
+        print(f"✅ 200 terminal x 5 sipariş onaylandı (kuyruk en fazla {stats['max_queue_depth']})")
+    finally:
+        gateway.stop()
+
+
+def test_connection_limit_and_read_timeout():
+    """Sınırı aşan bağlantı kapatılmalı, veri göndermeyen bağlantı zaman aşımında düşmeli"""
+    gateway = TerminalGateway(max_connections=2, read_timeout=0.3, workers=1)
+    port = _free_port()
+    gateway.listen('terminal', port, lambda message: None, host='127.0.0.1')
+    gateway.start()
+    try:
+        idle = [socket.create_connection(('127.0.0.1', port)) for _ in range(2)]
+        assert _wait_for(lambda: gateway.get_stats()['active_connections'] == 2)
+        extra = socket.create_connection(('127.0.0.1', port))
+        extra.settimeout(2)
+        assert extra.recv(1) == b""  # Hemen kapatıldı
+        assert gateway.get_stats()['rejected_connections'] == 1
+
+        assert _wait_for(lambda: gateway.get_stats()['active_connections'] == 0)
+        assert gateway.get_stats()['listeners']['terminal']['timeouts'] == 2
+        for sock in idle + [extra]:
+            sock.close()
+        print("✅ Bağlantı sınırı ve okuma zaman aşımı")
+    finally:
+        gateway.stop()
+
+
+if __name__ == "__main__":
+    test_many_terminals_and_caller_id_on_one_loop()
+    test_connection_limit_and_read_timeout()
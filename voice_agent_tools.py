@@ -44,14 +44,13 @@ def get_customer_context(phone_number: str) -> str:
         # Basit bir sayaç veya db üzerinden kontrol eklenebilir
         # Şimdilik prensip olarak yerini hazırlıyoruz
         
-        # database.py: get_cari_by_phone(self, telefon)
-        customer = db.get_cari_by_phone(phone_number)
+        # database.py: get_customer_profile(self, telefon) - cari + son siparişler tek sorgu, önbellekli
+        customer = db.get_customer_profile(phone_number)
         if not customer:
             return "Yeni müşteri. Kayıt bulunamadı."
 
         customer_name = customer['cari_isim']
-        # database.py: get_customer_order_history(self, cari_isim, limit=5)
-        history = db.get_customer_order_history(customer_name, limit=3)
+        history = customer['history'][:3]
         
         context = f"Müşteri Adı: {customer_name}\n"
         if history:
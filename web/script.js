@@ -8,6 +8,9 @@ let socket = null;
 let systemInfo = {};
 let menuData = {};
 let adisyonlar = {};
+let masaVersions = {}; // masa -> son uygulanan delta sürümü
+let sectionVersions = {}; // initial_data menü/sistem bölümlerinin sürümleri (menu_version, system_version)
+let eventSeq = { last_seq: null, seq_epoch: null }; // Son görülen olay sırası (yeniden bağlanınca kaçırılanlar gelir)
 let currentMasa = null;
 let currentItems = [];
 let currentTotal = 0;
@@ -124,8 +127,12 @@ function connectToServer() {
     socket = io({
         reconnection: true,
         reconnectionDelay: 1000,
-        reconnectionAttempts: 10
+        reconnectionAttempts: 10,
+        query: { role: 'cashier' },
+        // Elimizdeki menü/sistem sürümleri: değişmediyse sunucu tekrar göndermez
+        auth: (cb) => cb({ ...sectionVersions, ...eventSeq })
     });
+    trackEventSeq(socket);
 
     // Connection events
     socket.on('connect', onConnect);
@@ -138,6 +145,9 @@ function connectToServer() {
     socket.on('adisyonlar_update', onAdisyonlarUpdate);
     socket.on('masa_selected', onMasaSelected);
     socket.on('masa_update', onMasaUpdate);
+    socket.on('item_added', onItemAdded);
+    socket.on('item_removed', onItemRemoved);
+    socket.on('item_status', onItemStatus);
     socket.on('payment_completed', onPaymentCompleted);
     socket.on('incoming_call', onIncomingCall);
     socket.on('success', onSuccess);
@@ -192,6 +202,11 @@ function onConnect() {
         console.log('📟 Default Kasa set: 1');
     }
     socket.emit('set_kasa', { kasa_id: parseInt(kasaId) });
+
+    // Yeniden bağlanınca masa odasına tekrar katıl
+    if (currentMasa) {
+        socket.emit('select_masa', { masa: currentMasa });
+    }
 }
 
 function onDisconnect() {
@@ -216,13 +231,54 @@ function onSystemInfo(data) {
     updateSystemInfo();
 }
 
+/**
+ * initial_data bölümü: sunucu menü/sistem bilgisini önceden serileştirilmiş
+ * JSON (binary) olarak gönderir; eski format (nesne) da kabul edilir.
+ */
+function decodeSection(value) {
+    if (value instanceof ArrayBuffer || ArrayBuffer.isView(value)) {
+        return JSON.parse(new TextDecoder('utf-8').decode(value));
+    }
+    return value;
+}
+
+/**
+ * Olaylardaki global sıra numarasını takip et
+ */
+function trackEventSeq(sock) {
+    sock.onAny((event, data) => {
+        if (data && typeof data.seq === 'number' && data.seq > (eventSeq.last_seq || 0)) {
+            eventSeq.last_seq = data.seq;
+        }
+    });
+}
+
+/**
+ * Bağlantı koparken kaçırılan olayları normal dinleyicilerinden geçir
+ */
+function replayMissedEvents(sock, events) {
+    (events || []).forEach(([event, data]) => {
+        sock.listeners(event).forEach(fn => fn(data));
+    });
+}
+
 function onInitialData(data) {
     console.log('📦 Initial data received:', data);
 
-    // Store data
-    systemInfo = data.system || {};
-    menuData = data.menu || {};
-    adisyonlar = data.adisyonlar || {};
+    // Store data (gelmeyen bölüm: elimizdeki sürüm güncel)
+    if (data.system !== undefined) {
+        systemInfo = decodeSection(data.system) || {};
+        sectionVersions.system_version = data.system_version;
+    }
+    if (data.menu !== undefined) {
+        menuData = decodeSection(data.menu) || {};
+        sectionVersions.menu_version = data.menu_version;
+    }
+    // Olay tekrarı ile bağlanmada masa snapshot'ı gelmez, kaçırılan deltalar gelir
+    if (data.adisyonlar !== undefined) {
+        adisyonlar = data.adisyonlar || {};
+        masaVersions = data.adisyon_versions || {};
+    }
     activeShift = data.active_shift || null;
 
     // Check for terminal role override in URL or localStorage
@@ -246,6 +302,10 @@ function onInitialData(data) {
     if (isTerminal) {
         applyTerminalRestrictions();
     }
+
+    replayMissedEvents(socket, data.replay);
+    const seen = data.seq_epoch === eventSeq.seq_epoch ? (eventSeq.last_seq || 0) : 0;
+    eventSeq = { last_seq: Math.max(data.event_seq, seen), seq_epoch: data.seq_epoch };
 }
 
 /**
@@ -290,6 +350,8 @@ function onMasaSelected(data) {
     currentMasa = data.masa;
     currentItems = data.items || [];
     currentTotal = data.total || 0;
+    adisyonlar[data.masa] = currentItems;
+    if (data.version !== undefined) masaVersions[data.masa] = data.version;
 
     updateOrderDisplay();
     updateCourierArea();
@@ -298,8 +360,9 @@ function onMasaSelected(data) {
 function onMasaUpdate(data) {
     console.log('🔄 Masa update:', data);
 
-    // Update adisyonlar
+    // Update adisyonlar (tam hal: resync cevabı)
     adisyonlar[data.masa] = data.items || [];
+    if (data.version !== undefined) masaVersions[data.masa] = data.version;
 
     // If this is our current masa, update display
     if (data.masa === currentMasa) {
@@ -312,11 +375,62 @@ function onMasaUpdate(data) {
     updateTableButton(data.masa);
 }
 
+/**
+ * Delta olayını uygula. Sürüm bir sonraki değilse (kaçırılmış olay)
+ * masanın tam hali sunucudan istenir; eski/tekrar olaylar yok sayılır.
+ * Birleştirilmiş deltalar from_version..version aralığını taşır.
+ */
+function applyMasaDelta(data, apply) {
+    const known = masaVersions[data.masa] || 0;
+    const first = data.from_version || data.version;
+    if (data.version <= known) return;
+    if (first !== known + 1) {
+        console.warn(`⚠️ ${data.masa} sürüm boşluğu (${known} → ${data.version}), yeniden eşitleniyor`);
+        socket.emit('resync_masa', { masa: data.masa });
+        return;
+    }
+    masaVersions[data.masa] = data.version;
+    adisyonlar[data.masa] = apply(adisyonlar[data.masa] || []);
+
+    if (data.masa === currentMasa) {
+        currentItems = adisyonlar[data.masa];
+        currentTotal = data.total !== undefined
+            ? data.total
+            : currentItems.reduce((sum, item) => sum + (item.adet * item.fiyat), 0);
+        updateOrderDisplay();
+    }
+    updateTableButton(data.masa);
+}
+
+function onItemAdded(data) {
+    applyMasaDelta(data, items => {
+        const known = new Set(items.map(i => i.uid));
+        return items.concat((data.items || []).filter(i => !known.has(i.uid)));
+    });
+}
+
+function onItemRemoved(data) {
+    const uids = new Set(data.uids || []);
+    applyMasaDelta(data, items => items.filter(i => !uids.has(i.uid)));
+    if (data.masa === currentMasa && data.reason !== 'payment') {
+        // Index tabanlı seçimler kaymış olabilir
+        selectedItemIndices = [];
+        updateSplitButtons();
+    }
+}
+
+function onItemStatus(data) {
+    const uids = new Set(data.uids || []);
+    applyMasaDelta(data, items => items.map(i => uids.has(i.uid) ? Object.assign({}, i, { durum: data.durum }) : i));
+}
+
 function onPaymentCompleted(data) {
     console.log('💰 Payment completed:', data);
 
-    // Clear adisyon
-    adisyonlar[data.masa] = [];
+    // Clear adisyon (kısmi ödemede kalanlar item_removed ile güncellendi)
+    if (!data.is_partial) {
+        adisyonlar[data.masa] = [];
+    }
 
     // If this is our current masa, clear display ONLY IF NOT partial
     if (data.masa === currentMasa && !data.is_partial) {
@@ -706,7 +820,8 @@ function addItemToOrder(urun, fiyat) {
 }
 
 function removeItemFromOrder(index) {
-    socket.emit('remove_item', { index: index });
+    const item = currentItems[index];
+    socket.emit('remove_item', { index: index, uid: item ? item.uid : undefined });
 }
 
 /**
@@ -1096,6 +1211,10 @@ function finalizeSplitPayment() {
     };
     if (isSelectivePayment) {
         payload.item_indices = selectedItemIndices;
+        // Sunucu uid'leri tercih eder (index'ler başka işlemle kayabilir)
+        payload.item_uids = selectedItemIndices
+            .map(i => currentItems[i] && currentItems[i].uid)
+            .filter(Boolean);
     }
 
     if (systemInfo.pos_enabled && kart > 0) {
@@ -5,8 +5,13 @@ FastFootSatış - Web Server
 Flask tabanlı restoran yönetim sistemi
 """
 
+# Eşzamanlılık modu (FASTFOOT_ASYNC_MODE) diğer tüm importlardan önce seçilir:
+# eventlet/gevent socket, threading ve time modüllerini monkey-patch eder.
+import async_runtime
+ASYNC_MODE = async_runtime.setup()
+
 from flask import Flask, render_template, request, jsonify, send_file
-from flask_socketio import SocketIO, emit
+from flask_socketio import SocketIO, emit, join_room, leave_room, rooms
 import threading
 import time
 import datetime
@@ -28,6 +33,16 @@ import urllib.parse
 from collections import defaultdict
 from integrations import IntegrationManager
 from pos_integration import POSManager
+from adisyon_journal import AdisyonJournal
+from event_aggregator import EventAggregator
+from kitchen_dispatcher import KitchenDispatcher
+from kitchen_engine import KitchenEngine
+from line_lifecycle import LineLifecycle
+from framed_protocol import RecentIds
+from terminal_gateway import TerminalGateway
+from adisyon import Adisyon, AdisyonStore, OrderItem
+from shared_store import SharedStore, SharedJournal
+from customer_cache import normalize_phone
 
 # Database modülünü yükle
 try:
@@ -76,9 +91,39 @@ INTEGRATION_CONFIG = os.path.join(SCRIPT_DIR, "integrations.json")
 SALONS_FILE = os.path.join(SCRIPT_DIR, "salons.json")
 CASHIERS_FILE = os.path.join(SCRIPT_DIR, "cashiers.json")
 KITCHEN_FILE = os.path.join(SCRIPT_DIR, "kitchen.json")
-ACTIVE_ADISYONLAR_FILE = os.path.join(SCRIPT_DIR, "active_adisyonlar.json")
+KITCHEN_STATIONS_FILE = os.path.join(SCRIPT_DIR, "kitchen_stations.json")
+ACTIVE_ADISYONLAR_FILE = os.getenv("FASTFOOT_ADISYON_FILE", os.path.join(SCRIPT_DIR, "active_adisyonlar.json"))
 SERVER_PORT = 5555
 
+# Çok süreçli mod (cluster.py): süreç numarası, ortak durum deposu ve mesaj kuyruğu
+WORKER_ID = os.getenv("FASTFOOT_WORKER_ID")
+SHARED_STORE_PATH = os.getenv("FASTFOOT_SHARED_STORE")
+BROKER_URL = os.getenv("FASTFOOT_BROKER")
+
+# Socket.IO odaları: olaylar sadece ihtiyacı olan istemcilere gider
+ROOM_KITCHEN = 'kitchen'
+ROOM_CASHIER = 'cashier'
+ROOM_WAITER = 'waiter'
+ROOM_PUBLIC = 'public-table'
+CONNECT_ROLES = {
+    'kitchen': ROOM_KITCHEN,
+    'cashier': ROOM_CASHIER,
+    'waiter': ROOM_WAITER,
+    'public': ROOM_PUBLIC
+}
+
+def table_room(masa_adi):
+    """Masaya abone olan (masayı açmış) istemcilerin odası"""
+    return f"masa:{masa_adi}"
+
+def waiter_room(waiter_name):
+    """Garsonun tüm cihazlarının odası (order_ready) - sid değişse de aynı kalır"""
+    return f"garson:{waiter_name}"
+
+def station_room(station):
+    """Tek istasyonu gösteren mutfak ekranlarının odası (?role=kitchen&station=izgara)"""
+    return f"kitchen:{station}"
+
 # Klasörleri oluştur
 if not os.path.exists(FIS_KLASORU):
     os.makedirs(FIS_KLASORU)
@@ -86,12 +131,24 @@ if not os.path.exists(FIS_KLASORU):
 # Flask app setup
 app = Flask(__name__, static_folder='web', static_url_path='')
 app.config['SECRET_KEY'] = 'fastfoot_secret_key_2026'
+socketio_options = {}
+if BROKER_URL:
+    # Yayınlar broker üzerinden diğer süreçlerin istemcilerine de gider
+    from cluster import BrokerManager
+    socketio_options['client_manager'] = BrokerManager(BROKER_URL)
 socketio = SocketIO(app, 
                    cors_allowed_origins="*",
-                   async_mode='threading',
+                   async_mode=ASYNC_MODE,
                    max_http_buffer_size=1000000,
                    ping_timeout=60000,
-                   ping_interval=25000)
+                   ping_interval=25000,
+                   **socketio_options)
+
+if WORKER_ID is not None:
+    # Proxy long-polling isteklerini sid önekine göre bu sürece yönlendirir
+    from cluster import worker_tag
+    _generate_eio_sid = socketio.server.eio.generate_id
+    socketio.server.eio.generate_id = lambda: f"{worker_tag(WORKER_ID)}.{_generate_eio_sid()}"
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -106,16 +163,23 @@ def get_env_int(name, default):
     except Exception:
         return default
 
+_local_ip_cache = {'ip': None, 'at': 0.0}
+LOCAL_IP_TTL_SEC = 60
+
 def get_local_ip():
-    """Yerel IP adresini al"""
+    """Yerel IP adresini al (her bağlantıda UDP soketi açılmasın diye 60 sn önbellekli)"""
+    now = time.time()
+    if _local_ip_cache['ip'] and now - _local_ip_cache['at'] < LOCAL_IP_TTL_SEC:
+        return _local_ip_cache['ip']
     try:
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         s.connect(("8.8.8.8", 80))
         ip = s.getsockname()[0]
         s.close()
-        return ip
     except:
-        return "127.0.0.1"
+        ip = "127.0.0.1"
+    _local_ip_cache.update(ip=ip, at=now)
+    return ip
 
 class RestaurantServer:
     """Ana restoran yönetim sınıfı"""
@@ -144,13 +208,45 @@ class RestaurantServer:
         self.cid_type = 'tcp' # 'tcp' veya 'serial'
         self.cid_serial_port = 'COM3'
         self.cid_enabled = True
+
+        # Legacy mutfak ekranı (mutfak.py): tek kalıcı bağlantı, sınırlı kuyruk
+        self.kitchen_ip = os.getenv("FASTFOOT_KITCHEN_HOST", '127.0.0.1')
+        self.kitchen_port = get_env_int("FASTFOOT_KITCHEN_PORT", 5556)
         
-        # Adisyon durumları
-        self.adisyonlar = {}
+        # Çok süreçli modda adisyonlar ve kilitler tüm süreçlerde ortak depodadır
+        self.shared = SharedStore(SHARED_STORE_PATH) if SHARED_STORE_PATH else None
+
+        # Adisyon durumları (masa -> Adisyon, global uid -> masa haritası)
+        self.adisyonlar = self._new_store()
         self.current_selections = {}  # {sid: masa_adi}
+        # Aynı masaya eşzamanlı iki ödeme alınmasın
+        self.payments_in_progress = self.shared.set('payments') if self.shared else set()
+        if self.shared:
+            self.journal = SharedJournal(self.shared)
+        else:
+            self.journal = AdisyonJournal(
+                ACTIVE_ADISYONLAR_FILE,
+                compact_every=max(1, get_env_int("FASTFOOT_JOURNAL_COMPACT_EVERY", 500)),
+                snapshot_provider=self.serialize_adisyonlar,
+                flush_interval=max(0, get_env_int("FASTFOOT_PERSIST_INTERVAL_MS", 50)) / 1000.0
+            )
+        # Giden olay birleştirici (masa deltaları, mutfak satırları) ve
+        # yeniden bağlananlar için son olayların halka tamponu
+        self.events = EventAggregator(
+            socketio.emit,
+            window=max(0, get_env_int("FASTFOOT_EMIT_WINDOW_MS", 30)) / 1000.0,
+            replay_size=max(1, get_env_int("FASTFOOT_REPLAY_BUFFER", 1000))
+        )
         
         # Menu
         self.menu_data = {}
+        # initial_data bölümleri (menu/system): sürüm + önceden serileştirilmiş JSON
+        self._section_boot = os.getenv("FASTFOOT_CLUSTER_BOOT") or format(int(time.time()), 'x')
+        self._section_versions = {'menu': 0, 'system': 0}
+        if self.shared:
+            self._section_versions = {name: self.shared.counter(f"section:{name}") for name in self._section_versions}
+        self._section_cache = {}
+        self._section_lock = threading.Lock()
         
         # Garsonlar ve Kasiyerler
         self.waiters = [] # [{"name": "Ahmet", "pin": "1234"}]
@@ -161,15 +257,30 @@ class RestaurantServer:
         self.active_connections = {}
         self.waiter_sessions = defaultdict(set) # waiter_name -> set(sids)
         
-        # Terminal sunucusu
-        self.terminal_thread = None
+        # Terminal (5555) ve TCP Caller ID bağlantıları tek asyncio ağ geçidinde;
+        # siparişler sınırlı kuyrukla işçilere aktarılır
         self.running = False
+        self.terminal_recent_ids = RecentIds(max(1, get_env_int("FASTFOOT_TERMINAL_RECENT_IDS", 5000)))
+        self.terminal_idle_timeout = max(1, get_env_int("FASTFOOT_TERMINAL_IDLE_SEC", 300))
+        self.gateway = TerminalGateway(
+            max_connections=get_env_int("FASTFOOT_GATEWAY_MAX_CONNECTIONS", 500),
+            read_timeout=self.terminal_idle_timeout,
+            queue_size=get_env_int("FASTFOOT_GATEWAY_QUEUE", 1000),
+            workers=get_env_int("FASTFOOT_GATEWAY_WORKERS", 4),
+            spawn=socketio.start_background_task
+        )
 
         # Public QR sipariş güvenlik durumu (DB'siz fallback, runtime memory)
         self.qr_secret = os.getenv("FASTFOOT_QR_SECRET", app.config['SECRET_KEY'])
-        self.public_sessions = {}      # session_id -> session_info
-        self.public_nonce_store = {}   # nonce -> nonce_info
-        self.public_rate_limit = defaultdict(list)  # session_id -> [timestamps]
+        if self.shared:
+            # QR ile açılan oturum başka bir süreçte doğrulanabilir
+            self.public_sessions = self.shared.map('public_sessions')
+            self.public_nonce_store = self.shared.map('public_nonces')
+            self.public_rate_limit = self.shared.map('public_rate_limit')
+        else:
+            self.public_sessions = {}      # session_id -> session_info
+            self.public_nonce_store = {}   # nonce -> nonce_info
+            self.public_rate_limit = defaultdict(list)  # session_id -> [timestamps]
         # verify_mode ve online_orders_enabled load_settings() içinde set edilecek
         self.verify_mode = "hybrid"  # load_settings() ile override edilecek
         self.online_orders_enabled = True  # load_settings() ile override edilecek
@@ -196,7 +307,42 @@ class RestaurantServer:
         self.load_kitchen()
         self.refresh_adisyonlar()
         self.load_active_adisyonlar() # Aktif adisyonları geri yükle
+        self.journal.start() # Toplu yazan persister thread'i
+        self.events.start()
+        self.kitchen_dispatcher = KitchenDispatcher(
+            self.kitchen_ip, self.kitchen_port,
+            max_queue=max(1, get_env_int("FASTFOOT_KITCHEN_QUEUE", 500)),
+            batch_window=max(0, get_env_int("FASTFOOT_KITCHEN_BATCH_MS", 50)) / 1000.0
+        )
+        self.kitchen_dispatcher.start()
+        # Mutfak istasyonları (menü kategorisi -> istasyon) ve öncelikli fiş kuyruğu
+        kitchen_max_age = max(1, get_env_int("FASTFOOT_KITCHEN_MAX_AGE_MIN", 240)) * 60
+        self.kitchen_engine = KitchenEngine(self.load_kitchen_stations(), max_age=kitchen_max_age)
+        # Satır aşama zamanları (siparis_zamanlari), p50/p95 hazırlanma süresi ve p95 uyarısı
+        self.lifecycle = LineLifecycle(
+            db if USE_DATABASE else None,
+            window=max(1, get_env_int("FASTFOOT_PREP_WINDOW_MIN", 60)) * 60,
+            threshold=max(1, get_env_int("FASTFOOT_PREP_P95_ALERT_SEC", 900)),
+            min_samples=get_env_int("FASTFOOT_PREP_ALERT_MIN_SAMPLES", 5),
+            max_age=kitchen_max_age,
+            on_alert=self.emit_kitchen_alert
+        )
+        if self.shared:
+            self.shared.on_record = self.apply_kitchen_record
+        if USE_DATABASE:
+            # Caller ID profili: normalize telefon -> cari, bakiye, son siparişler
+            db.customer_cache.configure(
+                maxsize=get_env_int("FASTFOOT_CID_CACHE_SIZE", 1000),
+                ttl=max(0, get_env_int("FASTFOOT_CID_CACHE_TTL_SEC", 60))
+            )
+            socketio.start_background_task(self._partition_maintenance_loop)
         self.load_menu_data()
+        self.kitchen_engine.set_menu(self.menu_data)
+        self.seed_kitchen_engine()
+        self.lifecycle.start()
+        self._staff_version = self.shared.counter('staff') if self.shared else 0
+        if self.shared:
+            socketio.start_background_task(self._shared_sync_loop)
         
         # Sid -> Kasa ID haritalaması (Vardiya işlemleri için)
         self.sid_kasa_map = {} # {sid: kasa_id}
@@ -321,7 +467,10 @@ class RestaurantServer:
             return None, err
 
         nonce = payload['nonce']
-        self.public_nonce_store[nonce]['used_at'] = int(time.time())
+        nonce_data = self.public_nonce_store.get(nonce)
+        if nonce_data is not None:
+            # Değer yeniden atanır (ortak depoda iç içe değişiklik kalıcı olmaz)
+            self.public_nonce_store[nonce] = dict(nonce_data, used_at=int(time.time()))
         if USE_DATABASE:
             try:
                 db.mark_public_nonce_used(nonce)
@@ -451,9 +600,9 @@ class RestaurantServer:
                 db.revoke_public_sessions_for_table(table_name)
             except Exception as e:
                 logger.error(f"Public session table revoke DB hatası: {e}")
-        for session in self.public_sessions.values():
+        for session_id, session in list(self.public_sessions.items()):
             if session.get('table_name') == table_name and session.get('status') == 'active':
-                session['status'] = 'revoked'
+                self.public_sessions[session_id] = dict(session, status='revoked')
 
     def revoke_public_sessions_for_shift(self, shift_id):
         if USE_DATABASE:
@@ -461,48 +610,213 @@ class RestaurantServer:
                 db.revoke_public_sessions_for_shift(shift_id)
             except Exception as e:
                 logger.error(f"Public session shift revoke DB hatası: {e}")
-        for session in self.public_sessions.values():
+        for session_id, session in list(self.public_sessions.items()):
             if session.get('shift_id') == shift_id and session.get('status') == 'active':
-                session['status'] = 'revoked'
+                self.public_sessions[session_id] = dict(session, status='revoked')
 
-    def add_order_item(self, masa_adi, urun, fiyat, garson='Bilinmiyor', adet=1, not_bilgisi=''):
-        if masa_adi not in self.adisyonlar:
-            return None
+    # ==================== MASA DELTA OLAYLARI ====================
+    # Her değişiklik masanın tamamı yerine sadece değişen satırları yayınlar.
+    # version her olayda bir artar; istemci boşluk görürse resync_masa ister.
+    # Sürüm sırası yayın sırasıyla aynı kalsın diye adisyon kilidi altında çağrılır.
 
-        siparis_id = str(uuid.uuid4())[:8]
-        siparis = {
-            'uid': siparis_id,
-            'urun': urun,
-            'adet': int(adet),
-            'fiyat': float(fiyat),
-            'tip': 'normal',
-            'garson': garson,
-            'not': not_bilgisi,
-            'durum': 'mutfakta',
-            'saat': datetime.datetime.now().strftime("%H:%M:%S")
-        }
-        self.adisyonlar[masa_adi].append(siparis)
-        self.save_active_adisyonlar()
+    def masa_state(self, masa_adi, adisyon):
+        """Masanın tam hali (masa_selected / resync cevabı)"""
+        with adisyon.reading():
+            return {
+                'masa': masa_adi,
+                'items': adisyon.to_list(),
+                'total': adisyon.total,
+                'version': adisyon.version
+            }
 
-        items = self.adisyonlar[masa_adi]
-        total = sum(item['adet'] * item['fiyat'] for item in items)
-        socketio.emit('masa_update', {
+    def snapshot_adisyonlar(self):
+        """initial_data için ({masa: [kalem]}, {masa: sürüm}) - her masa kendi kilidi altında"""
+        adisyonlar, versions = {}, {}
+        with self.adisyonlar.reading():  # Çok süreçli modda liste de güncel olsun
+            tables = list(self.adisyonlar.items())
+        for masa, adisyon in tables:
+            with adisyon.reading():
+                adisyonlar[masa] = adisyon.to_list()
+                versions[masa] = adisyon.version
+        return adisyonlar, versions
+
+    def emit_items_added(self, masa_adi, adisyon, items, source=None):
+        payload = {
             'masa': masa_adi,
-            'items': items,
-            'total': total
-        })
-        socketio.emit('kitchen_new_order', {
-            'uid': siparis_id,
+            'version': adisyon.bump_version(),
+            'items': [item.to_dict() for item in items],
+            'total': adisyon.total
+        }
+        if source:
+            payload['source'] = source
+        rooms = [table_room(masa_adi), ROOM_CASHIER]
+        if source == 'transfer':
+            # Taşınan satırlar mutfak kartında yer değiştirir
+            rooms += [ROOM_KITCHEN] + self.kitchen_rooms(items)
+        self.events.emit('item_added', payload, to=rooms, stream=masa_adi,
+                         merge_key=('item_added', source))
+
+    def emit_items_removed(self, masa_adi, adisyon, items, reason):
+        """reason: cancel / remove / payment / transfer"""
+        self.events.emit('item_removed', {
             'masa': masa_adi,
+            'version': adisyon.bump_version(),
+            'uids': [item.uid for item in items],
+            'reason': reason,
+            'total': adisyon.total
+        }, to=[table_room(masa_adi), ROOM_CASHIER, ROOM_KITCHEN] + self.kitchen_rooms(items), stream=masa_adi,
+            merge_key=('item_removed', reason))
+
+    def emit_item_status(self, masa_adi, adisyon, items, durum):
+        self.events.emit('item_status', {
+            'masa': masa_adi,
+            'version': adisyon.bump_version(),
+            'uids': [item.uid for item in items],
+            'durum': durum
+        }, to=[table_room(masa_adi), ROOM_CASHIER, ROOM_KITCHEN] + self.kitchen_rooms(items), stream=masa_adi,
+            merge_key=('item_status', durum))
+
+    def kitchen_rooms(self, items):
+        """Satırların istasyon odaları. İstasyon satırın üzerinde (günlükte) durur:
+        satırı başka süreç yönlendirmiş olsa da oda bulunur."""
+        stations = {item.istasyon for item in items if item.istasyon}
+        legacy = [item.uid for item in items if not item.istasyon]  # İstasyonsuz eski kayıtlar
+        if legacy:
+            stations.update(self.kitchen_engine.stations_for(legacy))
+        return [station_room(station) for station in sorted(stations)]
+
+    def emit_kitchen_alert(self, alert):
+        """İstasyon p95 hazırlanma süresi eşiği aştı (active) / normale döndü"""
+        rooms = [ROOM_CASHIER, ROOM_KITCHEN]
+        if alert.get('station'):
+            rooms.append(station_room(alert['station']))
+        self.events.emit('kitchen_sla_alert', alert, to=rooms)
+
+    def emit_kitchen_orders(self, masa_adi, items, terminal_id, routed=None):
+        """
+        Mutfak satırları istasyon başına; pencere içindeki satırlar istasyon
+        başına tek kitchen_new_orders olayında gider. Tüm mutfak ekranı
+        (ROOM_KITCHEN) hepsini, istasyon ekranı sadece kendi satırlarını alır.
+        routed: kitchen_engine.submit() sonucu (istasyon, hedef süre)
+        """
+        routed = routed or {}
+        by_station = {}
+        for item in items:
+            route = routed.get(item.uid, {})
+            by_station.setdefault(route.get('station'), []).append({
+                'uid': item.uid,
+                'masa': masa_adi,
+                'urun': item.urun,
+                'adet': item.adet,
+                'not': item.not_bilgisi or '',
+                'saat': item.saat,
+                'garson': item.garson,
+                'terminal_id': terminal_id,
+                'station': route.get('station'),
+                'due': route.get('due'),
+                'sla': route.get('sla', False)
+            })
+        for station, orders in by_station.items():
+            rooms = [ROOM_KITCHEN, station_room(station)] if station else ROOM_KITCHEN
+            self.events.emit('kitchen_new_orders', {'orders': orders}, to=rooms,
+                             stream=f'@kitchen:{station}', merge_key=('kitchen_new_orders',))
+
+    # ==================== SİPARİŞ ALIMI ====================
+
+    @staticmethod
+    def validate_order_lines(lines, skip_invalid=False):
+        """
+        Sipariş satırlarını doğrula ve normalize et.
+        Satır: {'urun', 'fiyat', 'adet'=1, 'tip'='normal', 'not'='', 'garson'}
+        skip_invalid False ise hatalı ilk satırda ValueError fırlatır.
+        """
+        valid = []
+        for n, line in enumerate(lines or [], 1):
+            try:
+                urun = (line.get('urun') or '').strip()
+                fiyat = float(line.get('fiyat', 0))
+                adet = int(line.get('adet', 1))
+                if not urun:
+                    raise ValueError("ürün adı boş")
+                if fiyat < 0:
+                    raise ValueError("fiyat negatif")
+                if adet <= 0:
+                    raise ValueError("adet geçersiz")
+            except (ValueError, TypeError, AttributeError) as e:
+                if skip_invalid:
+                    continue
+                raise ValueError(f"Satır {n}: {e}")
+            valid.append({
+                'urun': urun,
+                'fiyat': fiyat,
+                'adet': adet,
+                'tip': line.get('tip') or 'normal',
+                'not': (line.get('not') or '').strip(),
+                'garson': line.get('garson')
+            })
+        return valid
+
+    @classmethod
+    def unit_lines(cls, raw_items, max_items, max_qty):
+        """Müşteri siparişini (online/QR) tek adetlik satırlara aç; geçersiz kalemler atlanır"""
+        lines = []
+        for line in cls.validate_order_lines(raw_items[:max_items], skip_invalid=True):
+            adet = min(line['adet'], max_qty)
+            lines.extend(dict(line, adet=1) for _ in range(adet))
+        return lines
+
+    def add_order_items(self, masa_adi, lines, garson='Bilinmiyor', terminal_id=None, source=None,
+                        skip_invalid=False):
+        """
+        Toplu sipariş: satırlar doğrulanır, adisyona tek kilit altında eklenir,
+        günlüğe tek kayıt yazılır, tek item_added yayınlanır ve mutfağa tek
+        (gruplanmış) fiş gider. Masa yoksa None, geçerli satır yoksa [] döner.
+        """
+        if masa_adi not in self.adisyonlar:
+            return None
+        lines = self.validate_order_lines(lines, skip_invalid=skip_invalid)
+        if not lines:
+            return []
+
+        saat = datetime.datetime.now().strftime("%H:%M:%S")
+        items = [OrderItem(
+            uid=str(uuid.uuid4())[:8],
+            urun=line['urun'],
+            adet=line['adet'],
+            fiyat=line['fiyat'],
+            tip=line['tip'],
+            garson=line['garson'] or garson,
+            not_bilgisi=line['not'],
+            durum='mutfakta',
+            saat=saat,
+            istasyon=self.kitchen_engine.station_for(line['urun'])
+        ) for line in lines]
+
+        adisyon = self.adisyonlar[masa_adi]
+        with adisyon.lock:
+            # Günlük sırası bellekteki sırayla aynı kalsın (taşıma/ödeme ile yarışmaz)
+            adisyon.extend(items)
+            if len(items) == 1:
+                self.journal.log_add(masa_adi, items[0].to_dict())
+            else:
+                self.journal.log_add_many(masa_adi, [item.to_dict() for item in items])
+            self.emit_items_added(masa_adi, adisyon, items, source=source)
+
+        routed = self.kitchen_engine.submit(masa_adi, items, source=source)
+        self.lifecycle.track(masa_adi, items, routed, source=source)
+        self.emit_kitchen_orders(masa_adi, items, terminal_id or f"public:{masa_adi}", routed)
+        self.send_lines_to_kitchen_legacy(masa_adi, items)
+        return items
+
+    def add_order_item(self, masa_adi, urun, fiyat, garson='Bilinmiyor', adet=1, not_bilgisi=''):
+        """Tek satırlık sipariş (add_order_items kısayolu)"""
+        items = self.add_order_items(masa_adi, [{
             'urun': urun,
-            'adet': int(adet),
-            'not': not_bilgisi,
-            'saat': siparis['saat'],
-            'garson': garson,
-            'terminal_id': f"public:{masa_adi}"
-        })
-        self.send_to_kitchen_legacy(masa_adi, f"{urun} ({not_bilgisi})" if not_bilgisi else urun, int(adet))
-        return siparis
+            'fiyat': fiyat,
+            'adet': adet,
+            'not': not_bilgisi
+        }], garson=garson, skip_invalid=True)
+        return items[0] if items else None
     
     def load_settings(self):
         """Ayarları dosyadan yükle"""
@@ -596,11 +910,58 @@ class RestaurantServer:
                 f.write(f"va_rate_limit:{self.va_rate_limit}\n")
                 f.write(f"va_sms_verify:{'EVET' if self.va_sms_verify else 'HAYIR'}\n")
                 f.write(f"va_kitchen_approval:{'EVET' if self.va_kitchen_approval else 'HAYIR'}\n")
+            self.invalidate_section('system')
             return True
         except Exception as e:
             logger.error(f"Ayar kaydetme hatası: {e}")
             return False
 
+    # ==================== INITIAL_DATA ÖNBELLEĞİ ====================
+
+    def invalidate_section(self, name):
+        """Menü/sistem bilgisi değişti: sürümü artır, serileştirilmiş hali at"""
+        with self._section_lock:
+            if self.shared:
+                # Sürüm ortak sayaçtır: diğer süreçler değişikliği görüp yeniden yükler
+                self._section_versions[name] = self.shared.bump(f"section:{name}")
+            else:
+                self._section_versions[name] += 1
+            self._section_cache.pop(name, None)
+
+    def get_section(self, name):
+        """(sürüm, JSON bytes) - ilk istekte serileştirilir, invalidate'e kadar saklanır"""
+        with self._section_lock:
+            cached = self._section_cache.get(name)
+            if name == 'system' and cached is not None and cached[2] != get_local_ip():
+                cached = None  # IP değişti
+            if cached is None:
+                data = self.menu_data if name == 'menu' else self.get_system_info()
+                version = f"{self._section_boot}.{self._section_versions[name]}"
+                body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                cached = (version, body, get_local_ip() if name == 'system' else None)
+                self._section_cache[name] = cached
+            return cached[0], cached[1]
+
+    def build_initial_data(self, known=None, skip=()):
+        """
+        initial_data yükü. menu/system bölümleri bytes (binary ek) olarak gider;
+        istemcinin elindeki sürüm (known['menu_version'] ...) güncelse veya
+        bölüm istenmiyorsa (skip) sadece sürümü gönderilir. skip'te
+        'adisyonlar' varsa masa snapshot'ı eklenmez (olay tekrarı ile bağlanma).
+        """
+        known = known or {}
+        # Sıra numarası snapshot'tan önce okunur: event_seq'e kadarki olaylar
+        # snapshot'ta vardır, sonrakiler istemciye canlı ulaşır.
+        payload = {'event_seq': self.events.seq, 'seq_epoch': self.events.epoch}
+        for name in ('menu', 'system'):
+            version, body = self.get_section(name)
+            payload[f'{name}_version'] = version
+            if name not in skip and known.get(f'{name}_version') != version:
+                payload[name] = body
+        if 'adisyonlar' not in skip:
+            payload['adisyonlar'], payload['adisyon_versions'] = self.snapshot_adisyonlar()
+        return payload
+
     def get_system_info(self):
         """Sistem bilgilerini döndür"""
         return {
@@ -668,6 +1029,7 @@ class RestaurantServer:
             with open(WAITERS_FILE, "w", encoding="utf-8") as f:
                 json.dump(self.waiters, f, ensure_ascii=False, indent=2)
             logger.info("✓ Garsonlar kaydedildi")
+            self.staff_changed()
             return True
         except Exception as e:
             logger.error(f"Garson kaydetme hatası: {e}")
@@ -692,6 +1054,7 @@ class RestaurantServer:
             with open(CASHIERS_FILE, "w", encoding="utf-8") as f:
                 json.dump(self.cashiers, f, ensure_ascii=False, indent=2)
             logger.info("✓ Kasiyerler kaydedildi")
+            self.staff_changed()
             return True
         except Exception as e:
             logger.error(f"Kasiyer kaydetme hatası: {e}")
@@ -716,37 +1079,33 @@ class RestaurantServer:
             with open(KITCHEN_FILE, "w", encoding="utf-8") as f:
                 json.dump(self.kitchen, f, ensure_ascii=False, indent=2)
             logger.info("✓ Mutfak personeli kaydedildi")
+            self.staff_changed()
             return True
         except Exception as e:
             logger.error(f"Mutfak personeli kaydetme hatası: {e}")
             return False
             
+    def staff_changed(self):
+        """Personel listesi değişti (çok süreçli modda diğer süreçler yeniden yükler)"""
+        if self.shared:
+            self._staff_version = self.shared.bump('staff')
+
     def send_to_kitchen_legacy(self, masa_adi, urun_adi, adet=1):
-        """Mevcut mutfak.py (port 5556) sistemine sipariş gönderir"""
-        def task():
-            try:
-                kitchen_ip = getattr(self, 'kitchen_ip', '127.0.0.1')
-                kitchen_port = getattr(self, 'kitchen_port', 5556)
-                
-                client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                client.settimeout(3)
-                client.connect((kitchen_ip, kitchen_port))
-                
-                payload = {
-                    "islem": "yeni_siparis",
-                    "masa": masa_adi,
-                    "siparisler": [{"urun": urun_adi, "adet": adet}],
-                    "saat": datetime.datetime.now().strftime("%H:%M:%S"),
-                    "terminal": self.terminal_id
-                }
-                
-                client.send(json.dumps(payload).encode('utf-8'))
-                client.close()
-                logger.info(f"👨‍🍳 Legacy Mutfak onayladı: {urun_adi} -> {masa_adi}")
-            except Exception as e:
-                logger.error(f"⚠ Legacy Mutfak ekranına bağlanılamadı: {e}")
-                
-        threading.Thread(target=task, daemon=True).start()
+        """Mevcut mutfak.py (port 5556) sistemine tek satır gönderir"""
+        self._send_kitchen_ticket(masa_adi, [{"urun": urun_adi, "adet": adet}])
+
+    def send_lines_to_kitchen_legacy(self, masa_adi, items):
+        """Sipariş satırlarını aynı ürün/not bazında gruplayıp mutfak.py'ye tek fiş olarak gönder"""
+        grouped = {}
+        for item in items:
+            urun_adi = f"{item.urun} ({item.not_bilgisi})" if item.not_bilgisi else item.urun
+            grouped[urun_adi] = grouped.get(urun_adi, 0) + int(item.adet)
+        if grouped:
+            self._send_kitchen_ticket(masa_adi, [{"urun": u, "adet": a} for u, a in grouped.items()])
+
+    def _send_kitchen_ticket(self, masa_adi, siparisler):
+        """Fişi mutfak göndericisinin kuyruğuna ekle (aynı masanın satırları tek mesajda gider)"""
+        self.kitchen_dispatcher.submit(masa_adi, siparisler, terminal=self.terminal_id)
 
     def load_salons(self):
         """Salon listesini yükle"""
@@ -761,52 +1120,183 @@ class RestaurantServer:
         else:
             self.salons = []
 
+    def _new_store(self):
+        """Boş adisyon deposu (çok süreçli modda ortak kilit ve ad ayırma kümesiyle)"""
+        if not self.shared:
+            return AdisyonStore()
+        store = AdisyonStore(lock=self.shared.lock, reserved=self.shared.set('reserved'))
+        self.shared.attach(store)
+        return store
+
     def refresh_adisyonlar(self):
-        """Masa/paket yapısını yeniden oluştur"""
-        self.adisyonlar = {}
-        
-        # Salon masaları
-        if self.salons:
-            for salon in self.salons:
-                for table in salon.get('tables', []):
-                    self.adisyonlar[table] = []
-        elif self.masa_sayisi > 0:
-            for i in range(1, self.masa_sayisi + 1):
-                self.adisyonlar[f"Masa {i}"] = []
-                
-        # Paketler
-        if self.paket_sayisi > 0:
-            for i in range(1, self.paket_sayisi + 1):
-                self.adisyonlar[f"Paket {i}"] = []
-        
-        if not self.adisyonlar:
-            self.adisyonlar["Genel"] = []
-        
+        """Masa/paket yapısını yeniden oluştur (açık adisyonlar korunur)"""
+        old = self.adisyonlar
+        with old.lock:
+            store = self._new_store()
+
+            def add(masa):
+                # Mevcut adisyon nesnesi aynen taşınır: kalemleri ve sürümü kaybolmaz
+                adisyon = old.get(masa)
+                store[masa] = adisyon if adisyon is not None else Adisyon()
+
+            # Salon masaları
+            if self.salons:
+                for salon in self.salons:
+                    for table in salon.get('tables', []):
+                        add(table)
+            elif self.masa_sayisi > 0:
+                for i in range(1, self.masa_sayisi + 1):
+                    add(f"Masa {i}")
+
+            # Paketler
+            if self.paket_sayisi > 0:
+                for i in range(1, self.paket_sayisi + 1):
+                    add(f"Paket {i}")
+
+            # Yapıdan çıkan ama açık kalemi bulunan adisyonlar ödenene kadar
+            # korunur (load_active_adisyonlar ile aynı kural)
+            for masa, adisyon in list(old.items()):
+                if masa not in store and adisyon.items:
+                    store[masa] = adisyon
+
+            if not store:
+                store["Genel"] = Adisyon()
+
+            self.adisyonlar = store
         logger.info(f"✓ {len(self.adisyonlar)} adisyon alanı oluşturuldu")
 
+    def serialize_adisyonlar(self):
+        """Tüm adisyonları JSON formatında ({masa: [kalem dict]}) döndür"""
+        return {masa: adisyon.to_list() for masa, adisyon in list(self.adisyonlar.items())}
+
     def save_active_adisyonlar(self):
-        """Aktif adisyonları dosyaya kaydet"""
+        """Aktif adisyonların tam snapshot'ını yaz ve günlüğü sıfırla"""
         try:
-            with open(ACTIVE_ADISYONLAR_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.adisyonlar, f, ensure_ascii=False, indent=2)
-            return True
+            return self.journal.compact(self.serialize_adisyonlar())
         except Exception as e:
             logger.error(f"Adisyon kaydetme hatası: {e}")
             return False
 
     def load_active_adisyonlar(self):
-        """Aktif adisyonları dosyadan yükle"""
-        if os.path.exists(ACTIVE_ADISYONLAR_FILE):
+        """Aktif adisyonları snapshot + değişiklik günlüğünden geri yükle"""
+        try:
+            loaded_adisyonlar = self.journal.load()
+        except Exception as e:
+            logger.error(f"Adisyon yükleme hatası: {e}")
+            return
+
+        # Mevcut masaları/paketleri güncelle (yapı değişmiş olabilir).
+        # Yapıda olmayan ama açık kalemi bulunan adisyonlar (Online, platform)
+        # ödenmemiş sipariş olduğu için korunur.
+        for masa, items in loaded_adisyonlar.items():
+            if masa in self.adisyonlar or items:
+                for item in items:
+                    # Eski kayıtlarda uid olmayabilir; iptal/ödeme uid ile günlüğe yazılır
+                    item.setdefault('uid', str(uuid.uuid4())[:8])
+                adisyon = Adisyon.from_list(items)
+                # Snapshot sonrası kayıt sayısı: canlı süreçlerdeki masa sürümüyle aynı
+                adisyon.version = self.journal.versions.get(masa, 0)
+                self.adisyonlar[masa] = adisyon
+
+        # Oynatılan günlüğü yeni snapshot'a katla
+        if self.journal.entries_since_snapshot:
+            self.save_active_adisyonlar()
+        logger.info("✓ Aktif adisyonlar geri yüklendi")
+
+    def load_kitchen_stations(self):
+        """Mutfak istasyonu ayarları (yoksa varsayılan: ızgara / soğuk / içecek)"""
+        if not os.path.exists(KITCHEN_STATIONS_FILE):
+            return {}
+        try:
+            with open(KITCHEN_STATIONS_FILE, "r", encoding="utf-8") as f:
+                config = json.load(f)
+            logger.info(f"✓ {len(config.get('stations') or {})} mutfak istasyonu yüklendi")
+            return config
+        except Exception as e:
+            logger.error(f"Mutfak istasyonu yükleme hatası: {e}")
+            return {}
+
+    def seed_kitchen_engine(self):
+        """Yeniden başlatmada hazır olmayan satırları kuyruğa geri koy (saat bugüne göre)"""
+        now = datetime.datetime.now()
+        adisyonlar, _ = self.snapshot_adisyonlar()
+        for masa, items in adisyonlar.items():
+            by_saat = defaultdict(list)
+            for item in items:
+                if item.get('durum') != 'hazir':
+                    by_saat[item.get('saat')].append(item)
+            for saat, lines in by_saat.items():
+                try:
+                    created = datetime.datetime.combine(
+                        now.date(), datetime.datetime.strptime(saat, "%H:%M:%S").time())
+                    if created > now:  # Gece yarısından önce girilmiş
+                        created -= datetime.timedelta(days=1)
+                except (TypeError, ValueError):
+                    created = now
+                routed = self.kitchen_engine.submit(masa, lines, now=created.timestamp())
+                self.lifecycle.restore(masa, lines, routed, created=created.timestamp())
+
+    def apply_kitchen_record(self, record):
+        """Çok süreçli mod: başka süreçte hazır/iptal/taşınan satırlar bu sürecin
+        mutfak kuyruğunda ve hazırlanma sürelerinde de kapanır (fiş ve bekleyen
+        satır max_age'e kadar asılı kalmaz). Veri tabanı zamanlarını kaydı yazan
+        süreç işler; burada sadece bu süreçte izlenen satırlar işaretlenir."""
+        op, uids = record.get('op'), record.get('uids') or []
+        if op == 'status' and record.get('durum') == 'hazir':
+            self.kitchen_engine.complete(uids)
+            self.lifecycle.mark(uids, 'ready', unknown=False)
+        elif op == 'remove' and record.get('reason') in ('cancel', 'remove'):
+            self.kitchen_engine.discard(uids)
+            self.lifecycle.mark(uids, 'cancelled', unknown=False)
+        elif op == 'remove':
+            self.lifecycle.mark(uids, 'paid', unknown=False)
+        elif op == 'move':
+            self.kitchen_engine.move(uids, record['target'])
+
+    def _shared_sync_loop(self):
+        """Çok süreçli mod: diğer süreçlerin adisyon ve ayar değişikliklerini uygula"""
+        interval = max(10, get_env_int("FASTFOOT_SHARED_SYNC_MS", 100)) / 1000.0
+        while True:
+            try:
+                self.sync_shared_state()
+            except Exception as e:
+                logger.error(f"Ortak durum eşitleme hatası: {e}")
+            socketio.sleep(interval)
+
+    def _partition_maintenance_loop(self):
+        """Günde bir: gelecek ayların satislar/cari_hareketler bölümlerini aç, eskileri arşivle"""
+        ahead = max(1, get_env_int("FASTFOOT_PARTITION_AHEAD_MONTHS", 3))
+        retention = max(0, get_env_int("FASTFOOT_SALES_RETENTION_MONTHS", 0))
+        archive_dir = os.getenv("FASTFOOT_ARCHIVE_DIR", os.path.join(SCRIPT_DIR, "arsiv"))
+        while True:
             try:
-                with open(ACTIVE_ADISYONLAR_FILE, "r", encoding="utf-8") as f:
-                    loaded_adisyonlar = json.load(f)
-                    # Sadece mevcut masaları/paketleri güncelle (yapı değişmiş olabilir)
-                    for masa, items in loaded_adisyonlar.items():
-                        if masa in self.adisyonlar:
-                            self.adisyonlar[masa] = items
-                logger.info("✓ Aktif adisyonlar geri yüklendi")
+                db.maintain_partitions(ahead, retention, archive_dir)
             except Exception as e:
-                logger.error(f"Adisyon yükleme hatası: {e}")
+                logger.error(f"Bölüm bakımı hatası: {e}")
+            socketio.sleep(24 * 3600)
+
+    def sync_shared_state(self):
+        # Kilit almayan okumalar (masa var mı?) için adisyonları güncel tut
+        self.shared.catch_up()
+        for name in ('menu', 'system'):
+            version = self.shared.counter(f"section:{name}")
+            if version == self._section_versions[name]:
+                continue
+            if name == 'menu':
+                self.load_menu_data()
+                self.kitchen_engine.set_menu(self.menu_data)
+            else:
+                self.load_settings()
+                self.load_salons()
+            with self._section_lock:
+                self._section_versions[name] = version
+                self._section_cache.pop(name, None)
+        staff_version = self.shared.counter('staff')
+        if staff_version != self._staff_version:
+            self._staff_version = staff_version
+            self.load_waiters()
+            self.load_cashiers()
+            self.load_kitchen()
     
     def load_menu_data(self):
         """Menüyü yükle - DB'den veya dosyadan"""
@@ -866,74 +1356,32 @@ class RestaurantServer:
         return sira
     
     def start_terminal_server(self):
-        """Terminal sunucusunu başlat"""
-        def run_server():
-            try:
-                server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                server.bind(('0.0.0.0', SERVER_PORT))
-                server.listen(10)
-                logger.info(f"📡 Terminal sunucusu başladı: {get_local_ip()}:{SERVER_PORT}")
-                
-                while self.running:
-                    try:
-                        client_sock, addr = server.accept()
-                        threading.Thread(target=self.handle_terminal_data, 
-                                       args=(client_sock,), daemon=True).start()
-                    except:
-                        break
-            except Exception as e:
-                logger.error(f"Terminal sunucu hatası: {e}")
-        
+        """Terminal sunucusunu (5555) ağ geçidinde başlat"""
         self.running = True
-        self.terminal_thread = threading.Thread(target=run_server, daemon=True)
-        self.terminal_thread.start()
-    
-    def handle_terminal_data(self, client_sock):
-        """Terminal verilerini işle"""
-        try:
-            raw_data = client_sock.recv(4096).decode('utf-8')
-            if not raw_data:
-                return
-            
-            data = json.loads(raw_data)
-            masa_adi = data.get("masa")
-            yeni_urunler = data.get("siparisler", [])
-            terminal_adi = data.get("terminal", "Bilinmeyen")
-            
-            if masa_adi in self.adisyonlar:
-                for item in yeni_urunler:
-                    siparis_obj = {
-                        "urun": item['urun'],
-                        "adet": 1,
-                        "fiyat": float(item['fiyat']),
-                        "tip": "normal"
-                    }
-                    self.adisyonlar[masa_adi].append(siparis_obj)
-                
-                # Tüm bağlantılara bildir
-                socketio.emit('masa_update', {
-                    'masa': masa_adi,
-                    'items': self.adisyonlar[masa_adi],
-                    'source': 'terminal'
-                })
-                
-                # Mutfak bildirimi
-                for item in yeni_urunler:
-                    socketio.emit('kitchen_new_order', {
-                        'masa': masa_adi,
-                        'urun': item['urun'],
-                        'adet': 1,
-                        'saat': datetime.datetime.now().strftime("%H:%M:%S"),
-                        'terminal_id': f"TCP:{terminal_adi}"
-                    })
-                    self.send_to_kitchen_legacy(masa_adi, item['urun'], 1)
-                
-                logger.info(f"📲 Terminal siparişi: {terminal_adi} → {masa_adi}")
-        except Exception as e:
-            logger.error(f"Terminal veri hatası: {e}")
-        finally:
-            client_sock.close()
+        self.gateway.listen('terminal', SERVER_PORT, self.handle_terminal_message,
+                            recent=self.terminal_recent_ids)
+        self.gateway.start()
+        logger.info(f"📡 Terminal sunucusu başladı: {get_local_ip()}:{SERVER_PORT}")
+
+    def handle_terminal_message(self, data):
+        """Tek terminal siparişi: {"masa", "siparisler": [{"urun", "fiyat"}], "terminal"}"""
+        masa_adi = data.get("masa")
+        yeni_urunler = data.get("siparisler", [])
+        terminal_adi = data.get("terminal", "Bilinmeyen")
+
+        # Terminal her ürünü tek adet olarak gönderir
+        eklenenler = self.add_order_items(
+            masa_adi,
+            [{'urun': item.get('urun'), 'fiyat': item.get('fiyat', 0), 'adet': 1} for item in yeni_urunler],
+            garson=terminal_adi,
+            terminal_id=f"TCP:{terminal_adi}",
+            source='terminal'
+        )
+        if eklenenler is None:
+            raise ValueError(f"Masa bulunamadı: {masa_adi}")
+        if eklenenler:
+            logger.info(f"📲 Terminal siparişi: {terminal_adi} → {masa_adi} ({len(eklenenler)} kalem)")
+        return {'eklenen': len(eklenenler)}
 
     def start_caller_id_listener(self):
         """Caller ID (Signal 7 veya Seri Port) dinleyicisini başlat"""
@@ -942,29 +1390,9 @@ class RestaurantServer:
             return
 
         if self.cid_type == 'tcp':
-            def run_cid_listener():
-                try:
-                    cid_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    cid_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                    try:
-                        cid_sock.bind(('0.0.0.0', self.cid_port))
-                    except Exception as e:
-                        logger.error(f"❌ Caller ID portu ({self.cid_port}) bağlanamadı: {e}")
-                        return
-
-                    cid_sock.listen(5)
-                    logger.info(f"📡 TCP Caller ID Dinleyici başladı: Port {self.cid_port}")
-
-                    while self.running:
-                        try:
-                            client, addr = cid_sock.accept()
-                            logger.info(f"📞 Caller ID cihazı bağlandı: {addr}")
-                            threading.Thread(target=self.handle_cid_data, args=(client,), daemon=True).start()
-                        except:
-                            if not self.running: break
-                except Exception as e:
-                    logger.error(f"❌ TCP Caller ID hatası: {e}")
-            threading.Thread(target=run_cid_listener, daemon=True).start()
+            # Cihaz bağlanıp tek satır gönderir (ilk 1024 bayt işlenir)
+            self.gateway.listen('caller_id', self.cid_port, self.handle_cid_data, kind='oneshot', read_size=1024)
+            self.gateway.start()
         
         elif self.cid_type == 'serial':
             def run_serial_cid():
@@ -995,47 +1423,42 @@ class RestaurantServer:
                             time.sleep(10)
                         else:
                             break
-            threading.Thread(target=run_serial_cid, daemon=True).start()
+            socketio.start_background_task(run_serial_cid)
 
-    def handle_cid_data(self, client):
+    def handle_cid_data(self, data):
         """Gelen Caller ID verisini çöz ve yayınla"""
-        try:
-            # Signal 7 formatı genelde: 
-            # "ID=1,NO=05321234567,DATE=21/02/2026,TIME=16:15" vb. 
-            # veya sadece numara gönderir.
-            data = client.recv(1024).decode('utf-8', errors='ignore').strip()
-            if not data: return
-            
-            logger.info(f"☎️ Gelen Çağrı Verisi: {data}")
-            
-            # Telefon numarasını ayıkla (Basit bir regex veya split)
-            phone = ""
-            if "NO=" in data:
-                phone = data.split("NO=")[1].split(",")[0].strip()
-            elif data.isdigit():
-                phone = data
-            else:
-                # Genel bir temizlik
-                phone = ''.join(filter(str.isdigit, data))[-10:] # Son 10 hane (TR formatı)
+        # Signal 7 formatı genelde: 
+        # "ID=1,NO=05321234567,DATE=21/02/2026,TIME=16:15" vb. 
+        # veya sadece numara gönderir.
+        logger.info(f"☎️ Gelen Çağrı Verisi: {data}")
+        
+        # Telefon numarasını ayıkla (Basit bir regex veya split)
+        phone = ""
+        if "NO=" in data:
+            phone = data.split("NO=")[1].split(",")[0].strip()
+        elif data.isdigit():
+            phone = data
+        else:
+            # Genel bir temizlik
+            phone = normalize_phone(data) # Son 10 hane (TR formatı)
 
-            if phone:
-                self.process_incoming_call(phone)
-        except Exception as e:
-            logger.error(f"❌ CID Veri işleme hatası: {e}")
-        finally:
-            client.close()
+        if phone:
+            self.process_incoming_call(phone)
 
     def process_incoming_call(self, phone):
-        """Gelen aramayı işle ve frontend'e gönder"""
+        """Gelen aramayı işle ve frontend'e gönder (profil tek sorgu + telefon önbelleği)"""
         customer = None
         history = []
         
         if USE_DATABASE:
-            customer = db.get_cari_by_phone(phone)
-            if customer:
-                history = db.get_customer_order_history(customer['cari_isim'])
-                # Balance ekle
-                customer['bakiye'] = db.get_cari_balance(customer['cari_isim'])
+            try:
+                profile = db.get_customer_profile(phone)
+            except Exception as e:
+                logger.error(f"Arayan müşteri bulunamadı: {e}")
+                profile = None
+            if profile:
+                customer = {k: v for k, v in profile.items() if k != 'history'}
+                history = profile['history']
         
         # SocketIO ile tüm ekranlara (özellikle kasaya) bildir
         payload = {
@@ -1053,7 +1476,7 @@ class RestaurantServer:
             'timestamp': datetime.datetime.now().strftime("%H:%M:%S")
         }
         
-        socketio.emit('incoming_call', payload)
+        self.events.emit('incoming_call', payload, to=ROOM_CASHIER)
         logger.info(f"🔔 Arama bildirildi: {phone} {'(' + customer['cari_isim'] + ')' if customer else '(Yeni Müşteri)'}")
 
 # Global server instance
@@ -1153,6 +1576,80 @@ def system_info():
         'pos_type': server.pos_type
     })
 
+@app.route('/api/system/persistence')
+def system_persistence():
+    """Adisyon persister sayaçları (flush gecikmesi, batch boyutu)"""
+    return jsonify(server.journal.get_stats())
+
+@app.route('/api/system/kitchen')
+def system_kitchen():
+    """Legacy mutfak göndericisi sayaçları (kuyruk derinliği, atılan satırlar, bağlantı)"""
+    return jsonify(server.kitchen_dispatcher.get_stats())
+
+@app.route('/api/kitchen/stations')
+def kitchen_stations():
+    """İstasyon başına kuyruk uzunluğu, bekleme ve hazırlanma süreleri"""
+    return jsonify(server.kitchen_engine.get_stats())
+
+@app.route('/api/kitchen/queue')
+def kitchen_queue():
+    """Açık mutfak fişleri öncelik sırasıyla (?station=izgara, yoksa tüm istasyonlar)"""
+    station = request.args.get('station') or None
+    if station and station not in server.kitchen_engine.stations:
+        return jsonify({'success': False, 'error': 'Bilinmeyen istasyon'}), 404
+    return jsonify(server.kitchen_engine.queue(station))
+
+@app.route('/api/kitchen/prep_times')
+def kitchen_prep_times():
+    """
+    Hazırlanma süreleri (hazır - mutfağa gönderim): istasyon ve ürün başına p50/p95.
+    Parametresiz: son FASTFOOT_PREP_WINDOW_MIN dakika (bellek).
+    ?baslangic=2026-02-01&bitis=2026-02-02: siparis_zamanlari tablosundan.
+    """
+    baslangic = request.args.get('baslangic')
+    if not baslangic:
+        return jsonify(server.lifecycle.prep_stats())
+    if not USE_DATABASE:
+        return jsonify({'success': False, 'error': 'Veri tabanı bağlı değil'}), 400
+    try:
+        start = datetime.datetime.strptime(baslangic, "%Y-%m-%d")
+        bitis = request.args.get('bitis')
+        end = datetime.datetime.strptime(bitis, "%Y-%m-%d") if bitis else start + datetime.timedelta(days=1)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Tarih formatı YYYY-AA-GG olmalı'}), 400
+    stations, products = {}, []
+    for row in db.get_prep_time_stats(start, end):
+        entry = {'count': row['count'], 'p50_sec': round(float(row['p50_sec']), 1),
+                 'p95_sec': round(float(row['p95_sec']), 1)}
+        if row['urun'] is None:
+            stations[row['istasyon']] = entry
+        else:
+            products.append(dict(entry, station=row['istasyon'], urun=row['urun']))
+    return jsonify({'baslangic': baslangic, 'bitis': end.strftime("%Y-%m-%d"),
+                    'stations': stations, 'products': products})
+
+@app.route('/api/system/lifecycle')
+def system_lifecycle():
+    """Satır zamanı yazıcısı sayaçları (yazılan satır, hata, aktif p95 uyarıları)"""
+    return jsonify(server.lifecycle.get_stats())
+
+@app.route('/api/system/customer_cache')
+def system_customer_cache():
+    """Caller ID müşteri önbelleği sayaçları (isabet, ıska, geçersiz kılma)"""
+    if not USE_DATABASE:
+        return jsonify({'enabled': False})
+    return jsonify(dict(db.customer_cache.get_stats(), enabled=True))
+
+@app.route('/api/system/gateway')
+def system_gateway():
+    """Terminal/Caller ID ağ geçidi sayaçları (açık bağlantı, kuyruk derinliği, zaman aşımı)"""
+    return jsonify(server.gateway.get_stats())
+
+@app.route('/api/system/events')
+def system_events():
+    """Olay birleştirici sayaçları (birleştirilen/yayınlanan olay sayısı)"""
+    return jsonify(server.events.get_stats())
+
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
     """Mevcut ayarları döndür"""
@@ -1224,6 +1721,7 @@ def save_settings():
     # Masa/paket yapısı değiştiyse yenile
     if masa_degisti:
         server.refresh_adisyonlar()
+        server.save_active_adisyonlar()
         socketio.emit('system_update', {
             'masa_sayisi':  server.masa_sayisi,
             'paket_sayisi': server.paket_sayisi,
@@ -1295,6 +1793,27 @@ def get_gunsonu_detay():
         logger.error(f"Gün sonu detay hatası: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@app.route('/api/gunsonu/saatlik')
+def get_gunsonu_saatlik():
+    """Günün saatlik satış dağılımı (satis_ozet)"""
+    if not USE_DATABASE:
+        return jsonify({'success': False, 'error': 'Veri tabanı bağlantısı yok'}), 503
+    tarih = request.args.get('tarih', datetime.datetime.now().strftime('%Y-%m-%d'))
+    try:
+        saatler = {}
+        for r in db.get_hourly_summary(tarih):
+            saat = saatler.setdefault(r['saat'], {'saat': r['saat'], 'toplam': 0.0, 'satir': 0, 'urun_adet': 0, 'odeme': {}})
+            t = float(r['toplam'])
+            saat['toplam'] += t
+            saat['satir'] += r['satir']
+            saat['urun_adet'] += r['urun_adet']
+            saat['odeme'][r['odeme']] = t
+        result = [saatler[s] for s in sorted(saatler)]
+        return jsonify({'success': True, 'saatlik': result, 'genel_toplam': sum(s['toplam'] for s in result), 'tarih': tarih})
+    except Exception as e:
+        logger.error(f"Gün sonu saatlik hatası: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ==================== CARİ İŞLEMLER API ====================
 
 @app.route('/api/cari/hesaplar')
@@ -1426,7 +1945,7 @@ def api_vardiya_ac():
             'kasa_id': int(kasa_id),
             'durum': 'acik',
             'acilis_zamani': datetime.datetime.now().isoformat()
-        })
+        }, to=ROOM_CASHIER)
         return jsonify({'success': True, 'id': shift_id})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -1448,7 +1967,7 @@ def api_vardiya_kapat():
         db.close_shift(shift_id, nakit, kart)
         server.revoke_public_sessions_for_shift(int(shift_id))
         # Tüm bağlı istemcilere vardiya kapandığını bildir
-        socketio.emit('vardiya_update', None)
+        socketio.emit('vardiya_update', None, to=ROOM_CASHIER)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -1512,17 +2031,15 @@ def lookup_customer(phone):
     if not USE_DATABASE:
         return jsonify({'success': False, 'error': 'Veri tabanı bağlantısı yok'})
     try:
-        customer = db.get_cari_by_phone(phone)
+        customer = db.get_customer_profile(phone)
         if customer:
-            history = db.get_customer_order_history(customer['cari_isim'])
-            bakiye = db.get_cari_balance(customer['cari_isim'])
             return jsonify({
                 'success': True, 
                 'customer': {
                     'cari_isim': customer['cari_isim'],
                     'telefon': customer['telefon'],
                     'adres': customer['adres'],
-                    'bakiye': bakiye
+                    'bakiye': customer['bakiye']
                 },
                 'history': [
                     {
@@ -1530,7 +2047,7 @@ def lookup_customer(phone):
                         'adet': h['adet'], 
                         'fiyat': float(h['fiyat']), 
                         'tarih': str(h['tarih_saat'])
-                    } for h in history
+                    } for h in customer['history']
                 ]
             })
         return jsonify({'success': True, 'customer': None})
@@ -1616,54 +2133,27 @@ def integration_webhook(platform):
     items = order.get('items', [])
     
     # Adisyon alanını kontrol et veya oluştur
-    if masa_adi not in server.adisyonlar:
-        server.adisyonlar[masa_adi] = []
-        
-    # Siparişleri ekle
-    for item in items:
-        siparis_id = str(uuid.uuid4())[:8]
-        siparis = {
-            'uid': siparis_id,
-            'urun': item['urun'],
-            'adet': item['adet'],
-            'fiyat': item['fiyat'],
-            'tip': item['tip'],
-            'garson': order.get('platform', 'Online'),
-            'durum': 'mutfakta',
-            'saat': datetime.datetime.now().strftime("%H:%M:%S")
-        }
-        server.adisyonlar[masa_adi].append(siparis)
-        
-        # Mutfak bildirimi
-        socketio.emit('kitchen_new_order', {
-            'uid': siparis_id,
-            'masa': masa_adi,
-            'urun': item['urun'],
-            'adet': item['adet'],
-            'saat': siparis['saat'],
-            'garson': siparis['garson'],
-            'terminal_id': f"API:{platform}"
-        })
-        
-        # Legacy mutfak
-        server.send_to_kitchen_legacy(masa_adi, item['urun'], item['adet'])
+    server.adisyonlar.get_or_create(masa_adi)
         
-    # Tüm clientlara bildir
-    socketio.emit('masa_update', {
-        'masa': masa_adi,
-        'items': server.adisyonlar[masa_adi],
-        'total': sum(i['adet'] * i['fiyat'] for i in server.adisyonlar[masa_adi]),
-        'source': platform
-    })
+    # Siparişleri tek seferde ekle (kaydet, yayınla, mutfağa gönder)
+    try:
+        server.add_order_items(
+            masa_adi,
+            items,
+            garson=order.get('platform', 'Online'),
+            terminal_id=f"API:{platform}",
+            source=platform
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     # Yeni sipariş uyarısı
-    socketio.emit('new_online_order', {
+    server.events.emit('new_online_order', {
         'platform': order.get('platform'),
         'masa': masa_adi,
         'customer': order.get('customer')
-    })
+    }, to=ROOM_CASHIER)
     
-    server.save_active_adisyonlar() # Persistence
     return jsonify({'success': True})
 
 # ==================== SALON YÖNETİMİ ====================
@@ -1951,13 +2441,10 @@ def save_salons_api():
         # Sunucu cache'ini yenile
         global server
         server.salons = data
+        server.invalidate_section('system')
         
-        # Tüm istemcilere güncel düzeni ve diğer ayarları gönder
-        socketio.emit('initial_data', {
-            'system': server.get_system_info(),
-            'menu': server.menu_data,
-            'adisyonlar': server.adisyonlar
-        })
+        # Tüm istemcilere güncel düzeni gönder (menü sürümü aynıysa menü gitmez)
+        socketio.emit('initial_data', server.build_initial_data(skip=('menu',)))
         
         return jsonify({'success': True})
     except Exception as e:
@@ -2017,7 +2504,7 @@ def api_public_policy_update():
     })
 
 # Online siparis rate limiting (telefon numarasina gore)
-_online_order_rate = defaultdict(list)
+_online_order_rate = server.shared.map('online_order_rate') if server.shared else defaultdict(list)
 
 @app.route('/api/online/order', methods=['POST'])
 def api_online_order():
@@ -2048,60 +2535,36 @@ def api_online_order():
     # Rate limiting: ayni telefondan 60 saniyede max 3 siparis
     clean_tel = ''.join(filter(str.isdigit, telefon))
     now_ts = time.time()
-    _online_order_rate[clean_tel] = [t for t in _online_order_rate[clean_tel] if now_ts - t < 60]
-    if len(_online_order_rate[clean_tel]) >= 3:
+    recent = [t for t in _online_order_rate.get(clean_tel, []) if now_ts - t < 60]
+    if len(recent) >= 3:
+        _online_order_rate[clean_tel] = recent
         return jsonify({'success': False, 'error': 'Cok sik siparis gonderdiniz, lutfen bekleyin'}), 429
-    _online_order_rate[clean_tel].append(now_ts)
+    _online_order_rate[clean_tel] = recent + [now_ts]
 
     # Adisyon adi: "Online - Ad Soyad" (cakisma olursa numara ekle)
-    base_adisyon = f"Online - {musteri_adi[:30]}"
-    adisyon_adi = base_adisyon
-    suffix = 2
-    while adisyon_adi in server.adisyonlar and server.adisyonlar[adisyon_adi]:
-        adisyon_adi = f"{base_adisyon} ({suffix})"
-        suffix += 1
-
-    server.adisyonlar[adisyon_adi] = []
-
-    # Urunleri ekle
-    added = []
-    max_items = int(server.public_policy.get('max_items_per_order', 25))
-    max_qty = int(server.public_policy.get('max_item_qty', 20))
-    for it in raw_items[:max_items]:
-        urun = (it.get('urun') or '').strip()
-        adet = min(int(it.get('adet', 1)), max_qty)
-        fiyat = float(it.get('fiyat', 0))
-        if not urun or adet <= 0 or fiyat < 0:
-            continue
-        for _ in range(adet):
-            siparis = server.add_order_item(
-                masa_adi=adisyon_adi,
-                urun=urun,
-                fiyat=fiyat,
-                garson='Online Siparis',
-                adet=1
-            )
-            if siparis:
-                added.append(siparis)
+    adisyon_adi = server.adisyonlar.open_new(f"Online - {musteri_adi[:30]}")
+
+    # Urunleri tek seferde ekle (her adet ayri satir)
+    lines = server.unit_lines(
+        raw_items,
+        int(server.public_policy.get('max_items_per_order', 25)),
+        int(server.public_policy.get('max_item_qty', 20))
+    )
+    added = server.add_order_items(adisyon_adi, lines, garson='Online Siparis', source='online_order')
 
+    server.adisyonlar.release(adisyon_adi)
     if not added:
-        del server.adisyonlar[adisyon_adi]
         return jsonify({'success': False, 'error': 'Gecerli siparis kalemi bulunamadi'}), 400
 
-    # Kasaya ve mutfaga bildir
-    socketio.emit('masa_update', {
-        'masa': adisyon_adi,
-        'items': server.adisyonlar[adisyon_adi],
-        'source': 'online_order'
-    })
-    socketio.emit('system_update', {
+    # Kasaya bildir (satırlar add_order_items ile item_added olarak yayınlandı)
+    server.events.emit('system_update', {
         'new_online_order': True,
         'masa': adisyon_adi,
         'musteri_adi': musteri_adi,
         'telefon': telefon,
         'adres': adres,
         'odeme_tipi': odeme_tipi
-    })
+    }, to=ROOM_CASHIER)
 
     # DB'ye kaydet (varsa)
     if USE_DATABASE:
@@ -2118,7 +2581,6 @@ def api_online_order():
         except Exception as e:
             logger.warning(f"Online siparis DB kaydedilemedi: {e}")
 
-    server.save_active_adisyonlar()
     logger.info(f"🛒 Online siparis: {musteri_adi} | {clean_tel} | {len(added)} kalem | {adisyon_adi}")
 
     return jsonify({
@@ -2133,14 +2595,13 @@ def api_online_orders():
     """Online siparisleri listele (kasiyer paneli)"""
     # Adisyonlar icinden "Online - " ile baslayanlar
     online = []
-    for masa_adi, items in server.adisyonlar.items():
-        if masa_adi.startswith('Online - ') and items:
-            toplam = sum(float(it.get('fiyat', 0)) for it in items)
+    for masa_adi, adisyon in list(server.adisyonlar.items()):
+        if masa_adi.startswith('Online - ') and adisyon:
             online.append({
                 'masa': masa_adi,
-                'kalem_sayisi': len(items),
-                'toplam': toplam,
-                'items': items
+                'kalem_sayisi': len(adisyon),
+                'toplam': adisyon.total,
+                'items': adisyon.to_list()
             })
     return jsonify({'success': True, 'orders': online})
 
@@ -2312,23 +2773,12 @@ def api_public_order():
     if not server.can_place_public_order(rate_key, max_per_minute=int(server.public_policy.get('max_orders_per_minute', 3))):
         return jsonify({'success': False, 'error': 'Çok sık sipariş gönderildi, lütfen bekleyin'}), 429
 
-    added = []
-    for it in raw_items[:int(server.public_policy.get('max_items_per_order', 25))]:
-        urun = (it.get('urun') or "").strip()
-        adet = int(it.get('adet', 1))
-        fiyat = float(it.get('fiyat', 0))
-        if not urun or adet <= 0 or fiyat < 0:
-            continue
-        for _ in range(min(adet, int(server.public_policy.get('max_item_qty', 20)))):
-            order_item = server.add_order_item(
-                masa_adi=table_name,
-                urun=urun,
-                fiyat=fiyat,
-                garson='Müşteri QR',
-                adet=1
-            )
-            if order_item:
-                added.append(order_item)
+    lines = server.unit_lines(
+        raw_items,
+        int(server.public_policy.get('max_items_per_order', 25)),
+        int(server.public_policy.get('max_item_qty', 20))
+    )
+    added = server.add_order_items(table_name, lines, garson='Müşteri QR', source='public')
 
     if not added:
         return jsonify({'success': False, 'error': 'Geçerli sipariş kalemi bulunamadı'}), 400
@@ -2340,6 +2790,8 @@ def api_public_order():
             session['created_at'] + int(server.public_policy.get('session_ttl_sec', 3600))
         )
         session_exp = session['expires_at']
+        if session.get('id') in server.public_sessions:
+            server.public_sessions[session['id']] = session  # Ortak depoda da uzasın
         if USE_DATABASE:
             try:
                 db.update_public_session_expiry(
@@ -2395,13 +2847,11 @@ def save_menu_api():
         # 3. Sunucu cache'ini yenile
         global server
         server.menu_data = new_menu
+        server.kitchen_engine.set_menu(new_menu)
+        server.invalidate_section('menu')
         
         # 4. İstemcilere bildir
-        socketio.emit('initial_data', {
-            'system': server.get_system_info(),
-            'menu': server.menu_data,
-            'adisyonlar': server.adisyonlar
-        })
+        socketio.emit('initial_data', server.build_initial_data(skip=('system',)))
         
         return jsonify({'success': True})
     except Exception as e:
@@ -2416,24 +2866,23 @@ def get_menu():
 @app.route('/api/adisyonlar')
 def get_adisyonlar():
     """Tüm adisyonları getir"""
-    return jsonify(server.adisyonlar)
+    return jsonify(server.serialize_adisyonlar())
 
 @app.route('/api/adisyon/<masa_adi>')
 def get_adisyon(masa_adi):
     """Belirli bir adisyonu getir"""
-    items = server.adisyonlar.get(masa_adi, [])
-    total = sum(item['adet'] * item['fiyat'] for item in items)
+    adisyon = server.adisyonlar.get(masa_adi) or Adisyon()
     return jsonify({
         'masa': masa_adi,
-        'items': items,
-        'total': total
+        'items': adisyon.to_list(),
+        'total': adisyon.total
     })
 
 # ==================== SOCKETIO EVENTS ====================
 
 @socketio.on('connect')
-def handle_connect():
-    """Client bağlandı"""
+def handle_connect(auth=None):
+    """Client bağlandı (auth: istemcideki menu_version/system_version ve skip listesi)"""
     sid = request.sid
     client_ip = request.remote_addr
     server.active_connections[sid] = {
@@ -2441,21 +2890,54 @@ def handle_connect():
         'connected_at': time.time()
     }
     logger.info(f"✅ Client bağlandı: {client_ip} ({sid})")
+
+    # Rol odası: ?role=kitchen|cashier|waiter|public (mutfak ekranı bağlanırken bildirir).
+    # İstasyon ekranı (?role=kitchen&station=izgara) tüm mutfak yerine kendi odasına katılır.
+    role_room = CONNECT_ROLES.get(request.args.get('role', ''))
+    station = (request.args.get('station') or '').strip() or None
+    if role_room == ROOM_KITCHEN and station in server.kitchen_engine.stations:
+        join_room(station_room(station))
+    elif role_room:
+        station = None
+        join_room(role_room)
+        table = (request.args.get('table') or '').strip()
+        if role_room == ROOM_PUBLIC and table in server.adisyonlar:
+            join_room(table_room(table))
     
-    # İlk verileri gönder
-    emit('initial_data', {
-        'menu': server.menu_data,
-        'adisyonlar': server.adisyonlar,
-        'system': {
-            'company_name': server.company_name,
-            'terminal_id': server.terminal_id,
-            'ip': get_local_ip(),
-            'masa_sayisi': server.masa_sayisi,
-            'paket_sayisi': server.paket_sayisi,
-            'salons': server.salons
-        },
-        'active_shift': server.get_sid_active_shift(sid)
-    })
+    auth = auth if isinstance(auth, dict) else {}
+
+    # Yeniden bağlanan garson: garson ve açık masa odalarına hemen katıl,
+    # aradaki olaylar bu odalara göre tekrar gönderilir
+    if role_room == ROOM_WAITER:
+        waiter_name = auth.get('waiter')
+        if waiter_name:
+            join_room(waiter_room(waiter_name))
+            server.waiter_sessions[waiter_name].add(sid)
+        masa_adi = auth.get('masa')
+        if masa_adi:
+            server.current_selections[sid] = masa_adi
+            join_room(table_room(masa_adi))
+
+    # İlk verileri gönder (istemcideki sürümü güncel olan bölümler atlanır)
+    skip = auth.get('skip') if isinstance(auth.get('skip'), list) else []
+    active_shift = server.get_sid_active_shift(sid)
+
+    def send_replay(missed, seq):
+        payload = server.build_initial_data(known=auth, skip=skip + ['adisyonlar'])
+        payload.update(replay=missed, event_seq=seq, active_shift=active_shift)
+        emit('initial_data', payload)
+
+    # Son görülen olay tampondaysa sadece kaçırılanlar, değilse tam snapshot.
+    # Çok süreçli modda olay sıra numaraları süreç başınadır: her zaman snapshot.
+    if auth.get('last_seq') is not None and not server.shared and server.events.replay(
+            auth.get('last_seq'), auth.get('seq_epoch'), rooms(), send_replay):
+        return
+
+    payload = server.build_initial_data(known=auth, skip=skip)
+    payload['active_shift'] = active_shift
+    if role_room == ROOM_KITCHEN:
+        payload['kitchen_queue'] = server.kitchen_engine.queue(station)
+    emit('initial_data', payload)
 
 @socketio.on('disconnect')
 def handle_disconnect():
@@ -2477,6 +2959,8 @@ def handle_waiter_init(data):
     sid = request.sid
     waiter_name = data.get('name')
     if waiter_name:
+        join_room(ROOM_WAITER)
+        join_room(waiter_room(waiter_name))
         server.waiter_sessions[waiter_name].add(sid)
         logger.info(f"🤵 Garson oturumu kaydedildi: {waiter_name} ({sid})")
 
@@ -2486,6 +2970,7 @@ def handle_set_kasa(data):
     sid = request.sid
     kasa_id = data.get('kasa_id')
     if kasa_id:
+        join_room(ROOM_CASHIER)
         server.sid_kasa_map[sid] = kasa_id
         logger.info(f"📟 Kasa atandı: {kasa_id} ({sid})")
         # Aktif vardiya bilgisini geri gönder
@@ -2496,16 +2981,26 @@ def handle_select_masa(data):
     """Masa seçimi"""
     sid = request.sid
     masa_adi = data.get('masa')
+    previous = server.current_selections.get(sid)
+    if previous and previous != masa_adi:
+        leave_room(table_room(previous))
     server.current_selections[sid] = masa_adi
+    join_room(table_room(masa_adi))
     
-    items = server.adisyonlar.get(masa_adi, [])
-    total = sum(item['adet'] * item['fiyat'] for item in items)
+    adisyon = server.adisyonlar.get(masa_adi) or Adisyon()
     
-    emit('masa_selected', {
-        'masa': masa_adi,
-        'items': items,
-        'total': total
-    })
+    emit('masa_selected', server.masa_state(masa_adi, adisyon))
+
+@socketio.on('resync_masa')
+def handle_resync_masa(data):
+    """İstemci sürüm boşluğu gördü: masanın tam halini sadece ona gönder"""
+    masa_adi = data.get('masa')
+    adisyon = server.adisyonlar.get(masa_adi)
+    if adisyon is None:
+        return
+    state = server.masa_state(masa_adi, adisyon)
+    state['source'] = 'resync'
+    emit('masa_update', state)
 
 @socketio.on('add_item')
 def handle_add_item(data):
@@ -2537,33 +3032,47 @@ def handle_add_item(data):
 @socketio.on('kitchen_order_ready')
 def handle_kitchen_order_ready(data):
     """Mutfaktan sipariş hazır bildirimi"""
-    masa = data.get('masa')
     waiters = data.get('waiters', [])
     items_uids = data.get('items_uids', []) # Mutfaktan gelen hazır ürün ID'leri
     
-    logger.info(f"📢 Sipariş hazır: {masa} (UIDs: {items_uids})")
-    
-    # Adisyondaki ürünlerin durumunu güncelle
-    if masa in server.adisyonlar:
-        for item in server.adisyonlar[masa]:
-            if item.get('uid') in items_uids:
-                item['durum'] = 'hazir'
-        server.save_active_adisyonlar() # Persistence
-
-    # Garsonlara bildir
-    for waiter_name in waiters:
-        if waiter_name in server.waiter_sessions:
-            for sid in server.waiter_sessions[waiter_name]:
-                socketio.emit('order_ready', {
-                    'masa': masa,
-                    'items_uids': items_uids,
-                    'message': f"{masa} siparişi hazır!"
-                }, room=sid)
+    # Masa adı gönderilmese de (veya satır taşınmışsa) uid'ler global
+    # haritadan bulunduğu masaya göre gruplanır
+    groups = server.adisyonlar.group_by_masa(items_uids)
+    if not groups and data.get('masa'):
+        groups = {data.get('masa'): []}
+
+    logger.info(f"📢 Sipariş hazır: {', '.join(groups) or '-'} (UIDs: {items_uids})")
     
-    # Tüm masayı güncelle (durum değişikliği için)
-    items = server.adisyonlar.get(masa, [])
-    total = sum(item['adet'] * item['fiyat'] for item in items)
-    socketio.emit('masa_update', {'masa': masa, 'items': items, 'total': total})
+    for masa, uids in groups.items():
+        # Adisyondaki ürünlerin durumunu güncelle
+        if uids:
+            adisyon = server.adisyonlar[masa]
+            with adisyon.lock:
+                ready = [item for item in (adisyon.find(uid) for uid in uids) if item is not None]
+                for item in ready:
+                    adisyon.set_status(item, 'hazir')
+                server.journal.log_status(masa, uids, 'hazir')
+                server.emit_item_status(masa, adisyon, ready, 'hazir')
+
+        # Garsonlara bildir (garson odası: kopup yeniden bağlanan cihaz da alır)
+        if waiters:
+            server.events.emit('order_ready', {
+                'masa': masa,
+                'items_uids': uids or items_uids,
+                'message': f"{masa} siparişi hazır!"
+            }, to=[waiter_room(name) for name in waiters])
+
+    # Yayından sonra (istasyon odaları bulunsun); ödenip adisyondan düşmüş
+    # ama hazırlanmamış satırlar da kuyruktan çıkar
+    server.kitchen_engine.complete(items_uids)
+    server.lifecycle.mark(items_uids, 'ready')
+
+@socketio.on('order_served')
+def handle_order_served(data):
+    """Garson hazır siparişi masaya götürdü (servis zamanı)"""
+    items_uids = data.get('items_uids') or []
+    if items_uids:
+        server.lifecycle.mark(items_uids, 'served')
 
 @socketio.on('cancel_item')
 def handle_cancel_item(data):
@@ -2575,35 +3084,32 @@ def handle_cancel_item(data):
     if not masa_adi or not item_uid: return
 
     if masa_adi in server.adisyonlar:
-        # Ürünü bul
-        item_idx = -1
-        for i, item in enumerate(server.adisyonlar[masa_adi]):
-            if item.get('uid') == item_uid:
-                if item.get('durum') == 'hazir':
-                    emit('error', {'message': 'Hazır olan sipariş iptal edilemez!'})
-                    return
-                item_idx = i
-                break
+        # Ürünü bul (uid indeksi); kontrol ve silme aynı kilit altında
+        adisyon = server.adisyonlar[masa_adi]
+        with adisyon.lock:
+            # Ödeme satırları sabitledikten sonra iptal edilen satır yine de satışa yazılırdı
+            if masa_adi in server.payments_in_progress:
+                emit('error', {'message': 'Bu masada devam eden bir ödeme var'})
+                return
+            cancelled_item = adisyon.find(item_uid)
+            if cancelled_item is not None and cancelled_item.get('durum') == 'hazir':
+                emit('error', {'message': 'Hazır olan sipariş iptal edilemez!'})
+                return
+            if cancelled_item is not None:
+                adisyon.remove(cancelled_item)
+                server.journal.log_remove(masa_adi, [item_uid], reason='cancel')
+                server.emit_items_removed(masa_adi, adisyon, [cancelled_item], 'cancel')
         
-        if item_idx != -1:
-            cancelled_item = server.adisyonlar[masa_adi].pop(item_idx)
-            server.save_active_adisyonlar() # Persistence
+        if cancelled_item is not None:
             logger.info(f"🗑️ Sipariş iptal edildi: {masa_adi} - {cancelled_item['urun']}")
             
             # Mutfak ekranına bildir
-            socketio.emit('kitchen_cancel_order', {
+            server.events.emit('kitchen_cancel_order', {
                 'masa': masa_adi,
                 'uid': item_uid
-            })
-            
-            # Masa güncellemesini herkese duyur
-            items = server.adisyonlar[masa_adi]
-            total = sum(item['adet'] * item['fiyat'] for item in items)
-            socketio.emit('masa_update', {
-                'masa': masa_adi,
-                'items': items,
-                'total': total
-            })
+            }, to=[ROOM_KITCHEN] + server.kitchen_rooms([cancelled_item]), stream='@kitchen')
+            server.kitchen_engine.discard([item_uid])
+            server.lifecycle.mark([item_uid], 'cancelled')
 
 @socketio.on('transfer_table')
 def handle_transfer_table(data):
@@ -2623,28 +3129,25 @@ def handle_transfer_table(data):
         emit('error', {'message': 'Geçersiz masa adı'})
         return
         
-    items_to_move = server.adisyonlar[source_masa]
-    if not items_to_move:
+    # Taşıma işlemi (satırlar ve uid haritası birlikte güncellenir)
+    with server.adisyonlar.locked(source_masa, target_masa):
+        # Ödenmekte olan masanın satırları taşınmaz (hem ödenir hem hedefte açık kalırdı)
+        if source_masa in server.payments_in_progress:
+            emit('error', {'message': 'Bu masada devam eden bir ödeme var'})
+            return
+        moved = server.adisyonlar.move(source_masa, target_masa)
+        if moved:
+            moved_uids = [i.uid for i in moved]
+            server.journal.log_move(source_masa, target_masa, moved_uids)
+            # Her iki masa için de değişikliği tüm clientlara bildir
+            server.emit_items_removed(source_masa, server.adisyonlar[source_masa], moved, 'transfer')
+            server.emit_items_added(target_masa, server.adisyonlar[target_masa], moved, source='transfer')
+            server.kitchen_engine.move(moved_uids, target_masa)
+    if not moved:
         emit('error', {'message': 'Kaynak masada sipariş bulunmuyor'})
         return
-        
-    # Taşıma işlemi
-    server.adisyonlar[target_masa].extend(items_to_move)
-    server.adisyonlar[source_masa] = []
-    server.save_active_adisyonlar() # Persistence
     
-    logger.info(f"🔄 Masa taşıma: {source_masa} ➔ {target_masa} ({len(items_to_move)} ürün)")
-    
-    # Her iki masa için de güncellemeleri tüm clientlara bildir
-    for masa_adi in [source_masa, target_masa]:
-        items = server.adisyonlar[masa_adi]
-        total = sum(item['adet'] * item['fiyat'] for item in items)
-        socketio.emit('masa_update', {
-            'masa': masa_adi,
-            'items': items,
-            'total': total,
-            'source': 'transfer'
-        })
+    logger.info(f"🔄 Masa taşıma: {source_masa} ➔ {target_masa} ({len(moved)} ürün)")
     
     emit('success', {'message': f'{source_masa} masası {target_masa} masasına başarıyla taşındı'})
 
@@ -2670,11 +3173,11 @@ def handle_assign_courier(data):
     # En iyisi her sipariş kalemine kurye_id eklemek or masa bazlı bi meta store.
     
     # Masa bazlı kurye atamasını socketio ile duyur
-    socketio.emit('courier_assigned', {
+    server.events.emit('courier_assigned', {
         'masa': masa_adi,
         'kurye_id': kurye_id,
         'kurye_ad': kurye_ad
-    })
+    }, to=[table_room(masa_adi), ROOM_CASHIER])
     
     logger.info(f"🛵 Kurye atandı: {masa_adi} -> {kurye_ad}")
 
@@ -2688,10 +3191,11 @@ def handle_send_courier_info(data):
         emit('error', {'message': 'Eksik bilgi'})
         return
         
+    masa_adisyon = server.adisyonlar.get(masa_adi) or Adisyon()
     adisyon = {
         'masa': masa_adi,
-        'items': server.adisyonlar.get(masa_adi, []),
-        'total': sum(i['adet'] * i['fiyat'] for i in server.adisyonlar.get(masa_adi, []))
+        'items': masa_adisyon.to_list(),
+        'total': masa_adisyon.total
     }
     
     # Müşteri bilgisini bul (Paket adından telefon çekmeye çalışalım)
@@ -2729,20 +3233,26 @@ def handle_remove_item(data):
     sid = request.sid
     masa_adi = server.current_selections.get(sid)
     index = data.get('index', -1)
+    item_uid = data.get('uid')
     
     if masa_adi and masa_adi in server.adisyonlar:
-        if 0 <= index < len(server.adisyonlar[masa_adi]):
-            server.adisyonlar[masa_adi].pop(index)
-            server.save_active_adisyonlar() # Persistence
-            
-            items = server.adisyonlar[masa_adi]
-            total = sum(item['adet'] * item['fiyat'] for item in items)
-            
-            socketio.emit('masa_update', {
-                'masa': masa_adi,
-                'items': items,
-                'total': total
-            })
+        adisyon = server.adisyonlar[masa_adi]
+        with adisyon.lock:
+            if masa_adi in server.payments_in_progress:
+                emit('error', {'message': 'Bu masada devam eden bir ödeme var'})
+                return
+            # uid gönderildiyse index'e güvenilmez (başka bir işlem kaydırmış olabilir)
+            if item_uid:
+                item = adisyon.find(item_uid)
+            else:
+                item = adisyon[index] if 0 <= index < len(adisyon) else None
+            if item is None:
+                return
+            adisyon.remove(item)
+            server.journal.log_remove(masa_adi, [item.uid], reason='remove')
+            server.emit_items_removed(masa_adi, adisyon, [item], 'remove')
+        server.kitchen_engine.discard([item.uid])
+        server.lifecycle.mark([item.uid], 'cancelled')
 
 @socketio.on('finalize_payment')
 def handle_payment(data):
@@ -2766,24 +3276,41 @@ def handle_payment(data):
 
     payments = data.get('payments', [])
     payment_type = data.get('type', 'Nakit') # Eski format desteği
-    item_indices = data.get('item_indices', []) # YENİ: Seçili ürünlerin indexleri
-
-    # Hangi kalemlerin ödendiğini belirle
-    if item_indices:
-        items_to_pay = []
-        # Indexleri büyükten küçüğe sıralayarak pop işleminin diğer indexleri kaydırmasını önleyeceğiz
-        # Ama önce kopyasını alıp işlem yapalım ki hata durumunda veri kaybolmasın
-        for idx in item_indices:
-            if 0 <= idx < len(server.adisyonlar[masa_adi]):
-                items_to_pay.append(server.adisyonlar[masa_adi][idx])
-        
-        if not items_to_pay:
+    item_uids = data.get('item_uids', []) # Seçili ürünlerin uid'leri
+    item_indices = data.get('item_indices', []) # Eski istemci: seçili ürünlerin indexleri
+    is_selective = bool(item_uids or item_indices)
+
+    # Hangi kalemlerin ödendiğini belirle. Ödenecek satırlar burada uid ile
+    # sabitlenir; POS/DB beklerken eklenen/silinen satırlar sonucu bozmaz.
+    adisyon = server.adisyonlar[masa_adi]
+    with adisyon.lock:
+        if masa_adi in server.payments_in_progress:
+            emit('error', {'message': 'Bu masada devam eden bir ödeme var'})
+            return
+        if item_uids:
+            items = [item for item in (adisyon.find(uid) for uid in item_uids) if item is not None]
+        elif item_indices:
+            items = [adisyon[idx] for idx in item_indices if 0 <= idx < len(adisyon)]
+        else:
+            items = list(adisyon)
+    
+        if is_selective and not items:
             emit('error', {'message': 'Seçilen ürünler bulunamadı'})
             return
-        items = items_to_pay
+        if not items:
+            emit('error', {'message': 'Sipariş yok'})
+            return
+        server.payments_in_progress.add(masa_adi)
 
+    try:
+        _finalize_payment(sid, masa_adi, adisyon, items, payments, payment_type)
+    finally:
+        server.payments_in_progress.discard(masa_adi)
+
+def _finalize_payment(sid, masa_adi, adisyon, items, payments, payment_type):
+    """Sabitlenmiş satırlar için ödemeyi kaydet ve adisyondan düş"""
     if not payments:
-        total_amount = sum(item['adet'] * item['fiyat'] for item in items)
+        total_amount = round(sum(item.tutar for item in items), 2)
         payments = [{'type': payment_type, 'amount': total_amount}]
     
     # Aktif vardiya bilgisini al
@@ -2834,41 +3361,34 @@ def handle_payment(data):
         if USE_DATABASE:
             db.save_sales_batch(sales_data)
         
-        # Adisyonu temizle (Sadece ödenen kalemleri)
-        is_partial = False
-        if item_indices:
-            # Indexleri büyükten küçüğe sıralayıp sil
-            for idx in sorted(item_indices, reverse=True):
-                if 0 <= idx < len(server.adisyonlar[masa_adi]):
-                    server.adisyonlar[masa_adi].pop(idx)
-            
+        # Adisyonu temizle (Sadece ödenen kalemleri, uid ile).
+        # Bu arada masaya eklenen satırlar açık kalır.
+        with adisyon.lock:
+            paid = adisyon.remove_uids([item.uid for item in items])
+            if paid:
+                paid_uids = [item.uid for item in paid]
+                if adisyon:
+                    server.journal.log_remove(masa_adi, paid_uids)
+                else:
+                    server.journal.log_clear(masa_adi)
+                server.emit_items_removed(masa_adi, adisyon, paid, 'payment')
+                server.lifecycle.mark(paid_uids, 'paid')
             # Eğer masada hala ürün varsa bu bir kısmi ödemedir
-            if server.adisyonlar[masa_adi]:
-                is_partial = True
-        else:
-            server.adisyonlar[masa_adi] = []
+            is_partial = bool(adisyon)
+
+        # Ödeme anında beklemeden diske indir
+        server.journal.flush()
 
-        if not server.adisyonlar[masa_adi]:
+        if not is_partial:
             server.revoke_public_sessions_for_table(masa_adi)
         
-        server.save_active_adisyonlar() # Persistence
-        
         # Tüm clientlara bildir
-        socketio.emit('payment_completed', {
+        server.events.emit('payment_completed', {
             'masa': masa_adi,
             'type': final_payment_label,
             'payments': payments,
             'is_partial': is_partial
-        })
-
-        # Eğer kısmi ödeme ise veya masada hala ürün varsa masa_update gönder
-        if is_partial or server.adisyonlar[masa_adi]:
-            remaining_total = sum(item['adet'] * item['fiyat'] for item in server.adisyonlar[masa_adi] if item.get('tip') != 'ikram')
-            socketio.emit('masa_update', {
-                'masa': masa_adi,
-                'items': server.adisyonlar[masa_adi],
-                'total': remaining_total
-            })
+        }, to=[table_room(masa_adi), ROOM_CASHIER], stream=masa_adi)
         
         msg = f"{final_payment_label} ödemesi alındı"
         if final_payment_label == "Parçalı":
@@ -2892,11 +3412,7 @@ def handle_payment(data):
                 'timestamp': timestamp
             }
             # Arka planda gönder (Arayüzü bekletme)
-            threading.Thread(
-                target=server.integration_manager.send_to_accounting,
-                args=(order_data,),
-                daemon=True
-            ).start()
+            socketio.start_background_task(server.integration_manager.send_to_accounting, order_data)
         except Exception as ae:
             logger.error(f"Muhasebe gönderim hazırlık hatası: {ae}")
         
@@ -3038,13 +3554,27 @@ def api_remove_va_blacklist(telefon):
         return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
-    # Terminal sunucusunu başlat
-    server.start_terminal_server()
-    
-    # Caller ID sunucusunu başlat
-    server.start_caller_id_listener()
+    # Terminal ve Caller ID portları tek süreçte açılır (cluster'da 0 numaralı süreç)
+    if WORKER_ID in (None, '0'):
+        # Terminal sunucusunu başlat
+        server.start_terminal_server()
+        
+        # Caller ID sunucusunu başlat
+        server.start_caller_id_listener()
     
     # Web sunucuyu başlat
-    logger.info(f"🌐 Web sunucu başlatılıyor: http://{get_local_ip()}:8000")
+    web_port = get_env_int("FASTFOOT_WEB_PORT", 8000)
+    web_host = os.getenv("FASTFOOT_WEB_HOST", '0.0.0.0')
+    worker_label = f", süreç: {WORKER_ID}" if WORKER_ID is not None else ""
+    logger.info(f"🌐 Web sunucu başlatılıyor: http://{get_local_ip()}:{web_port} (mod: {ASYNC_MODE}{worker_label})")
     
-    socketio.run(app, host='0.0.0.0', port=8000, debug=False, allow_unsafe_werkzeug=True)
+    try:
+        socketio.run(app, host=web_host, port=web_port, debug=False, allow_unsafe_werkzeug=True)
+    finally:
+        # Kapanışta günlüğü snapshot'a katla
+        server.save_active_adisyonlar()
+        server.gateway.stop()
+        server.events.close()
+        server.kitchen_dispatcher.close()
+        server.lifecycle.close()
+        server.journal.close()